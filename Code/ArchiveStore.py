@@ -0,0 +1,433 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import time
+import hashlib
+import sqlite3
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import zstandard as zstd
+
+from AssetHistory import folder_entries, manifest_sources
+from AssetPack import PackReader, is_pack_path, split_pack_path
+from OutputMaterializer import MODES, Materializer
+from 新旧对比 import HASH_THREADS
+
+# ====================== 多版本增量归档 ======================
+# 把每个版本的提取结果 / 文件夹存进一个归档目录，任意版本都能按需还原：
+#   objects/ab/<md5>.zst   每份不同的内容只存一次（按实际读到的内容重新算 MD5，与清单 / 新旧对比.py 给的不符时拒收）
+#   archive.sqlite3        objects（哈希 → 存储方式 / 基准对象）、builds、entries（版本 → 路径 → 哈希）
+# 同一路径在上一个版本里的旧内容作为基准：以旧内容为 zstd 原始内容字典（等同 zstd --patch-from）
+# 压缩新内容，比单独压缩小时存成增量，否则存完整压缩数据。
+# 增量链最长 MAX_CHAIN 层，还原时最多连续解压这么多次。
+
+OBJECTS_DIR = "objects"
+INDEX_NAME = "archive.sqlite3"
+SCHEMA_VERSION = 1
+DEFAULT_LEVEL = 10
+MAX_CHAIN = 8                        # 增量链最大深度，超过时存完整内容
+DELTA_MAX_SIZE = 128 * 1024 * 1024   # 基准 + 新内容超过窗口上限时直接存完整内容
+WINDOW_LOG_MAX = 27                  # 与解压器默认允许的最大窗口一致
+BASE_CACHE_BYTES = 256 * 1024 * 1024 # 还原时缓存被多次引用的基准对象
+
+KIND_FULL = "full"
+KIND_DELTA = "delta"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS objects (
+    hash TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    stored_size INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    base TEXT,
+    depth INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS builds (
+    seq INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    source TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    build INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    PRIMARY KEY (build, path)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS entries_hash ON entries (hash);
+"""
+
+
+class ArchiveError(Exception):
+    """版本不存在、对象缺失等，消息直接展示给用户"""
+
+
+def raw_dict(base: bytes):
+    return zstd.ZstdCompressionDict(base, dict_type=zstd.DICT_TYPE_RAWCONTENT)
+
+
+def delta_params(level, base_size, size):
+    """窗口要同时覆盖基准和新内容，远距离的相同片段才能被引用"""
+    window_log = max(10, min(WINDOW_LOG_MAX, (base_size + size).bit_length()))
+    return zstd.ZstdCompressionParameters.from_level(level, window_log=window_log, enable_ldm=True)
+
+
+class ArchiveStore:
+
+    def __init__(self, root, level=DEFAULT_LEVEL):
+        self.root = str(root)
+        self.level = level
+        os.makedirs(os.path.join(self.root, OBJECTS_DIR), exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(self.root, INDEX_NAME), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self._lock = threading.Lock()   # sqlite 连接在线程间共用
+        row = self.conn.execute("SELECT value FROM meta WHERE key='version'").fetchone()
+        if row is None:
+            self.conn.execute("INSERT INTO meta VALUES ('version', ?)", (str(SCHEMA_VERSION),))
+            self.conn.commit()
+        elif row[0] != str(SCHEMA_VERSION):
+            raise ArchiveError(f"归档版本不兼容: {self.root}（{row[0]}，需要 {SCHEMA_VERSION}）")
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def object_path(self, file_hash):
+        return os.path.join(self.root, OBJECTS_DIR, file_hash[:2], f"{file_hash}.zst")
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def object_info(self, file_hash):
+        """(大小, 存储大小, 方式, 基准, 深度)；不存在时返回 None"""
+        rows = self._query("SELECT size, stored_size, kind, base, depth FROM objects WHERE hash=?", (file_hash,))
+        return rows[0] if rows else None
+
+    def build_seq(self, name):
+        rows = self._query("SELECT seq FROM builds WHERE name=?", (name,))
+        if not rows:
+            raise ArchiveError(f"归档里没有版本: {name}")
+        return rows[0][0]
+
+    def build_entries(self, seq):
+        """[(路径, 哈希)]"""
+        return self._query("SELECT path, hash FROM entries WHERE build=? ORDER BY path", (seq,))
+
+    # ---------- 读取 ----------
+
+    def load(self, file_hash, cache=None):
+        """还原一个对象的完整内容（按需递归还原基准）；cache 为 BaseCache 时复用已还原的基准"""
+        if cache is not None:
+            data = cache.get(file_hash)
+            if data is not None:
+                return data
+        info = self.object_info(file_hash)
+        if info is None:
+            raise ArchiveError(f"对象不存在: {file_hash}")
+        size, _, kind, base, _ = info
+        with open(self.object_path(file_hash), "rb") as f:
+            blob = f.read()
+        if kind == KIND_DELTA:
+            base_data = self.load(base, cache)
+            data = zstd.ZstdDecompressor(dict_data=raw_dict(base_data)).decompress(blob)
+        else:
+            data = zstd.ZstdDecompressor().decompress(blob)
+        if len(data) != size:
+            raise ArchiveError(f"对象大小不符: {file_hash}（{len(data)} / {size}）")
+        if cache is not None:
+            cache.put(file_hash, data)
+        return data
+
+    # ---------- 写入 ----------
+
+    def _store_object(self, file_hash, src_path, base_hash, packs):
+        """
+        压缩并写出一个新对象，返回 objects 表的一行；文件读不到、或内容的 MD5 与来源给出的哈希不符时返回 None。
+        对象按实际读到的内容的 MD5 存放，还原时的校验才有意义。
+        """
+        try:
+            data = packs.read(src_path)
+        except (OSError, KeyError) as e:
+            print(f"警告：无法读取 {src_path}: {str(e)}")
+            return None
+        actual = hashlib.md5(data).hexdigest()
+        if actual != file_hash:
+            print(f"警告：内容与哈希不符，跳过 {src_path}（来源 {file_hash}，实际 {actual}）")
+            return None
+        full = zstd.ZstdCompressor(level=self.level).compress(data)
+        blob, kind, depth = full, KIND_FULL, 0
+        if base_hash:
+            base_info = self.object_info(base_hash)
+            if (base_info is not None and base_info[4] < MAX_CHAIN
+                    and base_info[0] + len(data) <= DELTA_MAX_SIZE):
+                base_data = self.load(base_hash)
+                params = delta_params(self.level, len(base_data), len(data))
+                delta = zstd.ZstdCompressor(dict_data=raw_dict(base_data), compression_params=params).compress(data)
+                if len(delta) < len(full):
+                    blob, kind, depth = delta, KIND_DELTA, base_info[4] + 1
+        if kind == KIND_FULL:
+            base_hash = None
+        path = self.object_path(actual)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".part"
+        with open(tmp, "wb") as f:
+            f.write(blob)
+        os.replace(tmp, path)
+        return (actual, len(data), len(blob), kind, base_hash, depth)
+
+    def add_build(self, name, entries, source="", threads=HASH_THREADS, allow_missing=False):
+        """
+        录入一个版本。entries 为 [(哈希, 相对路径, 源文件路径)]。
+        已有的内容只记索引；新内容以上一版本同路径的内容为基准尝试增量压缩。
+        有文件读不到或哈希对不上时删掉本次写出的对象并抛出 ArchiveError，整个版本不录入；
+        allow_missing 为 True 时跳过这些文件照常录入。
+        返回 (新对象数, 原始字节数, 存储字节数, 录入的文件数, 跳过的文件数)。
+        """
+        if self._query("SELECT 1 FROM builds WHERE name=?", (name,)):
+            raise ArchiveError(f"版本已归档过: {name}")
+        last = self._query("SELECT MAX(seq) FROM builds")[0][0]
+        prev = dict(self.build_entries(last)) if last else {}
+
+        pending = {}   # 哈希 → (源文件, 基准哈希)
+        for file_hash, rel, src in entries:
+            if file_hash in pending or self.object_info(file_hash) is not None:
+                continue
+            base = prev.get(rel.replace("\\", "/"))
+            pending[file_hash] = (src, base if base != file_hash else None)
+
+        with SourceReader() as packs, ThreadPoolExecutor(max_workers=max(1, threads)) as executor:
+            futures = [executor.submit(self._store_object, h, src, base, packs) for h, (src, base) in pending.items()]
+            rows = [row for row in (f.result() for f in futures) if row is not None]
+        stored = {row[0] for row in rows}
+        missing = {h for h in pending if h not in stored}
+        skipped = sum(1 for h, _, _ in entries if h in missing)
+        if skipped and not allow_missing:
+            for row in rows:
+                try:
+                    os.remove(self.object_path(row[0]))
+                except OSError:
+                    pass
+            raise ArchiveError(f"{skipped} 个文件读不到或内容与哈希不符，版本 {name} 未归档（--allow-missing 可跳过这些文件）")
+
+        seq = (last or 0) + 1
+        with self._lock, self.conn:
+            self.conn.executemany("INSERT OR IGNORE INTO objects VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self.conn.execute("INSERT INTO builds VALUES (?, ?, ?, ?)", (seq, name, source, time.time()))
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO entries VALUES (?, ?, ?)",
+                ((seq, rel.replace("\\", "/"), h) for h, rel, _ in entries if h not in missing),
+            )
+            files = self.conn.execute("SELECT COUNT(*) FROM entries WHERE build=?", (seq,)).fetchone()[0]
+        return len(rows), sum(r[1] for r in rows), sum(r[2] for r in rows), files, skipped
+
+    # ---------- 还原 ----------
+
+    def restore(self, name, output_root, threads=HASH_THREADS, verify=True, link_mode="auto"):
+        """
+        把一个版本还原到 output_root（output_root 为 None 时只在内存里还原，用于测速）。
+        同一版本里内容相同的文件只解压一次，其余用 Materializer 链接 / 克隆。
+        返回 (文件数, 字节数, 秒)。
+        """
+        seq = self.build_seq(name)
+        by_hash = {}
+        for rel, file_hash in self.build_entries(seq):
+            by_hash.setdefault(file_hash, []).append(rel)
+        cache = BaseCache(self)
+        materializer = Materializer(link_mode)
+        started = time.perf_counter()
+
+        def restore_one(file_hash, rels):
+            data = self.load(file_hash, cache)
+            if verify and hashlib.md5(data).hexdigest() != file_hash:
+                raise ArchiveError(f"校验失败: {rels[0]}（{file_hash}）")
+            if output_root is None:
+                return len(data) * len(rels)
+            first = os.path.join(output_root, rels[0])
+            os.makedirs(os.path.dirname(first), exist_ok=True)
+            with open(first, "wb") as f:
+                f.write(data)
+            for rel in rels[1:]:
+                dst = os.path.join(output_root, rel)
+                os.makedirs(os.path.dirname(dst), exist_ok=True)
+                if os.path.lexists(dst):
+                    os.remove(dst)
+                materializer.place(first, dst)
+            return len(data) * len(rels)
+
+        with ThreadPoolExecutor(max_workers=max(1, threads)) as executor:
+            total = sum(executor.map(lambda item: restore_one(*item), by_hash.items()))
+        files = sum(len(rels) for rels in by_hash.values())
+        return files, total, time.perf_counter() - started
+
+    # ---------- 统计 ----------
+
+    def report(self):
+        """[(版本名, 文件数, 原始字节数, 本版本新增对象的存储字节数, 新增对象数, 其中增量数)]"""
+        return self._query(
+            """
+            SELECT b.name,
+                   (SELECT COUNT(*) FROM entries e WHERE e.build=b.seq),
+                   (SELECT COALESCE(SUM(o.size), 0) FROM entries e JOIN objects o ON o.hash=e.hash WHERE e.build=b.seq),
+                   COALESCE(SUM(n.stored_size), 0), COUNT(n.hash), COALESCE(SUM(n.kind='delta'), 0)
+            FROM builds b
+            LEFT JOIN objects n ON n.hash IN (
+                SELECT e.hash FROM entries e WHERE e.build=b.seq
+                AND NOT EXISTS (SELECT 1 FROM entries p WHERE p.hash=e.hash AND p.build<b.seq)
+            )
+            GROUP BY b.seq ORDER BY b.seq
+            """
+        )
+
+
+class SourceReader:
+    """读取源文件：普通路径直接读，包内路径（见 AssetPack）按索引文件复用 PackReader"""
+
+    def __init__(self):
+        self._readers = {}
+        self._lock = threading.Lock()
+
+    def read(self, src_path):
+        if not is_pack_path(src_path):
+            with open(src_path, "rb") as f:
+                return f.read()
+        index_path, name = split_pack_path(src_path)
+        with self._lock:
+            reader = self._readers.get(index_path)
+            if reader is None:
+                reader = self._readers[index_path] = PackReader(index_path)
+        return reader.read(name)
+
+    def close(self):
+        with self._lock:
+            for reader in self._readers.values():
+                reader.close()
+            self._readers.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class BaseCache:
+    """还原时缓存会被其它对象当作基准的内容，避免增量链上的同一个基准被反复解压"""
+
+    def __init__(self, store, limit=BASE_CACHE_BYTES):
+        self.bases = {row[0] for row in store._query("SELECT DISTINCT base FROM objects WHERE base IS NOT NULL")}
+        self.limit = limit
+        self.used = 0
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, file_hash):
+        with self._lock:
+            return self._data.get(file_hash)
+
+    def put(self, file_hash, data):
+        if file_hash not in self.bases:
+            return
+        with self._lock:
+            if file_hash in self._data or self.used + len(data) > self.limit:
+                return
+            self._data[file_hash] = data
+            self.used += len(data)
+
+
+# ====================== 数据来源 ======================
+
+def source_entries(source, threads=HASH_THREADS):
+    """文件夹或提取清单 → [(哈希, 相对路径, 源文件路径)]；打包输出的源文件路径是包内路径（见 AssetPack）"""
+    if os.path.isdir(source):
+        return [(h, rel, os.path.join(source, rel)) for h, rel, _ in folder_entries(source, threads)]
+    if os.path.isfile(source):
+        return [(h, rel, src) for h, rel, src, _ in manifest_sources(source)]
+    raise ArchiveError(f"来源不存在: {source}")
+
+
+# ====================== 命令行 ======================
+
+def mb(n):
+    return n / 1024 / 1024
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="多版本增量归档：相同内容只存一次，改动的资源存为相对上一版本的增量")
+    parser.add_argument("store", help="归档目录")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("add", help="归档一个新版本（按版本先后依次归档）")
+    p.add_argument("name", help="版本名称")
+    p.add_argument("sources", nargs="+", help="提取清单（.jsonl / .csv）或文件夹")
+    p.add_argument("--level", type=int, default=DEFAULT_LEVEL, help=f"zstd 压缩级别（默认 {DEFAULT_LEVEL}）")
+    p.add_argument("--threads", type=int, default=HASH_THREADS, help="线程数")
+    p.add_argument("--allow-missing", action="store_true",
+                   help="有文件读不到或内容与哈希不符时跳过这些文件照常归档（默认整个版本不归档）")
+
+    p = sub.add_parser("restore", help="还原一个版本")
+    p.add_argument("name", help="版本名称")
+    p.add_argument("output", help="还原到的目录")
+    p.add_argument("--threads", type=int, default=HASH_THREADS, help="线程数")
+    p.add_argument("--no-verify", action="store_true", help="不做 MD5 校验")
+    p.add_argument("--link-mode", default="auto", choices=sorted(MODES),
+                   help="同一版本内相同内容的文件：auto 依次尝试 reflink / 硬链接 / copy_file_range / 复制")
+
+    p = sub.add_parser("report", help="各版本的压缩率；--bench 时在内存中还原每个版本测吞吐量")
+    p.add_argument("--bench", action="store_true")
+    p.add_argument("--threads", type=int, default=HASH_THREADS, help="测速线程数")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    try:
+        with ArchiveStore(args.store, getattr(args, "level", DEFAULT_LEVEL)) as store:
+            if args.command == "add":
+                started = time.perf_counter()
+                entries = []
+                for source in args.sources:
+                    entries.extend(source_entries(source, args.threads))
+                count, raw, stored, files, skipped = store.add_build(
+                    args.name, entries, ";".join(args.sources), args.threads, args.allow_missing
+                )
+                print(f"已归档版本 {args.name}：{files} 个文件，新内容 {count} 个"
+                      f"（{mb(raw):.1f} MB → {mb(stored):.1f} MB）")
+                if skipped:
+                    print(f"⚠️ 跳过 {skipped} 个读不到或内容与哈希不符的文件，还原时不会有这些文件")
+                print(f"耗时 {time.perf_counter() - started:.1f} 秒")
+            elif args.command == "restore":
+                files, total, seconds = store.restore(
+                    args.name, args.output, args.threads, not args.no_verify, args.link_mode
+                )
+                print(f"已还原 {files} 个文件，{mb(total):.1f} MB，耗时 {seconds:.2f} 秒"
+                      f"（{mb(total) / max(seconds, 1e-6):.1f} MB/s）→ {args.output}")
+            elif args.command == "report":
+                total_raw = total_stored = 0
+                print(f"{'版本':<16}{'文件':>8}{'原始 MB':>12}{'新增存储 MB':>14}{'新对象':>8}{'增量':>6}{'还原 MB/s':>12}")
+                for name, files, raw, stored, new_objects, deltas in store.report():
+                    total_raw += raw
+                    total_stored += stored
+                    speed = ""
+                    if args.bench:
+                        _, restored, seconds = store.restore(name, None, args.threads)
+                        speed = f"{mb(restored) / max(seconds, 1e-6):.1f}"
+                    print(f"{name:<16}{files:>8}{mb(raw):>12.1f}{mb(stored):>14.1f}{new_objects:>8}{deltas:>6}{speed:>12}")
+                ratio = total_raw / total_stored if total_stored else 0
+                print(f"全部版本原始 {mb(total_raw):.1f} MB，归档占用 {mb(total_stored):.1f} MB，压缩比 {ratio:.1f}x")
+    except (ArchiveError, zstd.ZstdError, sqlite3.Error, OSError) as e:
+        print(f"❌ 错误：{str(e)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import time
+import sqlite3
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from AssetMetadata import METADATA_DB_NAME
+from AssetPack import PACK_DIR_NAME, PACK_PATH_SEP, is_pack_path, split_pack_path
+from ExtractJournal import JOURNAL_DIR_NAME
+from ExtractManifest import MANIFEST_DIR_NAME, read_manifest
+from StageProfiler import PROFILE_DIR_NAME
+from 新旧对比 import HASH_CACHE_NAME, HASH_THREADS, Progress, hash_files, open_hash_cache, scan_tree
+
+# ====================== 多版本资源历史库 ======================
+# 按版本顺序录入每个版本的资源哈希（来自提取清单或直接扫描文件夹），存进本地 SQLite：
+#   builds  版本序号 / 名称 / 来源 / 文件数
+#   spans   (哈希, 相对路径) 连续出现的版本区间 [first_seq, last_seq]
+# 一个资源在相邻版本里一直存在时只占一行，录入新版本只需把上一版本结尾的区间延长。
+# “版本 X 里有哪些资源” = first_seq <= X <= last_seq，两次索引查询即可算出任意两个版本间的增删，
+# 不必再重新哈希两个文件夹。哈希统一为 MD5（与提取清单一致）。
+
+DEFAULT_DB = "asset_history.sqlite3"
+SCHEMA_VERSION = 1
+HASH_ALGO = "md5"
+# 扫描提取输出目录时跳过提取器自己写的文件（清单 / 元数据索引 / 断点日志 / PPK 耗时记录 /
+# 打包输出的包文件和索引 / 性能分析结果），否则同一份输出按清单录入和按文件夹录入会对不上；
+# 哈希缓存由 scan_tree 自己跳过。打包输出的资源要按清单录入。
+EXTRACTOR_ARTIFACTS = (
+    MANIFEST_DIR_NAME, METADATA_DB_NAME, JOURNAL_DIR_NAME, ".ppk_timings.json", PACK_DIR_NAME, PROFILE_DIR_NAME,
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS builds (
+    seq INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    source TEXT NOT NULL,
+    files INTEGER NOT NULL,
+    ingested_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS spans (
+    hash TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    first_seq INTEGER NOT NULL,
+    last_seq INTEGER NOT NULL,
+    PRIMARY KEY (hash, path, first_seq)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS spans_last ON spans (last_seq, first_seq);
+CREATE INDEX IF NOT EXISTS spans_path ON spans (path);
+"""
+
+
+class HistoryError(Exception):
+    """版本不存在、重复录入等，消息直接展示给用户"""
+
+
+class AssetHistory:
+
+    def __init__(self, db_path=DEFAULT_DB):
+        self.path = str(db_path)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        row = self.conn.execute("SELECT value FROM meta WHERE key='version'").fetchone()
+        if row is None:
+            self.conn.execute("INSERT INTO meta VALUES ('version', ?)", (str(SCHEMA_VERSION),))
+            self.conn.commit()
+        elif row[0] != str(SCHEMA_VERSION):
+            raise HistoryError(f"历史库版本不兼容: {self.path}（{row[0]}，需要 {SCHEMA_VERSION}）")
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    # ---------- 版本 ----------
+
+    def builds(self):
+        """[(序号, 名称, 来源, 文件数, 录入时间)]，按序号排列"""
+        return self.conn.execute(
+            "SELECT seq, name, source, files, ingested_at FROM builds ORDER BY seq"
+        ).fetchall()
+
+    def build_seq(self, name: str) -> int:
+        row = self.conn.execute("SELECT seq FROM builds WHERE name=?", (name,)).fetchone()
+        if row is None:
+            raise HistoryError(f"历史库里没有版本: {name}")
+        return row[0]
+
+    def build_name(self, seq: int) -> str:
+        row = self.conn.execute("SELECT name FROM builds WHERE seq=?", (seq,)).fetchone()
+        return row[0] if row else f"#{seq}"
+
+    # ---------- 录入 ----------
+
+    def ingest(self, name: str, entries, source: str = "") -> int:
+        """
+        录入一个新版本（必须比已有版本都新）。entries 为 [(哈希, 相对路径, 大小)]。
+        与上一版本相同的 (哈希, 路径) 延长区间，其余新开区间。返回录入的资源数。
+        """
+        if self.conn.execute("SELECT 1 FROM builds WHERE name=?", (name,)).fetchone():
+            raise HistoryError(f"版本已录入过: {name}")
+        last = self.conn.execute("SELECT MAX(seq) FROM builds").fetchone()[0]
+        prev_seq = last or 0
+        seq = prev_seq + 1
+        with self.conn:
+            self.conn.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS current "
+                "(hash TEXT NOT NULL, path TEXT NOT NULL, size INTEGER NOT NULL, PRIMARY KEY (hash, path)) WITHOUT ROWID"
+            )
+            self.conn.execute("DELETE FROM current")
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO current VALUES (?, ?, ?)",
+                ((h, p.replace("\\", "/"), s) for h, p, s in entries if h),
+            )
+            count = self.conn.execute("SELECT COUNT(*) FROM current").fetchone()[0]
+            self.conn.execute(
+                "INSERT INTO builds VALUES (?, ?, ?, ?, ?)", (seq, name, source, count, time.time())
+            )
+            self.conn.execute(
+                "UPDATE spans SET last_seq=? WHERE last_seq=? AND EXISTS "
+                "(SELECT 1 FROM current c WHERE c.hash=spans.hash AND c.path=spans.path)",
+                (seq, prev_seq),
+            )
+            self.conn.execute(
+                "INSERT INTO spans SELECT c.hash, c.path, c.size, ?, ? FROM current c WHERE NOT EXISTS "
+                "(SELECT 1 FROM spans s WHERE s.hash=c.hash AND s.path=c.path AND s.last_seq=?)",
+                (seq, seq, seq),
+            )
+            self.conn.execute("DELETE FROM current")
+        return count
+
+    # ---------- 查询 ----------
+
+    def added(self, old_name: str, new_name: str):
+        """新版本里有、旧版本里没有的内容（按哈希判断，改名不算新增）：[(哈希, 路径, 大小)]"""
+        old_seq = self.build_seq(old_name)
+        new_seq = self.build_seq(new_name)
+        return self.conn.execute(
+            "SELECT hash, path, size FROM spans WHERE last_seq>=? AND first_seq<=? "
+            "AND hash NOT IN (SELECT hash FROM spans WHERE last_seq>=? AND first_seq<=?) "
+            "ORDER BY path",
+            (new_seq, new_seq, old_seq, old_seq),
+        ).fetchall()
+
+    def removed(self, old_name: str, new_name: str):
+        return self.added(new_name, old_name)
+
+    def contents(self, name: str):
+        seq = self.build_seq(name)
+        return self.conn.execute(
+            "SELECT hash, path, size FROM spans WHERE last_seq>=? AND first_seq<=? ORDER BY path",
+            (seq, seq),
+        ).fetchall()
+
+    def hash_history(self, file_hash: str):
+        """包含这个哈希的所有区间：[(路径, 大小, 首个版本, 最后版本)]"""
+        rows = self.conn.execute(
+            "SELECT path, size, first_seq, last_seq FROM spans WHERE hash=? ORDER BY first_seq, path",
+            (file_hash.lower(),),
+        ).fetchall()
+        return [(p, s, self.build_name(f), self.build_name(l)) for p, s, f, l in rows]
+
+    def path_history(self, path: str):
+        """同一路径在各版本里的内容变化：[(哈希, 大小, 首个版本, 最后版本)]"""
+        rows = self.conn.execute(
+            "SELECT hash, size, first_seq, last_seq FROM spans WHERE path=? ORDER BY first_seq",
+            (path.replace("\\", "/"),),
+        ).fetchall()
+        return [(h, s, self.build_name(f), self.build_name(l)) for h, s, f, l in rows]
+
+
+# ====================== 数据来源 ======================
+
+def manifest_root(manifest_path):
+    """清单里的路径相对于哪个目录：输出目录，即清单所在 manifest 文件夹的上一级"""
+    folder = os.path.dirname(os.path.abspath(manifest_path))
+    if os.path.basename(folder) == MANIFEST_DIR_NAME:
+        folder = os.path.dirname(folder)
+    return folder
+
+
+def manifest_sources(manifest_path):
+    """
+    提取清单 → [(哈希, 相对路径, 输出文件路径, 大小)]。路径相对于 manifest_root()，
+    重复帧没有自己的文件时记在首个文件的路径下。
+    hash 列是输出文件内容的 MD5（PPK 的压缩块 MD5 在 block_hash 列，不用），与 folder_entries() 一致。
+    打包输出（见 AssetPack）的相对路径取包内成员名（分类/文件名），与散文件输出的目录结构一致；
+    输出文件路径仍是 “<索引文件>::<成员名>”，由调用方按包内路径读取。
+    """
+    folder = manifest_root(manifest_path)
+    entries = []
+    for row in read_manifest(manifest_path):
+        file_hash = row.get("hash")
+        path = row.get("path") or row.get("duplicate_of")
+        if not file_hash or not path:
+            continue
+        if is_pack_path(path):
+            index_path, name = split_pack_path(path)
+            rel = name
+            source = os.path.join(folder, relative_to(index_path, folder)) + PACK_PATH_SEP + name
+        else:
+            rel = relative_to(path, folder)
+            source = os.path.join(folder, rel)
+        entries.append((file_hash, rel, source, row.get("size", 0)))
+    return entries
+
+
+def relative_to(path, folder):
+    try:
+        return os.path.relpath(path, folder)
+    except ValueError:
+        return path
+
+
+def manifest_entries(manifest_path):
+    """提取清单 → [(哈希, 相对路径, 大小)]，见 manifest_sources()"""
+    return [(h, rel, size) for h, rel, _, size in manifest_sources(manifest_path)]
+
+
+def folder_entries(folder, threads=HASH_THREADS, use_cache=True):
+    """扫描文件夹 → [(哈希, 相对路径, 大小)]；复用 新旧对比.py 的哈希缓存，重复录入不再读盘"""
+    scanned = scan_tree(folder, skip=EXTRACTOR_ARTIFACTS)
+    cache = open_hash_cache(folder, HASH_ALGO) if use_cache else None
+    progress = Progress(f"哈希 {os.path.basename(os.path.normpath(folder))}")
+    files = [(path, size, mtime_ns, cache) for path, size, mtime_ns in scanned]
+    with ThreadPoolExecutor(max_workers=max(1, threads)) as executor:
+        digests = hash_files(files, "full", executor, HASH_ALGO, progress)
+    progress.finish()
+    if cache is not None:
+        try:
+            cache.save(scanned)
+        except sqlite3.Error as e:
+            print(f"警告：哈希缓存保存失败 {cache.path}: {str(e)}")
+    return [
+        (digests.get(path), os.path.relpath(path, folder), size)
+        for path, size, _ in scanned
+        if digests.get(path)
+    ]
+
+
+def source_entries(source, threads=HASH_THREADS, use_cache=True):
+    if os.path.isdir(source):
+        return folder_entries(source, threads, use_cache)
+    if os.path.isfile(source):
+        return manifest_entries(source)
+    raise HistoryError(f"来源不存在: {source}")
+
+
+# ====================== 命令行 ======================
+
+def format_size(size):
+    return f"{size / 1024:.1f} KB" if size < 1024 * 1024 else f"{size / 1024 / 1024:.1f} MB"
+
+
+def print_assets(rows, limit):
+    for file_hash, path, size in rows[:limit] if limit else rows:
+        print(f"{file_hash}  {format_size(size):>10}  {path}")
+    if limit and len(rows) > limit:
+        print(f"... 另有 {len(rows) - limit} 个（--limit 0 显示全部）")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="多版本资源历史库：录入每个版本的资源哈希，快速查询版本间增删")
+    parser.add_argument("-d", "--db", default=DEFAULT_DB, help=f"历史库路径（默认 {DEFAULT_DB}）")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("ingest", help="录入一个新版本（按版本先后依次录入）")
+    p.add_argument("name", help="版本名称，如 1.0.3")
+    p.add_argument("sources", nargs="+", help="提取清单（.jsonl / .csv）或文件夹，可以多个")
+    p.add_argument("--threads", type=int, default=HASH_THREADS, help="扫描文件夹时的哈希线程数")
+    p.add_argument("--no-cache", action="store_true", help=f"扫描文件夹时不读写 {HASH_CACHE_NAME}")
+
+    sub.add_parser("builds", help="列出已录入的版本")
+
+    for command, help_text in (("added", "B 比 A 新增的资源"), ("removed", "B 比 A 删除的资源")):
+        p = sub.add_parser(command, help=help_text)
+        p.add_argument("old", help="版本 A")
+        p.add_argument("new", help="版本 B")
+        p.add_argument("--limit", type=int, default=200, help="最多显示多少条（0 为全部）")
+
+    p = sub.add_parser("hash", help="哪些版本里出现过这个哈希")
+    p.add_argument("hash")
+
+    p = sub.add_parser("path", help="某个路径在各版本里的内容变化")
+    p.add_argument("path")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    started = time.perf_counter()
+    try:
+        with AssetHistory(args.db) as history:
+            if args.command == "ingest":
+                entries = []
+                for source in args.sources:
+                    entries.extend(source_entries(source, args.threads, not args.no_cache))
+                count = history.ingest(args.name, entries, ";".join(args.sources))
+                print(f"已录入版本 {args.name}：{count} 个资源")
+            elif args.command == "builds":
+                for seq, name, source, files, ingested_at in history.builds():
+                    when = time.strftime("%Y-%m-%d %H:%M", time.localtime(ingested_at))
+                    print(f"{seq:>4}  {name:<20} {files:>8} 个资源  {when}  {source}")
+            elif args.command in ("added", "removed"):
+                query = history.added if args.command == "added" else history.removed
+                rows = query(args.old, args.new)
+                print_assets(rows, args.limit)
+                label = "新增" if args.command == "added" else "删除"
+                print(f"{args.old} → {args.new}：{label} {len(rows)} 个资源")
+            elif args.command == "hash":
+                rows = history.hash_history(args.hash)
+                for path, size, first, last in rows:
+                    print(f"{first} ~ {last}  {format_size(size):>10}  {path}")
+                if not rows:
+                    print("没有任何版本包含这个哈希")
+            elif args.command == "path":
+                rows = history.path_history(args.path)
+                for file_hash, size, first, last in rows:
+                    print(f"{first} ~ {last}  {file_hash}  {format_size(size):>10}")
+                if not rows:
+                    print("没有任何版本包含这个路径")
+    except (HistoryError, sqlite3.Error, OSError) as e:
+        print(f"❌ 错误：{str(e)}")
+        sys.exit(1)
+    print(f"耗时 {(time.perf_counter() - started) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,480 @@
+# -*- coding: utf-8 -*-
+import os
+import re
+import sys
+import json
+import struct
+import sqlite3
+import argparse
+import threading
+
+from ExtractManifest import MANIFEST_DIR_NAME
+
+# ====================== 资源属性（只读文件头） ======================
+# 解压后顺带从文件头里取几个属性，代价只是解析几十个字节：
+#   图片（PNG / DDS / KTX / TGA）  width / height / max_side / format / mips
+#   音频（RIFF / WEM 的 fmt 块）   channels / sample_rate / duration / format
+#   模型（.mesh 头）               vertices / faces / submeshes（头部能完整解析时）
+# 属性放进文件信息的 "meta"，同时写入输出目录下的 sqlite 索引（manifest/metadata.sqlite），
+# GUI 按属性过滤 / 排序，以后从清单恢复文件列表时也能从索引取回属性。
+# 过滤语法：空格分隔的若干条件，全部满足才算匹配，例如  边长>=2048  时长<5  格式=BC7  声道=2
+
+METADATA_DB_NAME = "metadata.sqlite"
+COMMIT_EVERY = 500
+RIFF_MAX_CHUNKS = 64
+MESH_MAX_BONES = 1024
+MESH_MAX_SUBMESHES = 4096
+MAX_TEXTURE_SIDE = 65536
+MAX_CHANNELS = 64
+MAX_SAMPLE_RATE = 768000
+
+# 列名 → sqlite 类型；顺序即表结构
+META_COLUMNS = {
+    "width": "INTEGER",
+    "height": "INTEGER",
+    "max_side": "INTEGER",
+    "format": "TEXT",
+    "mips": "INTEGER",
+    "channels": "INTEGER",
+    "sample_rate": "INTEGER",
+    "duration": "REAL",
+    "vertices": "INTEGER",
+    "faces": "INTEGER",
+    "submeshes": "INTEGER",
+}
+INDEXED_COLUMNS = ("max_side", "width", "height", "format", "duration", "channels", "vertices")
+
+# 过滤条件里可以用的名字
+FILTER_ALIASES = {
+    "宽": "width", "w": "width", "width": "width",
+    "高": "height", "h": "height", "height": "height",
+    "边长": "max_side", "side": "max_side", "px": "max_side",
+    "格式": "format", "fmt": "format", "format": "format",
+    "mip": "mips", "mips": "mips",
+    "声道": "channels", "ch": "channels", "channels": "channels",
+    "采样率": "sample_rate", "rate": "sample_rate", "sample_rate": "sample_rate",
+    "时长": "duration", "dur": "duration", "duration": "duration",
+    "顶点": "vertices", "verts": "vertices", "vertices": "vertices",
+    "面": "faces", "faces": "faces",
+    "子网格": "submeshes", "submeshes": "submeshes",
+}
+FILTER_OPS = {">=": ">=", "<=": "<=", "!=": "!=", "==": "=", "=": "=", ">": ">", "<": "<", "≥": ">=", "≤": "<="}
+FILTER_TERM = re.compile(r"^(?P<key>[^<>=!≥≤\s]+)\s*(?P<op>>=|<=|!=|==|=|>|<|≥|≤)\s*(?P<value>\S+)$")
+
+
+# ====================== 图片 ======================
+
+PNG_COLOR_TYPES = {0: "L", 2: "RGB", 3: "P", 4: "LA", 6: "RGBA"}
+
+DDS_DXGI_NAMES = {
+    2: "RGBA32F", 10: "RGBA16F", 24: "RGB10A2", 28: "RGBA8", 29: "RGBA8_SRGB", 41: "R32F", 49: "RG8",
+    54: "R16F", 61: "R8", 65: "A8", 71: "BC1", 72: "BC1_SRGB", 74: "BC2", 75: "BC2_SRGB", 77: "BC3",
+    78: "BC3_SRGB", 80: "BC4", 81: "BC4_SNORM", 83: "BC5", 84: "BC5_SNORM", 85: "B5G6R5", 86: "B5G5R5A1",
+    87: "BGRA8", 88: "BGRX8", 91: "BGRA8_SRGB", 93: "BGRX8_SRGB", 95: "BC6H_UF16", 96: "BC6H_SF16",
+    98: "BC7", 99: "BC7_SRGB", 115: "B4G4R4A4",
+}
+DDS_FOURCC_NAMES = {
+    b"DXT1": "BC1", b"DXT2": "BC2", b"DXT3": "BC2", b"DXT4": "BC3", b"DXT5": "BC3",
+    b"ATI1": "BC4", b"BC4U": "BC4", b"BC4S": "BC4_SNORM", b"ATI2": "BC5", b"BC5U": "BC5", b"BC5S": "BC5_SNORM",
+}
+KTX_FORMAT_NAMES = {
+    0x8D64: "ETC1", 0x9274: "ETC2_RGB8", 0x9275: "ETC2_SRGB8", 0x9276: "ETC2_RGB8A1", 0x9278: "ETC2_RGBA8",
+    0x9279: "ETC2_SRGB8_A8", 0x9270: "EAC_R11", 0x9272: "EAC_RG11",
+    0x83F0: "BC1", 0x83F1: "BC1", 0x83F2: "BC2", 0x83F3: "BC3",
+    0x8C00: "PVRTC_RGB4", 0x8C01: "PVRTC_RGB2", 0x8C02: "PVRTC_RGBA4", 0x8C03: "PVRTC_RGBA2",
+    0x8058: "RGBA8", 0x8051: "RGB8", 0x8C43: "RGBA8_SRGB", 0x881A: "RGBA16F", 0x8814: "RGBA32F",
+    0x1908: "RGBA8", 0x1907: "RGB8", 0x1909: "L8", 0x1906: "A8",
+}
+# GL_COMPRESSED_RGBA_ASTC_4x4 起的块尺寸，SRGB 版本从 0x93D0 起同样排列
+ASTC_BLOCKS = ("4x4", "5x4", "5x5", "6x5", "6x6", "8x5", "8x6", "8x8",
+               "10x5", "10x6", "10x8", "10x10", "12x10", "12x12")
+
+
+def _image(width, height, fmt, mips=1):
+    # 魔数碰巧对上的随机数据：尺寸离谱就当作没有属性
+    if not (0 < width <= MAX_TEXTURE_SIDE and 0 < height <= MAX_TEXTURE_SIDE):
+        return {}
+    return {"width": width, "height": height, "max_side": max(width, height), "format": fmt, "mips": mips}
+
+
+def probe_png(data):
+    if len(data) < 33 or bytes(data[12:16]) != b"IHDR":
+        return {}
+    width, height, depth, color_type = struct.unpack_from(">IIBB", data, 16)
+    return _image(width, height, f"{PNG_COLOR_TYPES.get(color_type, '?')}{depth}")
+
+
+def probe_dds(data):
+    if len(data) < 128 or struct.unpack_from("<I", data, 4)[0] != 124:
+        return {}
+    height, width, _, _, mips = struct.unpack_from("<5I", data, 12)
+    pf_flags, fourcc, bits = struct.unpack_from("<I4sI", data, 80)
+    if pf_flags & 0x4:
+        if fourcc == b"DX10" and len(data) >= 132:
+            dxgi = struct.unpack_from("<I", data, 128)[0]
+            fmt = DDS_DXGI_NAMES.get(dxgi, f"DXGI_{dxgi}")
+        else:
+            fmt = DDS_FOURCC_NAMES.get(fourcc)
+            if fmt is None:
+                fmt = fourcc.decode("ascii") if fourcc.isalnum() else f"0x{int.from_bytes(fourcc, 'little'):08X}"
+    elif pf_flags & 0x20000:
+        fmt = f"L{bits}"
+    elif pf_flags & 0x40:
+        fmt = f"RGBA{bits}" if pf_flags & 0x1 else f"RGB{bits}"
+    elif pf_flags & 0x2:
+        fmt = f"A{bits}"
+    else:
+        fmt = "?"
+    return _image(width, height, fmt, max(1, mips))
+
+
+def probe_ktx(data):
+    if len(data) < 64:
+        return {}
+    endianness = struct.unpack_from("<I", data, 12)[0]
+    if endianness not in (0x04030201, 0x01020304):
+        return {}
+    endian = "<" if endianness == 0x04030201 else ">"
+    fields = struct.unpack_from(endian + "12I", data, 16)
+    internal_format, width, height, mips = fields[3], fields[5], fields[6], fields[10]
+    fmt = KTX_FORMAT_NAMES.get(internal_format)
+    if fmt is None:
+        for base in (0x93B0, 0x93D0):
+            if base <= internal_format < base + len(ASTC_BLOCKS):
+                fmt = f"ASTC_{ASTC_BLOCKS[internal_format - base]}" + ("_SRGB" if base == 0x93D0 else "")
+                break
+        else:
+            fmt = f"GL_0x{internal_format:X}"
+    return _image(width, max(1, height), fmt, max(1, mips))
+
+
+def probe_tga(data):
+    if len(data) < 18:
+        return {}
+    image_type = data[2]
+    width, height, depth = struct.unpack_from("<HHB", data, 12)
+    if image_type not in (1, 2, 3, 9, 10, 11) or depth not in (8, 15, 16, 24, 32):
+        return {}
+    return _image(width, height, f"TGA{depth}" + ("_RLE" if image_type >= 9 else ""))
+
+
+# ====================== 音频 ======================
+
+AUDIO_FORMATS = {
+    0x0001: "PCM", 0x0002: "ADPCM", 0x0003: "PCM_FLOAT", 0x0011: "IMA_ADPCM", 0x0055: "MP3",
+    0x3040: "Opus", 0x3041: "Opus", 0xFFFE: "Extensible", 0xFFFF: "Vorbis",
+}
+
+
+def probe_riff(data):
+    """RIFF / WEM：走一遍块头（只读每块 8 字节），取 fmt / data / vorb"""
+    if len(data) < 12:
+        return {}
+    pos = 12
+    fmt = None
+    data_size = None
+    vorb = None
+    for _ in range(RIFF_MAX_CHUNKS):
+        if pos + 8 > len(data):
+            break
+        chunk_id = bytes(data[pos:pos + 4])
+        size = struct.unpack_from("<I", data, pos + 4)[0]
+        body = pos + 8
+        if chunk_id == b"fmt " and size >= 16 and body + 16 <= len(data):
+            fmt = (body, size)
+        elif chunk_id == b"data":
+            data_size = min(size, len(data) - body)
+        elif chunk_id == b"vorb" and body + 4 <= len(data):
+            vorb = body
+        pos = body + size + (size & 1)
+    if fmt is None:
+        return {}
+    body, size = fmt
+    tag, channels, rate, avg_bytes, block_align = struct.unpack_from("<HHIIH", data, body)
+    if not (0 < channels <= MAX_CHANNELS and 0 < rate <= MAX_SAMPLE_RATE):
+        return {}
+    meta = {"format": AUDIO_FORMATS.get(tag, f"0x{tag:04X}"), "channels": channels, "sample_rate": rate}
+    samples = None
+    if tag == 0xFFFF:
+        # Wwise Vorbis：样本数在扩展 fmt（0x42 字节）的 0x18 处，旧版本在单独的 vorb 块开头
+        if size >= 0x42 and body + 0x1C <= len(data):
+            samples = struct.unpack_from("<I", data, body + 0x18)[0]
+        elif vorb is not None:
+            samples = struct.unpack_from("<I", data, vorb)[0]
+    elif tag in (0x0001, 0x0003) and data_size is not None and block_align:
+        samples = data_size // block_align
+    if samples is not None and rate:
+        meta["duration"] = round(samples / rate, 3)
+    elif data_size is not None and avg_bytes:
+        meta["duration"] = round(data_size / avg_bytes, 3)
+    return meta
+
+
+# ====================== 模型 ======================
+
+def probe_mesh(data):
+    """
+    NeoX .mesh：magic + 版本，骨骼段（有骨骼时），然后是子网格表（每项顶点数 / 面数 / 标志 / 颜色长度，
+    以 u16 1 结尾）和总顶点数 / 面数。格式没有文档，只有子网格之和与总数对得上才采用。
+    """
+    try:
+        pos = 8
+        bone_flag = struct.unpack_from("<I", data, pos)[0]
+        pos += 4
+        if bone_flag:
+            if bone_flag > 1:
+                pos += 3 + data[pos] * 4
+            bone_count = struct.unpack_from("<H", data, pos)[0]
+            if bone_count > MESH_MAX_BONES:
+                return {}
+            pos += 2 + bone_count           # 父节点
+            pos += bone_count * 32          # 骨骼名
+            has_extra = data[pos]
+            pos += 1 + (bone_count * 28 if has_extra else 0)
+            pos += bone_count * 64          # 4x4 矩阵
+            if data[pos] != 0:
+                return {}
+            pos += 1
+        pos += 4
+        submeshes = []
+        while True:
+            if struct.unpack_from("<H", data, pos)[0] == 1:
+                pos += 2
+                break
+            vertices, faces = struct.unpack_from("<II", data, pos)
+            submeshes.append((vertices, faces))
+            pos += 10
+            if len(submeshes) > MESH_MAX_SUBMESHES:
+                return {}
+        vertices, faces = struct.unpack_from("<II", data, pos)
+    except (struct.error, IndexError):
+        return {}
+    if not submeshes or sum(v for v, _ in submeshes) != vertices or sum(f for _, f in submeshes) != faces:
+        return {}
+    if vertices * 12 + faces * 6 > len(data):
+        return {}
+    return {"vertices": vertices, "faces": faces, "submeshes": len(submeshes)}
+
+
+PROBES = {
+    ".png": probe_png,
+    ".dds": probe_dds,
+    ".ktx": probe_ktx,
+    ".tga": probe_tga,
+    ".wem": probe_riff,
+    ".mesh": probe_mesh,
+}
+
+
+def probe_metadata(data, ext: str) -> dict:
+    """按扩展名解析文件头；不认识或解析失败返回空字典，从不抛异常"""
+    probe = PROBES.get(ext)
+    if probe is None:
+        return {}
+    try:
+        return probe(data)
+    except (struct.error, IndexError, ValueError):
+        return {}
+
+
+def describe(meta: dict) -> str:
+    """表格里显示的一行摘要"""
+    if not meta:
+        return ""
+    if "width" in meta:
+        text = f"{meta['width']}x{meta['height']} {meta.get('format', '')}"
+        return text + (f" {meta['mips']}mip" if meta.get("mips", 1) > 1 else "")
+    if "channels" in meta:
+        parts = [f"{meta['duration']:.2f}s"] if "duration" in meta else []
+        parts += [f"{meta['channels']}ch", f"{meta['sample_rate']}Hz", meta.get("format", "")]
+        return " ".join(parts)
+    if "vertices" in meta:
+        return f"{meta['vertices']} 顶点 / {meta['faces']} 面"
+    return ""
+
+
+def sort_key(meta: dict):
+    """属性列排序用的数值：图片按最长边，音频按时长，模型按顶点数"""
+    for key in ("max_side", "duration", "vertices"):
+        if key in meta:
+            return meta[key]
+    return -1
+
+
+# ====================== 过滤条件 ======================
+
+def parse_filter(text: str):
+    """“边长>=2048 格式=BC7” → [(列名, 运算符, 值)]；语法错误抛 ValueError"""
+    terms = []
+    for token in re.findall(r"[^\s<>=!≥≤]+\s*(?:>=|<=|!=|==|=|>|<|≥|≤)\s*\S+|\S+", text.strip()):
+        m = FILTER_TERM.match(token)
+        if not m:
+            raise ValueError(f"无法解析的条件: {token}")
+        column = FILTER_ALIASES.get(m.group("key").lower())
+        if column is None:
+            raise ValueError(f"未知的属性: {m.group('key')}")
+        op = FILTER_OPS[m.group("op")]
+        value = m.group("value")
+        if META_COLUMNS[column] == "TEXT":
+            if op not in ("=", "!="):
+                raise ValueError(f"{m.group('key')} 只能用 = 或 !=")
+            value = value.upper()
+        else:
+            try:
+                value = float(value.lower().rstrip("spx"))
+            except ValueError:
+                raise ValueError(f"{m.group('key')} 需要数字: {value}") from None
+        terms.append((column, op, value))
+    return terms
+
+
+def match_filter(meta: dict, terms) -> bool:
+    for column, op, value in terms:
+        actual = meta.get(column) if meta else None
+        if actual is None:
+            return False
+        if isinstance(value, str):
+            actual = str(actual).upper()
+        if not {
+            "=": actual == value, "!=": actual != value, ">": actual > value,
+            "<": actual < value, ">=": actual >= value, "<=": actual <= value,
+        }[op]:
+            return False
+    return True
+
+
+def filter_sql(terms):
+    """过滤条件 → (WHERE 子句, 参数)；列名来自白名单，值走参数绑定"""
+    if not terms:
+        return "1", []
+    clauses = []
+    params = []
+    for column, op, value in terms:
+        if isinstance(value, str):
+            clauses.append(f"UPPER({column}) {op} ?")
+        else:
+            clauses.append(f"{column} {op} ?")
+        params.append(value)
+    return " AND ".join(clauses), params
+
+
+# ====================== 索引 ======================
+
+def default_metadata_path(output_root):
+    return os.path.join(str(output_root), MANIFEST_DIR_NAME, METADATA_DB_NAME)
+
+
+class MetadataIndex:
+    """
+    sqlite 属性索引，一个输出目录一份，按输出路径去重（续传 / 重新解包时覆盖）。
+    写入是线程安全的，每 COMMIT_EVERY 行提交一次；GUI 可以同时用另一个连接读。
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        columns = ", ".join(f"{name} {kind}" for name, kind in META_COLUMNS.items())
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS assets (path TEXT PRIMARY KEY, container TEXT, name TEXT, ext TEXT, "
+            f"category TEXT, size INTEGER, hash TEXT, {columns})"
+        )
+        for column in INDEXED_COLUMNS + ("category",):
+            self._db.execute(f"CREATE INDEX IF NOT EXISTS idx_assets_{column} ON assets ({column})")
+        self._db.commit()
+        self._fields = ("path", "container", "name", "ext", "category", "size", "hash") + tuple(META_COLUMNS)
+        self._insert = (f"INSERT OR REPLACE INTO assets ({', '.join(self._fields)}) "
+                        f"VALUES ({', '.join('?' * len(self._fields))})")
+        self._uncommitted = 0
+
+    def add(self, info: dict, container: str = ""):
+        meta = info.get("meta") or {}
+        row = (
+            str(info.get("path", "")), str(container), info.get("name", ""), info.get("ext", ""),
+            info.get("category", ""), info.get("size", 0), info.get("hash", ""),
+        ) + tuple(meta.get(name) for name in META_COLUMNS)
+        with self._lock:
+            self._db.execute(self._insert, row)
+            self._uncommitted += 1
+            if self._uncommitted >= COMMIT_EVERY:
+                self._db.commit()
+                self._uncommitted = 0
+
+    def query(self, terms=(), order_by: str = "", descending: bool = False):
+        """返回匹配条件的文件信息（带 meta）列表"""
+        where, params = filter_sql(terms)
+        sql = f"SELECT {', '.join(self._fields)} FROM assets WHERE {where}"
+        if order_by:
+            if order_by not in META_COLUMNS and order_by not in ("size", "name", "path"):
+                raise ValueError(f"不能按 {order_by} 排序")
+            # 没有这个属性的文件总排在最后
+            sql += f" ORDER BY {order_by} IS NULL, {order_by} {'DESC' if descending else 'ASC'}"
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        return [self._row_to_info(row) for row in rows]
+
+    def lookup(self, paths):
+        """输出路径 → meta；没有记录的路径不出现在结果里"""
+        result = {}
+        paths = [str(p) for p in paths]
+        with self._lock:
+            for start in range(0, len(paths), 500):
+                chunk = paths[start:start + 500]
+                sql = (f"SELECT path, {', '.join(META_COLUMNS)} FROM assets "
+                       f"WHERE path IN ({', '.join('?' * len(chunk))})")
+                for row in self._db.execute(sql, chunk):
+                    result[row[0]] = {k: v for k, v in zip(META_COLUMNS, row[1:]) if v is not None}
+        return result
+
+    def _row_to_info(self, row):
+        info = dict(zip(self._fields[:7], row[:7]))
+        info["meta"] = {k: v for k, v in zip(META_COLUMNS, row[7:]) if v is not None}
+        return info
+
+    def close(self):
+        with self._lock:
+            self._db.commit()
+            self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+# ====================== 独立运行：查询索引 ======================
+
+def main():
+    parser = argparse.ArgumentParser(description="按属性查询解包输出的 metadata.sqlite")
+    parser.add_argument("index", help="metadata.sqlite，或包含 manifest/metadata.sqlite 的输出目录")
+    parser.add_argument("filter", nargs="*", help="过滤条件，例如 边长>=2048 时长<5 格式=BC7")
+    parser.add_argument("--sort", default="", help="排序列，例如 max_side / duration / vertices / size")
+    parser.add_argument("--desc", action="store_true", help="降序")
+    parser.add_argument("--json", action="store_true", help="每行输出一个 JSON")
+    args = parser.parse_args()
+
+    path = args.index
+    if os.path.isdir(path):
+        path = default_metadata_path(path)
+    if not os.path.exists(path):
+        sys.exit(f"索引不存在: {path}")
+    try:
+        terms = parse_filter(" ".join(args.filter))
+        with MetadataIndex(path) as index:
+            infos = index.query(terms, args.sort, args.desc)
+    except ValueError as e:
+        sys.exit(str(e))
+    for info in infos:
+        if args.json:
+            print(json.dumps(info, ensure_ascii=False))
+        else:
+            print(f"{describe(info['meta']):<32} {info['path']}")
+    print(f"共 {len(infos)} 个文件", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import hashlib
+import threading
+
+# ====================== 单文件打包输出 ======================
+# 不再每帧单独建一个文件（大量 open / mkdir / close，在 NTFS + 杀毒软件和 NAS 上是主要耗时），
+# 而是把所有解压结果顺序追加到少数几个包文件里，另写一份紧凑索引：
+#   pack/<容器名>.000.pack, .001.pack ...  数据（单个包超过 PACK_MAX_SIZE 换下一个）
+#   pack/<容器名>.packidx.jsonl            索引，每行：name / category / ext / pack / offset / size / hash
+# 包内文件在清单和 GUI 里用 “<索引文件>::<分类>/<文件名>” 表示，PackReader 按需读取或导出为散文件。
+
+PACK_DIR_NAME = "pack"
+INDEX_SUFFIX = ".packidx.jsonl"
+PACK_MAX_SIZE = 4 * 1024 * 1024 * 1024
+PACK_PATH_SEP = "::"
+WRITE_BUFFER_SIZE = 8 * 1024 * 1024
+
+
+def default_pack_index(output_root, input_path):
+    name = os.path.basename(os.path.normpath(str(input_path)))
+    return os.path.join(str(output_root), PACK_DIR_NAME, name + INDEX_SUFFIX)
+
+
+def data_file_path(index_path, number):
+    base = str(index_path)
+    if base.endswith(INDEX_SUFFIX):
+        base = base[:-len(INDEX_SUFFIX)]
+    return f"{base}.{number:03d}.pack"
+
+
+def is_pack_path(path) -> bool:
+    return PACK_PATH_SEP in str(path)
+
+
+def split_pack_path(path):
+    """“<索引文件>::<成员名>” → (索引文件, 成员名)"""
+    index_path, _, name = str(path).partition(PACK_PATH_SEP)
+    return index_path, name
+
+
+def member_path(index_path, category, filename):
+    return f"{index_path}{PACK_PATH_SEP}{category}/{filename}"
+
+
+# ====================== 写入 ======================
+
+class PackWriter:
+    """
+    线程安全的顺序追加写入。数据带大缓冲区写，索引逐行写；崩溃时索引里指向未落盘数据的条目
+    会被 PackReader 当作无效丢弃（续传时按需重新提取）。
+    append=True 时在已有包后面继续追加（断点续传），否则清空重写。
+    """
+
+    def __init__(self, index_path, append: bool = False, max_size: int = PACK_MAX_SIZE):
+        self.index_path = str(index_path)
+        self.max_size = max_size
+        os.makedirs(os.path.dirname(os.path.abspath(self.index_path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._entries = {}
+        self.number = 0
+        if append and os.path.exists(self.index_path):
+            reader = PackReader(self.index_path)
+            reader.close()
+            while os.path.exists(data_file_path(self.index_path, self.number + 1)):
+                self.number += 1
+            # 只保留有效条目重写索引：否则崩溃时没落盘的旧条目会指向接下来追加的新数据
+            self._index = open(self.index_path, "w", encoding="utf-8")
+            for entry in sorted(reader.entries.values(), key=lambda e: (e["pack"], e["offset"])):
+                self._write_entry(entry)
+        else:
+            self._remove_data_files()
+            self._index = open(self.index_path, "w", encoding="utf-8")
+        self._data = open(data_file_path(self.index_path, self.number), "ab", buffering=WRITE_BUFFER_SIZE)
+        self.offset = self._data.tell()
+        self.bytes_written = 0
+
+    def _remove_data_files(self):
+        number = 0
+        while os.path.exists(data_file_path(self.index_path, number)):
+            os.remove(data_file_path(self.index_path, number))
+            number += 1
+
+    def _write_entry(self, entry):
+        self._index.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._entries[entry["name"]] = entry
+
+    def add(self, category: str, filename: str, payload, file_hash: str = "", ext: str = "") -> str:
+        """追加一个文件，返回它的包内路径"""
+        name = f"{category}/{filename}"
+        with self._lock:
+            if self.offset and self.offset + len(payload) > self.max_size:
+                self._data.close()
+                self.number += 1
+                self._data = open(data_file_path(self.index_path, self.number), "ab",
+                                  buffering=WRITE_BUFFER_SIZE)
+                self.offset = self._data.tell()
+            self._data.write(payload)
+            self._write_entry({
+                "name": name, "category": category, "ext": ext,
+                "pack": self.number, "offset": self.offset, "size": len(payload), "hash": file_hash,
+            })
+            self.offset += len(payload)
+            self.bytes_written += len(payload)
+        return member_path(self.index_path, category, filename)
+
+    def alias(self, target_path: str, category: str, filename: str):
+        """为包里已有的内容再加一个名字（重复帧），不复制数据；目标还没写入时返回 None"""
+        _, target = split_pack_path(target_path)
+        name = f"{category}/{filename}"
+        with self._lock:
+            entry = self._entries.get(target)
+            if entry is None:
+                return None
+            self._write_entry(dict(entry, name=name, category=category))
+        return member_path(self.index_path, category, filename)
+
+    def __contains__(self, name):
+        with self._lock:
+            return name in self._entries
+
+    def read(self, name: str) -> bytes:
+        """读回已写入的文件（续传时补做转换用）；还在写缓冲区里的数据先落盘"""
+        with self._lock:
+            entry = self._entries[name]
+            if entry["pack"] == self.number:
+                self._data.flush()
+        with open(data_file_path(self.index_path, entry["pack"]), "rb") as f:
+            f.seek(entry["offset"])
+            return f.read(entry["size"])
+
+    def flush(self):
+        with self._lock:
+            self._data.flush()
+            self._index.flush()
+
+    def close(self):
+        with self._lock:
+            if not self._data.closed:
+                self._data.close()
+            if not self._index.closed:
+                self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+# ====================== 读取 ======================
+
+class PackReader:
+    """读取包索引；read() / export() 按需取出单个文件"""
+
+    def __init__(self, index_path):
+        self.index_path = str(index_path)
+        self._lock = threading.Lock()
+        self._files = {}
+        sizes = {}
+        self.entries = {}
+        with open(self.index_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                number = entry["pack"]
+                if number not in sizes:
+                    try:
+                        sizes[number] = os.path.getsize(data_file_path(self.index_path, number))
+                    except OSError:
+                        sizes[number] = 0
+                # 数据没来得及落盘的条目（崩溃）不算数
+                if entry["offset"] + entry["size"] <= sizes[number]:
+                    self.entries[entry["name"]] = entry
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries.values())
+
+    def read(self, name: str, verify: bool = False) -> bytes:
+        entry = self.entries[name]
+        with self._lock:
+            f = self._files.get(entry["pack"])
+            if f is None:
+                f = self._files[entry["pack"]] = open(data_file_path(self.index_path, entry["pack"]), "rb")
+            f.seek(entry["offset"])
+            data = f.read(entry["size"])
+        if verify and entry.get("hash") and hashlib.md5(data).hexdigest() != entry["hash"]:
+            raise ValueError(f"包内文件校验失败: {name}")
+        return data
+
+    def export(self, names, target_dir, keep_folders: bool = True):
+        """导出为散文件，keep_folders 时保留分类文件夹；返回写出的路径列表"""
+        written = []
+        for name in names:
+            rel = name if keep_folders else name.rsplit("/", 1)[-1]
+            path = os.path.join(str(target_dir), *rel.split("/"))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(self.read(name))
+            written.append(path)
+        return written
+
+    def close(self):
+        with self._lock:
+            for f in self._files.values():
+                f.close()
+            self._files.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def open_pack_path(path):
+    """包内路径 → (PackReader, 成员名)；调用方负责 close()"""
+    index_path, name = split_pack_path(path)
+    return PackReader(index_path), name
+
+
+def pack_member_size(path):
+    """包内文件的大小；索引 / 数据不存在或条目无效时返回 None"""
+    try:
+        reader, name = open_pack_path(path)
+    except OSError:
+        return None
+    with reader:
+        entry = reader.entries.get(name)
+        return entry["size"] if entry else None
+
+
+def export_pack_paths(paths, target_dir, keep_folders: bool = True):
+    """把一批包内路径（可以来自不同的包）导出为散文件，返回写出的路径列表"""
+    by_index = {}
+    for path in paths:
+        index_path, name = split_pack_path(path)
+        by_index.setdefault(index_path, []).append(name)
+    written = []
+    for index_path, names in by_index.items():
+        with PackReader(index_path) as reader:
+            written.extend(reader.export([n for n in names if n in reader], target_dir, keep_folders))
+    return written
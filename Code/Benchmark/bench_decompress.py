@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import time
+import random
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import zstandard as zstd
+
+from ZstdFrames import decompress_batch, decompress_frame, frame_spans, plan_batches
+
+# ====================== 单帧解压开销微基准 ======================
+# 大量小帧的容器上比较每帧的固定开销：
+#   new_ctx_tail   每帧新建 ZstdDecompressor，并把帧后面的整段数据切片传入（原 NpkUnlocker）
+#   new_ctx_obj    每帧新建 ZstdDecompressor().decompressobj()，按 1 MB 分块喂入（原 ExtractJob）
+#   pooled         ZstdFrames.decompress_frame：线程内复用解压上下文，只传入这一帧，按帧头大小一次分配
+#   batch          ZstdFrames.decompress_batch：multi_decompress_to_buffer 整批在 C 线程里解压（线程数直接交给 zstd）
+# 帧头不写解压后大小（--no-content-size）时 pooled 走流式分支，可以看到两种分支的差别。
+
+DEFAULT_FRAMES = 5000
+DEFAULT_PAYLOAD = 512
+DEFAULT_REPEAT = 3
+DECOMPRESS_CHUNK_SIZE = 1024 * 1024
+
+
+def make_small_frames(count, payload, content_size, seed):
+    rng = random.Random(seed)
+    cctx = zstd.ZstdCompressor(level=3, write_content_size=content_size)
+    words = [bytes(rng.getrandbits(8) for _ in range(8)) for _ in range(64)]
+    parts = []
+    for _ in range(count):
+        size = rng.randint(payload // 2, payload * 2)
+        body = b"".join(rng.choice(words) for _ in range(size // 8 + 1))[:size]
+        parts.append(cctx.compress(body))
+        parts.append(b"\0" * rng.randint(0, 16))
+    return b"".join(parts)
+
+
+def new_ctx_tail(data, positions):
+    total = 0
+    for pos in positions:
+        # 原实现没有大小时会报错，这里用 decompressobj 兜底，只计开销
+        try:
+            total += len(zstd.ZstdDecompressor().decompress(data[pos:]))
+        except zstd.ZstdError:
+            total += len(zstd.ZstdDecompressor().decompressobj().decompress(data[pos:]))
+    return total
+
+
+def new_ctx_obj(data, positions):
+    total = 0
+    with memoryview(data) as view:
+        for pos in positions:
+            dobj = zstd.ZstdDecompressor().decompressobj()
+            total += len(dobj.decompress(view[pos:pos + DECOMPRESS_CHUNK_SIZE]))
+    return total
+
+
+def pooled(data, positions):
+    total = 0
+    for pos in positions:
+        total += len(decompress_frame(data, pos)[0])
+    return total
+
+
+def batch(data, positions, threads=1):
+    batches, singles = plan_batches(data, list(enumerate(positions)))
+    total = sum(len(decompress_frame(data, pos)[0]) for _, pos in singles)
+    for b in batches:
+        total += decompress_batch(data, b, threads if threads > 1 else 0).size()
+    return total
+
+
+def run(fn, data, positions, threads):
+    if fn is batch:
+        return batch(data, positions, threads)
+    if threads <= 1:
+        return fn(data, positions)
+    parts = [positions[i::threads] for i in range(threads)]
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        return sum(executor.map(lambda p: fn(data, p), parts))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="单帧解压开销微基准：每帧新建解压器 vs 线程内复用")
+    parser.add_argument("--frames", type=int, default=DEFAULT_FRAMES)
+    parser.add_argument("--payload", type=int, default=DEFAULT_PAYLOAD, help="平均解压后大小（字节）")
+    parser.add_argument("--threads", default="1,4", help="逗号分隔的线程数列表")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="每项取最快的一次")
+    parser.add_argument("--no-content-size", action="store_true", help="帧头不写解压后大小")
+    parser.add_argument("--seed", type=int, default=20240601)
+    args = parser.parse_args()
+
+    data = make_small_frames(args.frames, args.payload, not args.no_content_size, args.seed)
+    positions = [s for s, _ in frame_spans(data)]
+    print(f"容器 {len(data) / 1024 / 1024:.2f} MB，{len(positions)} 帧，"
+          f"帧头{'不' if args.no_content_size else ''}含解压后大小")
+    print(f"{'方式':<16}{'线程':>6}{'耗时(s)':>10}{'每帧(µs)':>12}{'相对 pooled':>14}")
+
+    for threads in [int(t) for t in args.threads.split(",") if t.strip()]:
+        results = {}
+        expected = None
+        for name, fn in (("new_ctx_tail", new_ctx_tail), ("new_ctx_obj", new_ctx_obj), ("pooled", pooled), ("batch", batch)):
+            best = None
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                total = run(fn, data, positions, threads)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            if expected is None:
+                expected = total
+            elif total != expected:
+                print(f"⚠️ {name} 解压出的总字节数不一致：{total} / {expected}")
+            results[name] = best
+        for name, seconds in results.items():
+            per_frame = seconds / len(positions) * 1e6
+            ratio = seconds / results["pooled"] if results["pooled"] else 0
+            print(f"{name:<16}{threads:>6}{seconds:>10.4f}{per_frame:>12.2f}{ratio:>13.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import platform
+import argparse
+import tempfile
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import zstandard as zstd
+
+import make_container
+import NpkUnlocker
+import PPKUnlocker
+import NpkUnlock_Core
+from ArchiveStore import ArchiveStore, SourceReader, source_entries
+from ExtractManifest import ManifestWriter, default_manifest_path
+from TextureConvert import SUPPORTED_EXTS as TEXTURE_EXTS, texture_to_png
+from ZstdFrames import decompress_frame
+from pathlib import Path
+
+# ====================== 三个解包器的性能测试 ======================
+# 1. 分阶段微基准：scan / decompress / hash / detect / convert（纹理转 PNG，单进程） / write
+# 2. 端到端：NpkUnlocker.extract_zstd_container、ExtractJob.run（即 ExtractWorker.run）、
+#    开启纹理转换的 ExtractJob.run（进程池 + 空缓存）、PPKUnlocker.process_ppk_file，在多个线程数下分别计时
+# 3. 与保存的基线 JSON 对比，超过容差即判为性能回退（退出码 1）
+# 4. 往返检查：PPK 提取清单、打包输出（pack_output）的提取清单 → ArchiveStore 归档 → 还原，
+#    逐个文件比对内容（不一致退出码 1）
+
+DEFAULT_THREADS = "1,2,4,8"
+DEFAULT_REPEAT = 3
+DEFAULT_TOLERANCE = 0.15
+
+
+@contextlib.contextmanager
+def quiet():
+    """NpkUnlocker 每帧都 print，计时时丢掉输出"""
+    with open(os.devnull, "w", encoding="utf-8") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def best_of(repeat, fn):
+    best = None
+    extra = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        extra = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, extra
+
+
+def fresh_dir(root, name):
+    path = os.path.join(root, name)
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+    return path
+
+
+# ---------------------- 分阶段微基准 ----------------------
+
+def bench_stages(npk_path, work_dir, repeat):
+    with open(npk_path, "rb") as f:
+        data = f.read()
+
+    results = {}
+    results["scan"], positions = best_of(repeat, lambda: NpkUnlock_Core.scan_zstd_frames(data))
+
+    def decompress_all():
+        # 与解包器相同的单帧路径：按块头确定帧结尾，只把这一帧交给线程内复用的解压器
+        out = []
+        for pos in positions:
+            try:
+                out.append(decompress_frame(data, pos)[0])
+            except zstd.ZstdError:
+                pass
+        return out
+
+    results["decompress"], payloads = best_of(repeat, decompress_all)
+    results["hash"], _ = best_of(repeat, lambda: [hashlib.md5(p).hexdigest() for p in payloads])
+    results["detect"], exts = best_of(repeat, lambda: [NpkUnlock_Core.detect_file_extension(p) for p in payloads])
+    textures = [(p, ext) for p, ext in zip(payloads, exts) if ext in TEXTURE_EXTS]
+    results["convert"], _ = best_of(repeat, lambda: [texture_to_png(p, ext) for p, ext in textures])
+
+    def write_all():
+        out_dir = fresh_dir(work_dir, "stage_write")
+        for i, p in enumerate(payloads):
+            with open(os.path.join(out_dir, f"f{i}"), "wb") as f:
+                f.write(p)
+
+    results["write"], _ = best_of(repeat, write_all)
+    return results, {"frames_found": len(positions), "payloads": len(payloads),
+                     "payload_bytes": sum(len(p) for p in payloads), "textures": len(textures)}
+
+
+# ---------------------- 端到端 ----------------------
+
+def bench_npkunlocker(npk_path, work_dir, threads, repeat):
+    NpkUnlocker.FAST_MODE = threads > 1
+    NpkUnlocker.MAX_THREADS = threads
+
+    def run():
+        out_dir = fresh_dir(work_dir, "npkunlocker")
+        with quiet():
+            return NpkUnlocker.extract_zstd_container(npk_path, out_dir, threads=threads)
+
+    return best_of(repeat, run)
+
+
+def bench_extract_job(npk_path, work_dir, threads, repeat):
+    def run():
+        out_dir = fresh_dir(work_dir, "extract_job")
+        job = NpkUnlock_Core.ExtractJob(npk_path, out_dir, fast_mode=threads > 1, max_threads=threads)
+        count = job.run()
+        snap = job.stats.snapshot()
+        return count, {k: round(snap[k], 6) for k in NpkUnlock_Core.STAGE_NAMES}
+
+    return best_of(repeat, run)
+
+
+def bench_extract_textures(npk_path, work_dir, threads, repeat):
+    """每次用空的纹理缓存，计入进程池启动和全部转换；返回生成的 PNG 数，有转换失败时报错"""
+    def run():
+        out_dir = fresh_dir(work_dir, "extract_textures")
+        job = NpkUnlock_Core.ExtractJob(npk_path, out_dir, fast_mode=threads > 1, max_threads=threads,
+                                        convert_textures=True,
+                                        texture_cache=fresh_dir(work_dir, "texture_cache"))
+        job.run()
+        counts = job.converter.counts
+        if counts["failed"] or counts["unsupported"]:
+            raise RuntimeError(f"纹理转换有失败：{job.converter.summary()}")
+        return counts["converted"] + counts["cached"]
+
+    return best_of(repeat, run)
+
+
+def bench_ppk(ppk_dir, work_dir, threads, repeat):
+    files = sorted(str(p) for p in Path(ppk_dir).iterdir() if p.is_file())
+
+    def run():
+        out_dir = Path(fresh_dir(work_dir, "ppk_out"))
+        PPKUnlocker.DUPLICATE_MD5.clear()
+        PPKUnlocker.BLOCK_CONTENT_MD5.clear()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            results = list(executor.map(lambda f: PPKUnlocker.process_ppk_file(f, out_dir), files))
+        return sum(r.get("extracted", 0) for r in results)
+
+    return best_of(repeat, run)
+
+
+# ---------------------- 往返检查 ----------------------
+
+def check_manifest_archive(manifest_path, work_dir, name):
+    """按提取清单归档再还原，返回 (文件数, 内容不一致的相对路径列表)"""
+    entries = source_entries(manifest_path)
+    restore_dir = fresh_dir(work_dir, f"{name}_archive_restore")
+    with ArchiveStore(fresh_dir(work_dir, f"{name}_archive")) as store:
+        store.add_build(name, entries, manifest_path)
+        store.restore(name, restore_dir)
+    bad = []
+    with SourceReader() as sources:
+        for _, rel, src in entries:
+            restored = os.path.join(restore_dir, rel)
+            if not os.path.isfile(restored):
+                bad.append(rel)
+                continue
+            with open(restored, "rb") as f:
+                if f.read() != sources.read(src):
+                    bad.append(rel)
+    return len(entries), bad
+
+
+def check_ppk_archive(ppk_dir, work_dir):
+    out_dir = fresh_dir(work_dir, "ppk_archive_src")
+    files = sorted(str(p) for p in Path(ppk_dir).iterdir() if p.is_file())
+    PPKUnlocker.DUPLICATE_MD5.clear()
+    PPKUnlocker.BLOCK_CONTENT_MD5.clear()
+    manifest_path = default_manifest_path(out_dir, ppk_dir)
+    with quiet(), ManifestWriter(manifest_path) as manifest:
+        for f in files:
+            PPKUnlocker.process_ppk_file(f, Path(out_dir), manifest=manifest)
+    return check_manifest_archive(manifest_path, work_dir, "ppk")
+
+
+def check_pack_archive(npk_path, work_dir):
+    """打包输出的清单路径是 “<索引>::<成员名>”，归档时要按包内路径读取"""
+    out_dir = fresh_dir(work_dir, "pack_archive_src")
+    job = NpkUnlock_Core.ExtractJob(npk_path, out_dir, pack_output=True)
+    job.run()
+    return check_manifest_archive(job.manifest_path, work_dir, "pack")
+
+
+# ---------------------- 基线对比 ----------------------
+
+def flatten(results):
+    flat = {}
+    for name, value in results["stages"].items():
+        flat[f"stage.{name}"] = value
+    for name, runs in results["end_to_end"].items():
+        for threads, entry in runs.items():
+            flat[f"{name}.t{threads}"] = entry["seconds"]
+    return flat
+
+
+def compare(current, baseline, tolerance):
+    cur = flatten(current)
+    base = flatten(baseline)
+    regressions = []
+    print("-" * 60)
+    print(f"{'项目':<28}{'基线(s)':>10}{'本次(s)':>10}{'变化':>10}")
+    for key in sorted(cur):
+        if key not in base:
+            continue
+        b, c = base[key], cur[key]
+        change = (c - b) / b if b > 0 else 0.0
+        mark = ""
+        if change > tolerance:
+            mark = "  ❌ 回退"
+            regressions.append(key)
+        print(f"{key:<30}{b:>10.4f}{c:>10.4f}{change * 100:>+9.1f}%{mark}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NpkUnlocker / ExtractWorker / PPKUnlocker 性能测试")
+    parser.add_argument("--frames", type=int, default=make_container.DEFAULT_FRAMES)
+    parser.add_argument("--dup-ratio", type=float, default=make_container.DEFAULT_DUP_RATIO)
+    parser.add_argument("--seed", type=int, default=make_container.DEFAULT_SEED)
+    parser.add_argument("--ppk-files", type=int, default=4)
+    parser.add_argument("--threads", default=DEFAULT_THREADS, help="逗号分隔的线程数列表")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="每项取最快的一次")
+    parser.add_argument("--work-dir", default="", help="临时目录（默认系统临时目录）")
+    parser.add_argument("--output", default="", help="把本次结果写入 JSON 文件")
+    parser.add_argument("--save-baseline", default="", help="把本次结果保存为基线")
+    parser.add_argument("--baseline", default="", help="与基线 JSON 对比")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="允许的变慢比例（默认 0.15 = 15%%）")
+    args = parser.parse_args()
+
+    thread_counts = [int(t) for t in args.threads.split(",") if t.strip()]
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="npk_bench_")
+    os.makedirs(work_dir, exist_ok=True)
+
+    try:
+        npk_path = os.path.join(work_dir, "bench.npk")
+        ppk_dir = os.path.join(work_dir, "ppk")
+        print(f"生成测试容器: {args.frames} 帧, 重复率 {args.dup_ratio}, 种子 {args.seed}")
+        npk_meta = make_container.write_npk(npk_path, args.frames, args.dup_ratio, args.seed)
+        shutil.rmtree(ppk_dir, ignore_errors=True)
+        make_container.write_ppk_dir(ppk_dir, args.ppk_files, args.frames, args.dup_ratio, args.seed)
+        print(f"容器大小 {npk_meta['container_bytes'] / 1024 / 1024:.1f} MB, "
+              f"解压后 {npk_meta['payload_bytes'] / 1024 / 1024:.1f} MB, "
+              f"不重复帧 {npk_meta['unique_frames']}")
+
+        results = {
+            "params": {
+                "frames": args.frames, "dup_ratio": args.dup_ratio, "seed": args.seed,
+                "ppk_files": args.ppk_files, "repeat": args.repeat,
+            },
+            "env": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "zstandard": zstd.__version__,
+            },
+            "stages": {},
+            "end_to_end": {},
+        }
+
+        stages, stage_info = bench_stages(npk_path, work_dir, args.repeat)
+        results["stages"] = stages
+        results["stage_info"] = stage_info
+        print("-" * 60)
+        for name, seconds in stages.items():
+            print(f"阶段 {name:<12}{seconds:>10.4f} s")
+
+        benches = {
+            "npkunlocker": lambda t: bench_npkunlocker(npk_path, work_dir, t, args.repeat),
+            "extract_job": lambda t: bench_extract_job(npk_path, work_dir, t, args.repeat),
+            "extract_textures": lambda t: bench_extract_textures(npk_path, work_dir, t, args.repeat),
+            "ppkunlocker": lambda t: bench_ppk(ppk_dir, work_dir, t, args.repeat),
+        }
+        print("-" * 60)
+        for name, fn in benches.items():
+            results["end_to_end"][name] = {}
+            for t in thread_counts:
+                seconds, extra = fn(t)
+                entry = {"seconds": seconds}
+                if isinstance(extra, tuple):
+                    entry["extracted"], entry["stage_seconds"] = extra
+                else:
+                    entry["extracted"] = extra
+                results["end_to_end"][name][str(t)] = entry
+                mb_s = npk_meta["container_bytes"] / 1024 / 1024 / seconds if seconds else 0
+                print(f"{name:<16} 线程 {t:<3}{seconds:>9.3f} s  {mb_s:>8.1f} MB/s  提取 {entry['extracted']}")
+
+        print("-" * 60)
+        roundtrips = {
+            "PPK 清单": lambda: check_ppk_archive(ppk_dir, work_dir),
+            "打包输出清单": lambda: check_pack_archive(npk_path, work_dir),
+        }
+        for label, check in roundtrips.items():
+            checked, bad = check()
+            if bad:
+                print(f"❌ {label}归档往返：{len(bad)} / {checked} 个文件还原后内容不一致，如 {bad[0]}")
+                sys.exit(1)
+            print(f"✅ {label}归档往返：{checked} 个文件还原一致")
+
+        for path in (args.output, args.save_baseline):
+            if path:
+                with open(path, "w", encoding="utf-8") as f:
+                    json.dump(results, f, ensure_ascii=False, indent=2)
+                print(f"结果已写入 {path}")
+
+        if args.baseline:
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                baseline = json.load(f)
+            regressions = compare(results, baseline, args.tolerance)
+            if regressions:
+                print(f"❌ {len(regressions)} 项性能回退超过 {args.tolerance * 100:.0f}%")
+                sys.exit(1)
+            print("✅ 未发现性能回退")
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
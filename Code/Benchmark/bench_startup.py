@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+
+# ====================== NpkUnlock_GUI 启动耗时测试 ======================
+# 分别用单进程模式（默认）和旧的 --launcher 双进程模式启动 GUI，
+# 计时到窗口显示后打印 STARTUP_READY 为止（需要图形环境和 PyQt5）。
+
+GUI_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "NpkUnlock_GUI.py")
+PROBE_ENV = "NEONPK_STARTUP_PROBE"
+MODES = {
+    "单进程": [],
+    "双进程(--launcher)": ["--launcher"],
+}
+
+
+def measure_once(extra_args, timeout):
+    env = dict(os.environ)
+    env[PROBE_ENV] = "1"
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, GUI_SCRIPT] + extra_args,
+        cwd=os.path.dirname(GUI_SCRIPT),
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        universal_newlines=True,
+    )
+    elapsed = None
+    try:
+        for line in proc.stdout:
+            if line.startswith("STARTUP_READY"):
+                elapsed = time.perf_counter() - start
+                break
+            if time.perf_counter() - start > timeout:
+                break
+    finally:
+        try:
+            proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NpkUnlock_GUI 启动耗时测试")
+    parser.add_argument("--runs", type=int, default=5, help="每种模式启动次数")
+    parser.add_argument("--timeout", type=float, default=60.0, help="单次启动超时秒数")
+    args = parser.parse_args()
+
+    results = {}
+    for name, extra_args in MODES.items():
+        # 第一次启动只用来预热磁盘缓存，不计入结果
+        measure_once(extra_args, args.timeout)
+        samples = []
+        for _ in range(args.runs):
+            t = measure_once(extra_args, args.timeout)
+            if t is None:
+                print(f"❌ {name}: 启动超时或未输出 STARTUP_READY")
+                sys.exit(1)
+            samples.append(t)
+        results[name] = samples
+        print(f"{name}: 中位数 {statistics.median(samples) * 1000:.0f} ms, "
+              f"最快 {min(samples) * 1000:.0f} ms ({args.runs} 次)")
+
+    single, legacy = (statistics.median(v) for v in results.values())
+    print(f"单进程模式比双进程模式快 {(legacy - single) * 1000:.0f} ms ({legacy / single:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
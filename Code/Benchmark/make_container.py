@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import json
+import random
+import struct
+import argparse
+
+import zstandard as zstd
+
+# ====================== 合成测试容器生成器 ======================
+# 用固定随机种子生成可复现的 Zstd 多帧容器：
+#   - 帧大小按对数正态分布（大量小文件 + 少量大文件，接近真实包体）
+#   - 可配置的重复帧比例（测 MD5 去重）
+#   - PNG / DDS / TGA / RIFF-WAVE / BKHD / MESH / 未知 七类负载；
+#     DDS（BC1 / RGBA8）和 TGA 是能真正解码的纹理，--convert-textures 的转换路径能完整跑一遍
+#   - 帧之间插入填充数据和故意伪造的 Zstd 魔数（测误判处理）
+
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+DEFAULT_FRAMES = 3000
+DEFAULT_DUP_RATIO = 0.15
+DEFAULT_FAKE_MAGIC_RATIO = 0.05
+DEFAULT_SEED = 20240601
+MIN_PAYLOAD = 64
+MAX_PAYLOAD = 8 * 1024 * 1024
+TEXTURE_MAX_SIDE = 512      # 纹理边长上限，纯 Python 解码也不至于太慢；多出的负载当作 mip 数据填充
+TGA_FOOTER = struct.pack("<II", 0, 0) + b"TRUEVISION-XFILE.\x00"
+
+PAYLOAD_KINDS = (
+    # (类型, 权重)
+    ("png", 25),
+    ("dds", 15),
+    ("tga", 5),
+    ("wem", 25),
+    ("bnk", 5),
+    ("mesh", 10),
+    ("unknown", 15),
+)
+
+
+def payload_size(rng):
+    # 中位数约 8 KB，长尾到数 MB
+    size = int(rng.lognormvariate(9.0, 1.6))
+    return max(MIN_PAYLOAD, min(MAX_PAYLOAD, size))
+
+
+def body_bytes(rng, size):
+    """一半随机字节 + 一半重复片段，压缩率接近真实资源"""
+    noise_len = size // 2
+    noise = rng.getrandbits(noise_len * 8).to_bytes(noise_len, "little") if noise_len else b""
+    pattern = bytes(rng.randrange(256) for _ in range(32))
+    repeat = (pattern * (size // 32 + 1))[: size - noise_len]
+    return noise + repeat
+
+
+def texture_side(size, bytes_per_pixel):
+    """像素数据不超过 size 的最大 2 的幂边长（4 ~ TEXTURE_MAX_SIDE）"""
+    side = 4
+    while side < TEXTURE_MAX_SIDE and (side * 2) ** 2 * bytes_per_pixel <= size:
+        side *= 2
+    return side
+
+
+def make_dds(rng, size):
+    """一半 BC1、一半未压缩 RGBA8；任意字节都是合法的 BC1 块 / 像素"""
+    if rng.random() < 0.5:
+        side = texture_side(size - 128, 0.5)
+        pixel_format = struct.pack("<II4s5I", 32, 0x4, b"DXT1", 0, 0, 0, 0, 0)
+        pixels = side * side // 2
+    else:
+        side = texture_side(size - 128, 4)
+        pixel_format = struct.pack("<II4s5I", 32, 0x41, b"\x00" * 4, 32, 0xFF0000, 0xFF00, 0xFF, 0xFF000000)
+        pixels = side * side * 4
+    head = (b"DDS " + struct.pack("<7I", 124, 0x1007, side, side, 0, 0, 1) + b"\x00" * 44
+            + pixel_format + struct.pack("<4I", 0x1000, 0, 0, 0) + b"\x00" * 4)
+    return head + body_bytes(rng, max(pixels, size - len(head)))
+
+
+def make_tga(rng, size):
+    """未压缩 32 位 TGA（原点左上），文件尾带 TRUEVISION-XFILE 签名供类型识别"""
+    side = texture_side(size - 18 - len(TGA_FOOTER), 4)
+    head = struct.pack("<BBBHHBHHHHBB", 0, 0, 2, 0, 0, 0, 0, 0, side, side, 32, 0x28)
+    body = body_bytes(rng, max(side * side * 4, size - len(head) - len(TGA_FOOTER)))
+    return head + body + TGA_FOOTER
+
+
+def make_payload(rng, kind, size):
+    if kind == "dds":
+        return make_dds(rng, size)
+    if kind == "tga":
+        return make_tga(rng, size)
+    if kind == "png":
+        head = b"\x89PNG\r\n\x1a\n" + struct.pack(">I4sIIBBBBB", 13, b"IHDR", 256, 256, 8, 6, 0, 0, 0)
+    elif kind == "wem":
+        head = b"RIFF" + struct.pack("<I", size) + b"WAVEfmt " + struct.pack("<IHHIIHH", 16, 1, 2, 48000, 192000, 4, 16)
+    elif kind == "bnk":
+        head = b"BKHD" + struct.pack("<II", 0x8C, rng.getrandbits(32))
+    elif kind == "mesh":
+        head = b"\x34\x80\xc8\xbb" + struct.pack("<I", rng.getrandbits(16))
+    else:
+        head = b"\x00\x01\x02\x03"
+    return head + body_bytes(rng, max(0, size - len(head)))
+
+
+def build_frames(count, dup_ratio, seed):
+    """返回 [(类型, 负载)]，同一参数每次结果相同"""
+    rng = random.Random(seed)
+    kinds = [k for k, _ in PAYLOAD_KINDS]
+    weights = [w for _, w in PAYLOAD_KINDS]
+    frames = []
+    for _ in range(count):
+        if frames and rng.random() < dup_ratio:
+            frames.append(frames[rng.randrange(len(frames))])
+            continue
+        kind = rng.choices(kinds, weights)[0]
+        frames.append((kind, make_payload(rng, kind, payload_size(rng))))
+    return frames
+
+
+def serialize_container(frames, seed, fake_magic_ratio=DEFAULT_FAKE_MAGIC_RATIO, level=3):
+    rng = random.Random(seed ^ 0x5A5A)
+    cctx = zstd.ZstdCompressor(level=level, write_content_size=True)
+    compressed_cache = {}
+    parts = [b"NPKBENCH" + struct.pack("<I", len(frames))]
+    offsets = []
+    pos = len(parts[0])
+    for kind, payload in frames:
+        key = id(payload)
+        if key not in compressed_cache:
+            compressed_cache[key] = cctx.compress(payload)
+        blob = compressed_cache[key]
+        # 帧前填充，偶尔夹带伪造魔数
+        pad = bytes(rng.randrange(256) for _ in range(rng.randrange(0, 48)))
+        if rng.random() < fake_magic_ratio:
+            pad += ZSTD_MAGIC + bytes(rng.randrange(256) for _ in range(rng.randrange(4, 24)))
+        parts.append(pad)
+        pos += len(pad)
+        offsets.append(pos)
+        parts.append(blob)
+        pos += len(blob)
+    return b"".join(parts), offsets
+
+
+def write_npk(path, frames=DEFAULT_FRAMES, dup_ratio=DEFAULT_DUP_RATIO, seed=DEFAULT_SEED,
+              fake_magic_ratio=DEFAULT_FAKE_MAGIC_RATIO):
+    frame_list = build_frames(frames, dup_ratio, seed)
+    data, offsets = serialize_container(frame_list, seed, fake_magic_ratio)
+    with open(path, "wb") as f:
+        f.write(data)
+    return describe(path, frame_list, offsets, seed)
+
+
+def write_ppk_dir(folder, files=4, frames=DEFAULT_FRAMES, dup_ratio=DEFAULT_DUP_RATIO,
+                  seed=DEFAULT_SEED, fake_magic_ratio=DEFAULT_FAKE_MAGIC_RATIO):
+    """PPK 目录：若干个 8 位字母数字文件名的容器，帧在文件间平均分配"""
+    os.makedirs(folder, exist_ok=True)
+    frame_list = build_frames(frames, dup_ratio, seed)
+    rng = random.Random(seed)
+    alphabet = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+    per_file = max(1, len(frame_list) // files)
+    meta = []
+    for i in range(files):
+        chunk = frame_list[i * per_file:(i + 1) * per_file if i < files - 1 else None]
+        name = "".join(rng.choice(alphabet) for _ in range(8))
+        data, offsets = serialize_container(chunk, seed + i, fake_magic_ratio)
+        path = os.path.join(folder, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        meta.append(describe(path, chunk, offsets, seed + i))
+    return meta
+
+
+def describe(path, frame_list, offsets, seed):
+    unique = len({id(p) for _, p in frame_list})
+    return {
+        "path": path,
+        "seed": seed,
+        "frames": len(frame_list),
+        "unique_frames": unique,
+        "payload_bytes": sum(len(p) for _, p in frame_list),
+        "container_bytes": os.path.getsize(path),
+        "offsets": offsets,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成可复现的合成 Zstd 测试容器")
+    parser.add_argument("output", help="输出 .npk 文件路径；配合 --ppk 时为输出目录")
+    parser.add_argument("--frames", type=int, default=DEFAULT_FRAMES)
+    parser.add_argument("--dup-ratio", type=float, default=DEFAULT_DUP_RATIO)
+    parser.add_argument("--fake-magic-ratio", type=float, default=DEFAULT_FAKE_MAGIC_RATIO)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--ppk", type=int, default=0, metavar="N", help="生成 N 个 PPK 文件到目录")
+    args = parser.parse_args()
+
+    if args.ppk:
+        meta = write_ppk_dir(args.output, args.ppk, args.frames, args.dup_ratio,
+                             args.seed, args.fake_magic_ratio)
+    else:
+        meta = write_npk(args.output, args.frames, args.dup_ratio,
+                         args.seed, args.fake_magic_ratio)
+    for m in (meta if isinstance(meta, list) else [meta]):
+        m = dict(m)
+        m.pop("offsets")
+        json.dump(m, sys.stdout, ensure_ascii=False)
+        sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import time
+import hashlib
+import argparse
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+import zstandard as zstd
+
+from ExtractManifest import STATUS_EXTRACTED, STATUS_FAILED, ManifestWriter, make_row
+from NpkUnlock_Core import FILE_CATEGORY_MAP, detect_file_extension
+from PPKUnlocker import PPK_NAME_PATTERNS, discover_ppk_files
+from ZstdFrames import DICTIONARIES, decompress_frame, find_frames
+
+# ====================== 容器级新旧版本对比 ======================
+# 不再“两个版本都完整解包 → 再用 新旧对比.py 比较输出文件夹”：
+# 直接按精确的帧边界对两个版本容器里的压缩帧做哈希，
+# 只有旧版本里不存在的帧才解压、识别类型并写出。
+# 输入可以是单个 .npk 文件，也可以是 PPK 目录（与 PPKUnlocker 相同的文件名规则递归查找，
+# 不会把目录里的清单 / 断点日志 / 之前的 Diff 输出当成容器）。
+
+MAX_THREADS = min(32, (os.cpu_count() or 1) + 4)
+OLD_SIDE_FILES = 2      # 旧版本同时读入内存的容器数（每个容器整个读进来哈希）
+MANIFEST_NAME = "diff.manifest.jsonl"
+
+
+def list_containers(path, patterns=None, skip_dirs=()):
+    path = Path(path)
+    if path.is_file():
+        return [path]
+    return [p for p, _ in discover_ppk_files(path, patterns, skip_dirs=skip_dirs)]
+
+
+def hash_container(path):
+    """返回 (文件数据, [(帧序号, 起始偏移, 结束偏移, 压缩数据 MD5)])"""
+    with open(path, "rb") as f:
+        data = f.read()
+    DICTIONARIES.harvest(data, str(path))
+    frames = []
+    with memoryview(data) as view:
+        for idx, (start, end, _) in enumerate(find_frames(data)):
+            frames.append((idx, start, end, hashlib.md5(view[start:end]).hexdigest()))
+    return data, frames
+
+
+def frame_hashes(path):
+    """旧版本只需要哈希，不保留文件数据"""
+    return [h for _, _, _, h in hash_container(path)[1]]
+
+
+def extract_frame(container, data, idx, start, end, output_root):
+    """解压一个新增帧并按类型写入分类目录，返回清单行"""
+    try:
+        payload, _ = decompress_frame(data, start)
+    except zstd.ZstdError as e:
+        return make_row(container, idx, start, STATUS_FAILED, end - start), str(e)
+    ext = detect_file_extension(payload)
+    category = FILE_CATEGORY_MAP.get(ext, "未知文件")
+    folder = os.path.join(output_root, category)
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, f"{Path(container).name}_frame{idx + 1}{ext}")
+    with open(path, "wb") as f:
+        f.write(payload)
+    row = make_row(container, idx, start, STATUS_EXTRACTED, end - start, len(payload),
+                   hashlib.md5(payload).hexdigest(), ext, category, path)
+    return row, ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="直接比较两个版本的 NPK / PPK 容器，只解压新增的帧")
+    parser.add_argument("old", help="旧版本容器文件或 PPK 目录")
+    parser.add_argument("new", help="新版本容器文件或 PPK 目录")
+    parser.add_argument("-o", "--output", default="", help="新增文件输出目录（默认 新版本同级目录/Diff）")
+    parser.add_argument("-t", "--threads", type=int, default=MAX_THREADS, help="线程数")
+    parser.add_argument("--dry-run", action="store_true", help="只统计新增帧，不解压不写文件")
+    parser.add_argument("--dict-dir", default="", help="Zstd 字典目录（帧头带字典 ID 的帧用它解压）")
+    parser.add_argument("--pattern", action="append", default=[],
+                        help="PPK 目录里的容器文件名通配符，可多次指定（默认 8位字母数字文件名）")
+    args = parser.parse_args()
+    if args.dict_dir:
+        print(f"从字典目录加载了 {DICTIONARIES.load_dir(args.dict_dir)} 个 Zstd 字典")
+
+    output_root = args.output or os.path.join(os.path.dirname(os.path.abspath(args.new)), "Diff")
+    patterns = list(PPK_NAME_PATTERNS) + args.pattern
+    old_files = list_containers(args.old, patterns, skip_dirs=(output_root,))
+    new_files = list_containers(args.new, patterns, skip_dirs=(output_root,))
+    if not old_files or not new_files:
+        print("❌ 错误：旧版本或新版本里没有找到任何容器文件")
+        sys.exit(1)
+    started = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=max(1, args.threads)) as executor:
+        # 1. 旧版本：只扫描帧边界并哈希压缩数据，不解压；每个容器整个读进内存，只并行 OLD_SIDE_FILES 个
+        old_hashes = set()
+        old_frames = 0
+        with ThreadPoolExecutor(max_workers=OLD_SIDE_FILES) as old_executor:
+            for hashes in old_executor.map(frame_hashes, old_files):
+                old_frames += len(hashes)
+                old_hashes.update(hashes)
+        print(f"旧版本：{len(old_files)} 个容器，{old_frames} 帧")
+
+        # 2. 新版本：逐个容器处理（同一时间只有一个容器在内存里），压缩数据哈希不在旧版本里的帧才解压
+        manifest = None if args.dry_run else ManifestWriter(os.path.join(output_root, MANIFEST_NAME))
+        seen = set()
+        new_frames = 0
+        added = 0
+        failed = 0
+        new_bytes = 0
+        decompressed_bytes = 0
+        for container in new_files:
+            data, frames = hash_container(container)
+            new_frames += len(frames)
+            new_bytes += len(data)
+            pending = []
+            for idx, start, end, frame_hash in frames:
+                if frame_hash in old_hashes or frame_hash in seen:
+                    continue
+                seen.add(frame_hash)
+                if args.dry_run:
+                    added += 1
+                    decompressed_bytes += end - start
+                    continue
+                pending.append(executor.submit(extract_frame, str(container), data, idx, start, end, output_root))
+            for future in pending:
+                row, error = future.result()
+                manifest.write(row)
+                decompressed_bytes += row["compressed_size"]
+                if error:
+                    failed += 1
+                    print(f"⚠️ {Path(container).name} 帧 {row['frame'] + 1} @ 0x{row['offset']:08X} 解压失败: {error}")
+                else:
+                    added += 1
+        if manifest is not None:
+            manifest.close()
+
+    print(f"新版本：{len(new_files)} 个容器，{new_frames} 帧")
+    print(f"新增帧 {added} 个，未变化或重复 {new_frames - added - failed} 个，解压失败 {failed} 个")
+    print(f"解压的压缩数据 {decompressed_bytes / 1024 / 1024:.1f} MB / 新版本共 {new_bytes / 1024 / 1024:.1f} MB")
+    if manifest is not None:
+        print(f"新增文件输出目录：{output_root}")
+        print(f"提取清单：{manifest.path}")
+    print(f"耗时 {time.perf_counter() - started:.1f} 秒")
+
+
+if __name__ == "__main__":
+    main()
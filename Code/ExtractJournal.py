@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import time
+import hashlib
+import threading
+
+from AssetPack import PackReader, is_pack_path, split_pack_path
+
+# ====================== 断点续传日志 ======================
+# 每个任务（输入文件 + 影响输出的选项）一个只追加的 JSONL 文件，
+# 放在输出目录的 .journal 文件夹下；任务正常结束后自动删除。
+# 一批多个输入的任务（如 PPKUnlocker）可以先在日志末尾写完成标记、整批结束后再用 remove_journal() 删除，
+# 中途崩溃时已完成的输入在下次运行时直接跳过。
+
+JOURNAL_DIR_NAME = ".journal"
+FSYNC_EVERY = 64        # 每写入多少条记录 fsync 一次
+FSYNC_INTERVAL = 2.0    # 或距上次 fsync 超过多少秒
+
+
+def job_key(input_path, *options):
+    """输入文件路径 + 大小 + 修改时间 + 选项 → 任务标识；文件变了就不会续传旧进度"""
+    st = os.stat(input_path)
+    parts = [os.path.abspath(input_path), str(st.st_size), str(st.st_mtime_ns)]
+    parts.extend(str(o) for o in options)
+    return hashlib.md5("|".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+def output_is_intact(rec, packs=None):
+    """
+    记录里的输出文件仍存在且大小一致（没有输出的记录视为完好）。
+    包内路径（见 AssetPack）查包索引；packs 为 {索引文件: {成员名: 条目}} 缓存，避免每条记录重读索引。
+    """
+    path = rec.get("path")
+    if not path:
+        return True
+    if is_pack_path(path):
+        index_path, name = split_pack_path(path)
+        if packs is None:
+            packs = {}
+        if index_path not in packs:
+            try:
+                with PackReader(index_path) as reader:
+                    packs[index_path] = reader.entries
+            except OSError:
+                packs[index_path] = {}
+        entry = packs[index_path].get(name)
+        if entry is None:
+            return False
+        size = entry["size"]
+    else:
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return False
+    return "size" not in rec or rec["size"] == size
+
+
+def remove_journal(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class ExtractJournal:
+    def __init__(self, output_root, input_path, *options, fsync_every=FSYNC_EVERY):
+        journal_dir = os.path.join(str(output_root), JOURNAL_DIR_NAME)
+        os.makedirs(journal_dir, exist_ok=True)
+        name = os.path.basename(str(input_path))
+        self.path = os.path.join(journal_dir, f"{name}.{job_key(input_path, *options)}.jsonl")
+        self.fsync_every = fsync_every
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._last_sync = time.monotonic()
+        self.records = self._load()
+        self._f = open(self.path, "a", encoding="utf-8")
+
+    def _load(self):
+        records = []
+        if not os.path.exists(self.path):
+            return records
+        broken = False
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # 崩溃时最后一行可能只写了一半，之后的内容都不可信
+                    broken = True
+                    break
+        if broken:
+            self._rewrite(records)
+        return records
+
+    def _rewrite(self, records):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for rec in records:
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def _compact(self, records):
+        if len(records) == len(self.records):
+            return
+        with self._lock:
+            self._f.close()
+            self._rewrite(records)
+            self.records = records
+            self._f = open(self.path, "a", encoding="utf-8")
+
+    def completed(self):
+        """乱序处理的容器用：{帧偏移: 记录}，只保留输出仍完好的帧"""
+        packs = {}
+        valid = [rec for rec in self.records if output_is_intact(rec, packs)]
+        self._compact(valid)
+        return {rec["offset"]: rec for rec in valid}
+
+    def completed_prefix(self):
+        """顺序扫描的容器用：从头开始连续完好的记录，遇到第一条损坏记录即截断"""
+        valid = []
+        packs = {}
+        for rec in self.records:
+            if not output_is_intact(rec, packs):
+                break
+            valid.append(rec)
+        self._compact(valid)
+        return valid
+
+    def record(self, offset, path="", **fields):
+        rec = {"offset": offset, "path": path}
+        rec.update(fields)
+        line = json.dumps(rec, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._f.write(line)
+            self._f.flush()
+            self._pending += 1
+            now = time.monotonic()
+            if self._pending >= self.fsync_every or now - self._last_sync >= FSYNC_INTERVAL:
+                os.fsync(self._f.fileno())
+                self._pending = 0
+                self._last_sync = now
+
+    def close(self):
+        """任务中断：保留日志，下次启动时续传"""
+        with self._lock:
+            if self._f.closed:
+                return
+            self._f.flush()
+            os.fsync(self._f.fileno())
+            self._f.close()
+
+    def finish(self):
+        """任务完整结束：删除日志，下次重新提取"""
+        with self._lock:
+            if not self._f.closed:
+                self._f.close()
+        remove_journal(self.path)
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+import os
+import csv
+import json
+import threading
+
+# ====================== 提取清单 ======================
+# 每次解包边处理边写一份清单（默认 JSONL，文件名以 .csv 结尾则写 CSV），每帧一行：
+#   container        来源容器路径
+#   frame            帧 / 块序号（从 0 开始）
+#   offset           帧在容器中的偏移
+#   compressed_size  压缩数据字节数（未知时为 0）
+#   size             解压后字节数
+#   hash             输出文件内容（解压后数据）的 MD5，所有提取器一致；失败帧 / 内容未知的重复帧为空
+#   ext / category   识别出的扩展名和分类
+#   path             输出文件路径（重复 / 失败帧为空）
+#   status           extracted / duplicate / failed
+#   duplicate_of     重复帧对应的首个输出文件路径
+#   block_hash       压缩块本身的 MD5（PPKUnlocker 解压前去重用），其余提取器为空
+# 下游工具按行读取即可，不必再遍历分类文件夹；GUI 也可以直接从清单恢复文件列表。
+
+MANIFEST_DIR_NAME = "manifest"
+MANIFEST_FIELDS = (
+    "container", "frame", "offset", "compressed_size", "size", "hash",
+    "ext", "category", "path", "status", "duplicate_of", "block_hash",
+)
+INT_FIELDS = ("frame", "offset", "compressed_size", "size")
+
+STATUS_EXTRACTED = "extracted"
+STATUS_DUPLICATE = "duplicate"
+STATUS_FAILED = "failed"
+
+
+def default_manifest_path(output_root, input_path, fmt="jsonl"):
+    name = os.path.basename(os.path.normpath(str(input_path)))
+    return os.path.join(str(output_root), MANIFEST_DIR_NAME, f"{name}.manifest.{fmt}")
+
+
+def make_row(container, frame, offset, status, compressed_size=0, size=0, file_hash="",
+             ext="", category="", path="", duplicate_of="", block_hash=""):
+    return {
+        "container": str(container),
+        "frame": frame,
+        "offset": offset,
+        "compressed_size": compressed_size,
+        "size": size,
+        "hash": file_hash,
+        "ext": ext,
+        "category": category,
+        "path": str(path),
+        "status": status,
+        "duplicate_of": str(duplicate_of),
+        "block_hash": block_hash,
+    }
+
+
+class ManifestWriter:
+    """线程安全的流式清单写入；每行写完立即 flush，解包途中也能被下游读取"""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.is_csv = self.path.lower().endswith(".csv")
+        folder = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(folder, exist_ok=True)
+        self._lock = threading.Lock()
+        self._f = open(self.path, "w", encoding="utf-8", newline="")
+        self._csv = None
+        if self.is_csv:
+            self._csv = csv.DictWriter(self._f, fieldnames=MANIFEST_FIELDS, extrasaction="ignore")
+            self._csv.writeheader()
+        self.rows = 0
+
+    def write(self, row: dict):
+        with self._lock:
+            if self._f.closed:
+                return
+            if self._csv is not None:
+                self._csv.writerow(row)
+            else:
+                self._f.write(json.dumps(row, ensure_ascii=False) + "\n")
+            self._f.flush()
+            self.rows += 1
+
+    def close(self):
+        with self._lock:
+            if not self._f.closed:
+                self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def read_manifest(path):
+    """逐行读取清单（JSONL 或 CSV），数值字段转回 int；写到一半的最后一行直接忽略"""
+    path = str(path)
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if path.lower().endswith(".csv"):
+            for row in csv.DictReader(f):
+                for key in INT_FIELDS:
+                    try:
+                        row[key] = int(row.get(key) or 0)
+                    except ValueError:
+                        row[key] = 0
+                yield row
+        else:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    break
+
+
+def row_to_file_info(row: dict) -> dict:
+    """清单行 → GUI 文件列表使用的 info 字典"""
+    path = row.get("path", "")
+    return {
+        "name": os.path.basename(path),
+        "ext": row.get("ext", ""),
+        "category": row.get("category", "未知文件"),
+        "size": row.get("size", 0),
+        "path": path,
+        "hash": row.get("hash", ""),
+    }
+
+
+# ====================== 去重索引 ======================
+
+class DuplicateIndex:
+    """
+    哈希 → 首个输出文件路径。
+    claim() 在同一把锁内完成“检查 + 占位”，多线程同时遇到相同内容时只有一个线程会写文件；
+    写入失败时用 release() 归还占位，让后面的相同帧还能再试。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._paths = {}
+
+    def claim(self, file_hash: str, path: str = ""):
+        """返回 None 表示占位成功（由调用方写出文件）；否则返回已有的输出路径"""
+        with self._lock:
+            if file_hash in self._paths:
+                return self._paths[file_hash]
+            self._paths[file_hash] = path
+            return None
+
+    def resolve(self, file_hash: str, path: str):
+        """先占位、后确定路径的场景（如 PPK 解压前去重）：写完文件后补上路径"""
+        with self._lock:
+            self._paths[file_hash] = path
+
+    def release(self, file_hash: str):
+        with self._lock:
+            self._paths.pop(file_hash, None)
+
+    def add(self, file_hash: str, path: str = ""):
+        with self._lock:
+            self._paths.setdefault(file_hash, path)
+
+    def clear(self):
+        with self._lock:
+            self._paths.clear()
+
+    def __contains__(self, file_hash):
+        with self._lock:
+            return file_hash in self._paths
+
+    def __len__(self):
+        with self._lock:
+            return len(self._paths)
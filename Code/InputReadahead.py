@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+import os
+import mmap
+import heapq
+import threading
+
+# ====================== 大容器：内存映射 + 顺序预读 ======================
+# 整个读进内存的方式装不下比内存还大的容器（20 GB 的包）。映射模式下：
+#   - 容器用 mmap 只读映射，madvise(MADV_SEQUENTIAL) 提示内核按顺序预读；
+#   - 预读线程用普通顺序读（只为把页面带进页缓存）始终保持“最慢的在处理帧”之后 window 字节驻留，
+#     内核也会收到 MADV_WILLNEED；
+#   - 最慢的在处理帧之前的部分 MADV_DONTNEED 释放，驻留量基本就是 window + 在处理的帧。
+# 工作线程提交帧时 begin(偏移)，处理完 end(偏移)；“最慢的在处理帧”就是还没 end 的最小偏移。
+# 没有 madvise 的平台（Windows）只做顺序预读，释放交给系统。
+
+ACCESS_READ = "read"      # 整个文件读进内存（原方式）
+ACCESS_MMAP = "mmap"      # 内存映射 + 预读
+ACCESS_AUTO = "auto"      # 文件不小于 MMAP_AUTO_SIZE 时映射
+ACCESS_MODES = (ACCESS_AUTO, ACCESS_READ, ACCESS_MMAP)
+
+MMAP_AUTO_SIZE = 2 * 1024 * 1024 * 1024
+READAHEAD_WINDOW = 256 * 1024 * 1024
+READAHEAD_CHUNK = 8 * 1024 * 1024
+IDLE_WAIT = 0.05
+
+
+def choose_access(mode: str, file_size: int) -> str:
+    if mode == ACCESS_AUTO:
+        return ACCESS_MMAP if file_size >= MMAP_AUTO_SIZE else ACCESS_READ
+    return mode
+
+
+def _madvise(mm, advice_name, start=0, length=None):
+    advice = getattr(mmap, advice_name, None)
+    if advice is None or not hasattr(mm, "madvise"):
+        return
+    try:
+        if length is None:
+            mm.madvise(advice)
+        elif length > 0:
+            mm.madvise(advice, start, length)
+    except (OSError, ValueError):
+        pass
+
+
+class MappedInput:
+    """只读映射一个容器文件；data 可以像 bytes 一样切片 / find / 交给 memoryview"""
+
+    def __init__(self, path, window: int = READAHEAD_WINDOW, chunk: int = READAHEAD_CHUNK):
+        self.path = str(path)
+        self.window = max(window, chunk)
+        self.chunk = chunk
+        self._file = open(self.path, "rb")
+        self.size = os.fstat(self._file.fileno()).st_size
+        self.data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+        if self.size:
+            _madvise(self.data, "MADV_SEQUENTIAL")
+        self._cond = threading.Condition()
+        self._active = {}       # 偏移 → 在处理的次数
+        self._heap = []
+        self._frontier = 0      # 已提交的最大偏移；没有在处理的帧时以它为准
+        self._ahead = 0         # 预读到哪里
+        self._released = 0      # 释放到哪里
+        self._stopped = False
+        self._thread = None
+        self.bytes_prefetched = 0
+        self.bytes_released = 0
+
+    # ---- 工作进度 ----
+
+    def begin(self, offset: int):
+        with self._cond:
+            count = self._active.get(offset, 0)
+            if not count:
+                heapq.heappush(self._heap, offset)
+            self._active[offset] = count + 1
+            self._frontier = max(self._frontier, offset)
+            self._cond.notify()
+
+    def end(self, offset: int):
+        with self._cond:
+            count = self._active.get(offset, 0) - 1
+            if count > 0:
+                self._active[offset] = count
+            else:
+                self._active.pop(offset, None)
+            self._cond.notify()
+
+    def low_water(self) -> int:
+        """还没处理完的最小帧偏移（调用方需持有 _cond）"""
+        while self._heap and self._heap[0] not in self._active:
+            heapq.heappop(self._heap)
+        return self._heap[0] if self._heap else self._frontier
+
+    def find_all(self, magic: bytes, stop_flag=None):
+        """分块查找所有 magic 的位置，扫过的部分随即释放；扫描期间驻留量也只有一个分块"""
+        positions = []
+        step = self.window
+        page = mmap.ALLOCATIONGRANULARITY
+        chunk_start = 0
+        pos = 0
+        while chunk_start < self.size:
+            if stop_flag is not None and stop_flag():
+                break
+            limit = min(self.size, chunk_start + step + len(magic) - 1)
+            while True:
+                found = self.data.find(magic, pos, limit)
+                if found == -1:
+                    break
+                positions.append(found)
+                pos = found + len(magic)
+            chunk_start += step
+            pos = max(pos, chunk_start)
+            release_to = chunk_start - chunk_start % page
+            _madvise(self.data, "MADV_DONTNEED", 0, min(release_to, self.size))
+        return positions
+
+    # ---- 预读 / 释放 ----
+
+    def start(self, from_offset: int = 0):
+        """扫描结束后调用：释放扫描带进来的页面，从 from_offset 开始顺序预读"""
+        if not self.size or self._thread is not None:
+            return
+        _madvise(self.data, "MADV_DONTNEED", 0, self.size)
+        page = mmap.ALLOCATIONGRANULARITY
+        self._frontier = from_offset
+        self._ahead = self._released = from_offset - from_offset % page
+        self._thread = threading.Thread(target=self._run, name="readahead", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        page = mmap.ALLOCATIONGRANULARITY
+        scratch = bytearray(self.chunk)
+        with open(self.path, "rb", buffering=0) as f, memoryview(scratch) as view:
+            while True:
+                with self._cond:
+                    if self._stopped:
+                        return
+                    low = self.low_water()
+                    release_to = low - low % page
+                    if self._ahead < release_to:
+                        self._ahead = release_to
+                    target = min(self.size, low + self.window)
+                    if self._ahead >= target and release_to - self._released < self.chunk:
+                        self._cond.wait(IDLE_WAIT)
+                        continue
+                    ahead = self._ahead
+                    released = self._released
+                if release_to - released >= self.chunk:
+                    _madvise(self.data, "MADV_DONTNEED", released, release_to - released)
+                    self.bytes_released += release_to - released
+                    with self._cond:
+                        self._released = max(self._released, release_to)
+                if ahead < target:
+                    n = min(self.chunk, target - ahead)
+                    _madvise(self.data, "MADV_WILLNEED", ahead, n)
+                    f.seek(ahead)
+                    n = f.readinto(view[:n]) or 0
+                    self.bytes_prefetched += n
+                    with self._cond:
+                        if n:
+                            self._ahead = max(self._ahead, ahead + n)
+                        else:
+                            self._ahead = self.size
+
+    def close(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if isinstance(self.data, mmap.mmap):
+            try:
+                self.data.close()
+            except BufferError:
+                # 还有 memoryview 引用着映射（异常退出时），交给垃圾回收
+                pass
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
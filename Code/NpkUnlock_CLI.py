@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import glob
+import json
+import time
+import signal
+import argparse
+import multiprocessing
+
+from ExtractManifest import default_manifest_path
+from InputReadahead import ACCESS_MODES, READAHEAD_WINDOW
+from OutputMaterializer import MODES
+from NpkUnlock_Core import ExtractError, ExtractJob
+from StageProfiler import StageProfiler
+from TextureConvert import default_cache_dir as default_texture_cache
+from WorkerAutotune import parse_threads
+
+# ===================== NpkUnlock 无界面批处理入口 =====================
+# 与 NpkUnlock_GUI 使用同一套 ExtractJob / extract_single_frame 流程，但完全不导入 Qt，
+# 适合没有显示器的 CI 机器。stdout 每行一个 JSON 事件，人类可读日志走 stderr。
+
+PROGRESS_INTERVAL = 0.5  # 进度事件最短间隔（秒），避免帧很多时刷屏
+
+
+def emit(event: str, **fields):
+    fields["event"] = event
+    sys.stdout.write(json.dumps(fields, ensure_ascii=False) + "\n")
+    sys.stdout.flush()
+
+
+def expand_inputs(patterns):
+    files = []
+    seen = set()
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True)) if glob.has_magic(pattern) else [pattern]
+        for path in matches:
+            if os.path.isdir(path):
+                continue
+            key = os.path.abspath(path)
+            if key not in seen:
+                seen.add(key)
+                files.append(path)
+    return files
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="NpkUnlock 无界面批量解包（输出 JSON 行进度）"
+    )
+    parser.add_argument("inputs", nargs="+", help="输入文件或通配符，如 'packs/**/*.npk'")
+    parser.add_argument("-o", "--output", default="",
+                        help="输出目录；默认每个输入文件同级目录/Output")
+    parser.add_argument("-t", "--threads", type=parse_threads, default=8,
+                        help="线程数（默认 8）；auto 按吞吐量自动调整并报告选定值")
+    parser.add_argument("--no-fast", action="store_true", help="关闭快速模式，串行解压")
+    parser.add_argument("--no-md5", action="store_true", help="关闭 MD5 去重")
+    parser.add_argument("--no-type-detect", action="store_true", help="关闭文件类型自动识别")
+    parser.add_argument("--emit-files", action="store_true", help="每提取一个文件输出一条 file 事件")
+    parser.add_argument("--verbose", action="store_true", help="把逐帧日志打印到 stderr")
+    parser.add_argument("--manifest-format", choices=("jsonl", "csv"), default="jsonl",
+                        help="提取清单格式，写到 输出目录/manifest/<容器名>.manifest.<格式>")
+    parser.add_argument("--no-manifest", action="store_true", help="不写提取清单")
+    parser.add_argument("--no-metadata", action="store_true",
+                        help="不写属性索引（输出目录/manifest/metadata.sqlite，见 AssetMetadata.py 查询）")
+    parser.add_argument("--dict-dir", default="", help="Zstd 字典目录（帧头带字典 ID 的帧用它解压）")
+    parser.add_argument("--link-duplicates", action="store_true",
+                        help="重复帧在自己的位置建立指向首个文件的链接，而不是丢弃")
+    parser.add_argument("--link-mode", choices=sorted(MODES), default="auto",
+                        help="链接方式：auto 依次尝试 reflink / 硬链接 / copy_file_range / 复制")
+    parser.add_argument("--no-batch", action="store_true",
+                        help="关闭批量解压（multi_decompress_to_buffer），快速模式下逐帧解压")
+    parser.add_argument("--access", choices=ACCESS_MODES, default="auto",
+                        help="读取方式：read 整个读进内存，mmap 内存映射 + 顺序预读，auto 不小于 2 GB 时映射")
+    parser.add_argument("--readahead", type=int, default=READAHEAD_WINDOW // 1024 // 1024, metavar="MB",
+                        help="映射模式下保持驻留的预读窗口（默认 %(default)s MB）")
+    parser.add_argument("--pack", action="store_true",
+                        help="不写散文件，全部追加到 输出目录/pack/<容器名>.NNN.pack 并写索引")
+    parser.add_argument("--convert-textures", action="store_true",
+                        help="提取出的 DDS / KTX / TGA 另存一份同名 PNG（多进程转换，按内容缓存）")
+    parser.add_argument("--texture-cache", default="", metavar="DIR",
+                        help=f"纹理 PNG 缓存目录，默认 {default_texture_cache()}")
+    parser.add_argument("--profile", default="", metavar="TRACE.json",
+                        help="记录每帧各阶段耗时，导出 Chrome Trace / Perfetto JSON")
+    parser.add_argument("--profile-cprofile", action="store_true",
+                        help="配合 --profile：同时保存各工作线程的 cProfile 统计")
+    parser.add_argument("--profile-tracemalloc", action="store_true",
+                        help="配合 --profile：同时保存 tracemalloc 内存快照")
+    return parser
+
+
+def run_one(input_file, args, current_job, profiler):
+    output_root = args.output or os.path.join(os.path.dirname(os.path.abspath(input_file)), "Output")
+    last_progress = [0.0]
+
+    def on_log(name, level, message):
+        if args.verbose or level != "INFO":
+            print(f"{level} - {name} - {message}", file=sys.stderr)
+
+    def on_progress(current, total):
+        now = time.monotonic()
+        if current >= total or now - last_progress[0] >= PROGRESS_INTERVAL:
+            last_progress[0] = now
+            emit("progress", input=input_file, current=current, total=total)
+
+    def on_file(info):
+        if args.emit_files:
+            emit("file", input=input_file, **info)
+
+    if args.no_manifest:
+        manifest_path = ""
+    else:
+        manifest_path = default_manifest_path(output_root, input_file, args.manifest_format)
+
+    job = ExtractJob(
+        input_file, output_root,
+        fast_mode=not args.no_fast,
+        max_threads=args.threads,
+        enable_md5=not args.no_md5,
+        enable_type_detect=not args.no_type_detect,
+        log=on_log, progress=on_progress, file=on_file, profiler=profiler,
+        manifest_path=manifest_path,
+        link_duplicates=args.link_duplicates, link_mode=args.link_mode,
+        dict_dir=args.dict_dir, pack_output=args.pack, batch_decompress=not args.no_batch,
+        access_mode=args.access, readahead=max(1, args.readahead) * 1024 * 1024,
+        convert_textures=args.convert_textures, texture_cache=args.texture_cache,
+        metadata_path="" if args.no_metadata else None,
+    )
+    current_job[0] = job
+    emit("start", input=input_file, output=output_root)
+    started = time.perf_counter()
+    count = job.run()
+    snap = job.stats.snapshot()
+    emit(
+        "done", input=input_file, output=output_root, extracted=count,
+        stopped=job.stopped, elapsed=round(time.perf_counter() - started, 3),
+        manifest=manifest_path,
+        threads=job.tuner.workers if job.tuner is not None else args.threads,
+        bottleneck=job.tuner.bottleneck if job.tuner is not None else "",
+        textures=job.converter.counts if job.converter is not None else {},
+        stats={k: round(v, 6) if isinstance(v, float) else v for k, v in snap.items()},
+    )
+    return job.stopped
+
+
+def main():
+    args = build_parser().parse_args()
+    files = expand_inputs(args.inputs)
+    if not files:
+        emit("error", message="没有匹配到任何输入文件", inputs=args.inputs)
+        sys.exit(2)
+
+    # Ctrl+C / SIGTERM：通知当前任务停止，已写出的文件和续传日志都会保留
+    current_job = [None]
+
+    def request_stop(signum, frame):
+        if current_job[0] is not None:
+            current_job[0].stop()
+
+    signal.signal(signal.SIGINT, request_stop)
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, request_stop)
+
+    profiler = None
+    if args.profile:
+        profiler = StageProfiler(args.profile_cprofile, args.profile_tracemalloc)
+
+    failed = 0
+    for input_file in files:
+        try:
+            if run_one(input_file, args, current_job, profiler):
+                break
+        except ExtractError as e:
+            failed += 1
+            emit("error", input=input_file, message=str(e))
+        except Exception as e:
+            failed += 1
+            emit("error", input=input_file, message=f"解压过程中发生异常: {str(e)}")
+
+    if profiler is not None:
+        emit("profile", files=profiler.save(args.profile))
+    emit("finished", files=len(files), failed=failed)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    main()
@@ -0,0 +1,904 @@
+# -*- coding: utf-8 -*-
+import os
+import hashlib
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+from AssetMetadata import MetadataIndex, default_metadata_path, probe_metadata
+from AssetPack import PackWriter, default_pack_index, is_pack_path, member_path, split_pack_path
+from ExtractJournal import ExtractJournal
+from InputReadahead import ACCESS_AUTO, ACCESS_MMAP, READAHEAD_WINDOW, MappedInput, choose_access
+from ExtractManifest import (
+    STATUS_DUPLICATE, STATUS_EXTRACTED, STATUS_FAILED,
+    DuplicateIndex, ManifestWriter, default_manifest_path, make_row,
+)
+from OutputMaterializer import Materializer
+from StageProfiler import SpanClock
+from TextureConvert import STATUS_FAILED as TEXTURE_FAILED, SUPPORTED_EXTS as TEXTURE_EXTS, TextureConverter
+from WorkerAutotune import AUTO, WorkerAutotuner
+from ZstdFrames import (
+    DICT_MAGIC, DICTIONARIES, MAX_OUTPUT_SIZE, ZSTD_MAGIC, decompress_batch, decompress_frame, frame_end, get_decompressor,
+    parse_frame_header, plan_batches,
+)
+
+# ===================== NpkUnlock 解包引擎（不依赖 Qt） =====================
+# NpkUnlock_GUI 的 ExtractWorker 和无界面的 NpkUnlock_CLI 共用这里的流程。
+
+# zstandard 延迟到第一次解压时才导入，缩短启动时间
+zstd = None
+
+
+def load_zstd():
+    global zstd
+    if zstd is None:
+        import zstandard
+        zstd = zstandard
+    return zstd
+
+
+# ===================== 文件类型检测 =====================
+
+FILE_CATEGORY_MAP = {
+    ".wem": "普通文件",   # 内部分类仍然叫“普通文件”，UI 显示映射为“音频文件”
+    ".bnk": "普通文件",
+    ".png": "图片文件",
+    ".dds": "图片文件",
+    ".ktx": "图片文件",
+    ".tga": "图片文件",
+    ".mesh": "模型文件",
+    ".npk": "数据文件",
+    ".zst": "压缩文件",
+    "": "未知文件",
+}
+
+TGA_TAIL_MAGIC = b"TRUEVISION-XFILE.\x00"
+
+
+def detect_file_extension(data: bytes) -> str:
+    if not data:
+        return ""
+    mesh_magic = b"\x34\x80\xc8\xbb"
+    if len(data) >= 4 and data[:4] == mesh_magic:
+        return ".mesh"
+    png_magic = b"\x89PNG"
+    if len(data) >= 4 and data[:4] == png_magic:
+        return ".png"
+    ktx_magic = b"\xABKTX 11\xBB"
+    if len(data) >= 8 and data[:8] == ktx_magic:
+        return ".ktx"
+    if len(data) >= 3 and data[:3] == b"DDS":
+        return ".dds"
+    if len(data) >= 12 and data[:4] == b"RIFF" and data[8:12] == b"WAVE":
+        return ".wem"
+    if len(data) >= 4 and data[:4] == b"BKHD":
+        return ".bnk"
+    if len(data) >= 4 and data[:4] == b"AKPK":
+        return ".npk"
+    if len(data) >= 4 and data[:4] == b"\x28\xb5\x2f\xfd":
+        return ".zst"
+    if len(data) >= len(TGA_TAIL_MAGIC) and data[-len(TGA_TAIL_MAGIC):] == TGA_TAIL_MAGIC:
+        return ".tga"
+    return ""
+
+
+# ===================== 运行统计 =====================
+
+STAGE_NAMES = ("read", "scan", "validate", "decompress", "hash", "detect", "mkdir", "write")
+STAGE_LABELS = {
+    "read": "读取",
+    "scan": "扫描",
+    "validate": "校验",
+    "decompress": "解压",
+    "hash": "哈希",
+    "detect": "识别",
+    "mkdir": "建目录",
+    "write": "写入",
+}
+STAT_COUNTERS = ("bytes_in", "bytes_out", "frames", "duplicates", "failed")
+
+
+class StageStats:
+    """每个工作线程一份计数器，热路径不加锁；界面定时调用 snapshot() 汇总。"""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._slots = []
+        self.started_at = time.perf_counter()
+
+    def _slot(self) -> dict:
+        slot = getattr(self._local, "slot", None)
+        if slot is None:
+            slot = dict.fromkeys(STAT_COUNTERS + STAGE_NAMES, 0)
+            self._local.slot = slot
+            with self._lock:
+                self._slots.append(slot)
+        return slot
+
+    def add_time(self, stage: str, seconds: float):
+        self._slot()[stage] += seconds
+
+    def count(self, name: str, n: int = 1):
+        self._slot()[name] += n
+
+    def snapshot(self) -> dict:
+        total = dict.fromkeys(STAT_COUNTERS + STAGE_NAMES, 0)
+        with self._lock:
+            slots = list(self._slots)
+        for slot in slots:
+            for key, value in list(slot.items()):
+                total[key] += value
+        total["elapsed"] = time.perf_counter() - self.started_at
+        return total
+
+
+def scan_zstd_frames(data: bytes):
+    magic = b"\x28\xb5\x2f\xfd"
+    positions = []
+    pos = 0
+    while True:
+        pos = data.find(magic, pos)
+        if pos == -1:
+            break
+        positions.append(pos)
+        pos += len(magic)
+    return positions
+
+
+FRAME_HEADER_MAX = 18  # Zstd 帧头最长 18 字节（含魔数）
+READ_CHUNK_SIZE = 16 * 1024 * 1024
+DECOMPRESS_CHUNK_SIZE = 1024 * 1024
+WRITE_CHUNK_SIZE = 4 * 1024 * 1024
+BATCH_IN_FLIGHT = 2  # 批量解压时最多几批结果在等待写入（限制驻留内存）
+
+
+class ExtractCancelled(Exception):
+    """停止请求到达正在进行的读取 / 解压 / 写入时抛出。"""
+
+
+def read_file_cancellable(path: str, stop_flag) -> bytearray:
+    size = os.path.getsize(path)
+    buf = bytearray(size)
+    pos = 0
+    with memoryview(buf) as view, open(path, "rb") as f:
+        while pos < size:
+            if stop_flag():
+                raise ExtractCancelled()
+            n = f.readinto(view[pos:pos + READ_CHUNK_SIZE])
+            if not n:
+                break
+            pos += n
+    if pos < size:
+        del buf[pos:]
+    return buf
+
+
+def decompress_frame_cancellable(data, frame_start: int, stop_flag, max_output_size: int = MAX_OUTPUT_SIZE):
+    """返回 (解压数据, 实际消耗的压缩字节数)。解压上下文按线程复用（见 ZstdFrames.get_decompressor）。"""
+    header = parse_frame_header(data, frame_start)
+    if header is not None and header.content_size is not None and header.content_size > max_output_size:
+        raise zstd.ZstdError(f"帧声明的解压后大小 {header.content_size} 超过上限 {max_output_size}")
+    # 小帧（绝大多数）一次解完：帧头有解压后大小时输出缓冲区一次分配到位，也不必检查停止标志
+    frame_stop = frame_end(data, frame_start, header) if header is not None else None
+    if frame_stop is not None and frame_stop - frame_start <= DECOMPRESS_CHUNK_SIZE:
+        decompressed, frame_stop = decompress_frame(data, frame_start, max_output_size)
+        return decompressed, frame_stop - frame_start
+
+    # 大帧分块喂给 decompressobj，每块之间检查停止标志，避免单个大帧阻塞停止
+    dobj = get_decompressor(header.dict_id if header is not None else 0).decompressobj()
+    chunks = []
+    total = 0
+    pos = frame_start
+    end = len(data)
+    with memoryview(data) as view:
+        while pos < end:
+            if stop_flag():
+                raise ExtractCancelled()
+            chunk = view[pos:pos + DECOMPRESS_CHUNK_SIZE]
+            chunks.append(dobj.decompress(chunk))
+            total += len(chunks[-1])
+            if total > max_output_size:
+                raise zstd.ZstdError(f"解压后大小超过上限 {max_output_size}")
+            pos += len(chunk)
+            if dobj.eof:
+                break
+    if not dobj.eof:
+        raise zstd.ZstdError("帧数据不完整")
+    consumed = pos - frame_start - len(dobj.unused_data)
+    return b"".join(chunks), consumed
+
+
+def write_output_cancellable(output_path: str, payload: bytes, stop_flag):
+    # 先写 .part 临时文件，完成后再改名；中断或异常时删除半成品
+    tmp_path = output_path + ".part"
+    try:
+        with memoryview(payload) as view, open(tmp_path, "wb") as f:
+            for pos in range(0, len(view), WRITE_CHUNK_SIZE):
+                if stop_flag():
+                    raise ExtractCancelled()
+                f.write(view[pos:pos + WRITE_CHUNK_SIZE])
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def frame_prefix(frame_idx: int, frame_start: int) -> str:
+    return f"[帧 {frame_idx + 1:04d} @ 0x{frame_start:08X}] "
+
+
+def lap_stage(clock: SpanClock, stats: StageStats, stage: str):
+    elapsed = clock.lap(stage)
+    if stats is not None:
+        stats.add_time(stage, elapsed)
+
+
+def extract_single_frame(
+    data: bytes,
+    frame_start: int,
+    output_root: str,
+    frame_idx: int,
+    extracted_hashes: DuplicateIndex,
+    stop_flag,
+    enable_md5: bool = True,
+    enable_type_detect: bool = True,
+    stats: StageStats = None,
+    profiler=None,
+    pack: PackWriter = None,
+    converter: TextureConverter = None,
+):
+    load_zstd()
+    if stop_flag():
+        return False, "任务已中断（未开始解压该帧）", None
+
+    prefix = frame_prefix(frame_idx, frame_start)
+    clock = SpanClock(profiler, frame_idx)
+    failed_stage = "validate"
+
+    try:
+        # 先只解析帧头，伪造的魔数在这里就被筛掉，不必进入解压
+        zstd.get_frame_parameters(bytes(data[frame_start:frame_start + FRAME_HEADER_MAX]))
+        lap_stage(clock, stats, "validate")
+        failed_stage = "decompress"
+        try:
+            decompressed, consumed = decompress_frame_cancellable(data, frame_start, stop_flag)
+        except ExtractCancelled:
+            return False, f"{prefix}任务已中断（解压未完成）", None
+        lap_stage(clock, stats, "decompress")
+        if stats is not None:
+            stats.count("bytes_in", consumed)
+    except zstd.ZstdError as e:
+        lap_stage(clock, stats, failed_stage)
+        if stats is not None:
+            stats.count("frames")
+            stats.count("failed")
+        msg = f"{prefix}解压失败: {str(e)}"
+        return False, msg, None
+    except Exception as e:
+        if stats is not None:
+            stats.count("frames")
+            stats.count("failed")
+        msg = f"{prefix}处理异常: {str(e)}"
+        return False, msg, None
+
+    return store_frame(
+        decompressed, consumed, frame_start, output_root, frame_idx, extracted_hashes, stop_flag,
+        enable_md5, enable_type_detect, stats, profiler, pack, converter, clock,
+    )
+
+
+def store_frame(
+    decompressed,
+    consumed: int,
+    frame_start: int,
+    output_root: str,
+    frame_idx: int,
+    extracted_hashes: DuplicateIndex,
+    stop_flag,
+    enable_md5: bool = True,
+    enable_type_detect: bool = True,
+    stats: StageStats = None,
+    profiler=None,
+    pack: PackWriter = None,
+    converter: TextureConverter = None,
+    clock: SpanClock = None,
+):
+    """已解压的一帧：哈希 → 去重 → 类型识别 → 写入 (→ 纹理转 PNG)。decompressed 可以是 bytes 或 memoryview（批量解压的结果）"""
+    prefix = frame_prefix(frame_idx, frame_start)
+    if clock is None:
+        clock = SpanClock(profiler, frame_idx)
+    if stop_flag():
+        return False, f"{prefix}任务已中断（解压完成但未写入文件）", None
+
+    try:
+        file_hash = hashlib.md5(decompressed).hexdigest()
+        lap_stage(clock, stats, "hash")
+
+        if enable_type_detect:
+            ext = detect_file_extension(decompressed)
+        else:
+            ext = ""
+        # 只读文件头的属性（尺寸 / 时长 / 顶点数），和类型识别一起计时
+        meta = probe_metadata(decompressed, ext)
+        lap_stage(clock, stats, "detect")
+
+        category = FILE_CATEGORY_MAP.get(ext, "未知文件")
+        category_folder = os.path.join(output_root, category)
+        output_filename = f"extracted_frame_{frame_idx + 1}{ext}"
+        if pack is not None:
+            output_path = member_path(pack.index_path, category, output_filename)
+        else:
+            output_path = os.path.join(category_folder, output_filename)
+
+        # 检查与占位在同一把锁内完成，两个线程同时解出相同内容时只会写一份
+        if enable_md5:
+            first_path = extracted_hashes.claim(file_hash, output_path)
+            if first_path is not None:
+                if stats is not None:
+                    stats.count("frames")
+                    stats.count("duplicates")
+                msg = f"{prefix}跳过重复帧 (哈希: {file_hash[:8]})"
+                # path 是这一帧本该写出的位置，开启“重复帧保留为链接”时在这里建链接
+                info = {
+                    "status": STATUS_DUPLICATE,
+                    "name": output_filename,
+                    "ext": ext,
+                    "category": category,
+                    "size": len(decompressed),
+                    "compressed_size": consumed,
+                    "path": output_path,
+                    "hash": file_hash,
+                    "duplicate_of": first_path,
+                }
+                return False, msg, info
+
+        try:
+            if pack is not None:
+                pack.add(category, output_filename, decompressed, file_hash, ext)
+            else:
+                Path(category_folder).mkdir(parents=True, exist_ok=True)
+                lap_stage(clock, stats, "mkdir")
+                write_output_cancellable(output_path, decompressed, stop_flag)
+        except ExtractCancelled:
+            if enable_md5:
+                extracted_hashes.release(file_hash)
+            return False, f"{prefix}任务已中断（未写入文件）", None
+        except BaseException:
+            if enable_md5:
+                extracted_hashes.release(file_hash)
+            raise
+        lap_stage(clock, stats, "write")
+
+        # 纹理交给进程池转 PNG，写在原文件旁边；这里只排队，不等转换完成
+        if converter is not None and ext in TEXTURE_EXTS:
+            converter.submit(decompressed, ext, file_hash, os.path.splitext(output_path)[0] + ".png", output_filename)
+
+        size = len(decompressed)
+        if stats is not None:
+            stats.count("frames")
+            stats.count("bytes_out", size)
+        size_kb = size / 1024
+        msg = (
+            f"{prefix}成功解压: {output_filename} -> {category} "
+            f"(大小: {size_kb:.2f} KB, 哈希: {file_hash[:8]})"
+        )
+        info = {
+            "status": STATUS_EXTRACTED,
+            "name": output_filename,
+            "ext": ext,
+            "category": category,
+            "size": size,
+            "compressed_size": consumed,
+            "path": output_path,
+            "hash": file_hash,
+        }
+        if meta:
+            info["meta"] = meta
+        return True, msg, info
+    except Exception as e:
+        if stats is not None:
+            stats.count("frames")
+            stats.count("failed")
+        msg = f"{prefix}处理异常: {str(e)}"
+        return False, msg, None
+
+
+# ===================== 解包任务 =====================
+
+class ExtractError(Exception):
+    """任务无法开始（例如输入文件不存在），消息直接展示给用户。"""
+
+
+class ExtractJob:
+    """
+    一次完整的解包：读取 → 扫描 → (断点续传) → 逐帧解压/去重/识别/写入。
+    通过回调汇报进度，回调都在调用 run() 的线程里执行：
+      log(logger_name, level, message)
+      progress(current, total)
+      file(info)
+    manifest_path 为 None 时清单写到 <输出目录>/manifest/<容器名>.manifest.jsonl，为空字符串时不写。
+    metadata_path 同理，默认 <输出目录>/manifest/metadata.sqlite：提取出的文件连同文件头属性写入这个索引
+    （见 AssetMetadata），属性也放在 file 回调的 info["meta"] 里。
+    link_duplicates 为 True 时重复帧不再丢弃，而是在它自己的输出位置建立指向首个文件的
+    reflink / 硬链接（不支持时复制），link_mode 见 OutputMaterializer.MODES。
+    dict_dir 为 Zstd 字典目录；容器里夹带的字典总会被收集（见 ZstdFrames.DictionaryStore）。
+    batch_decompress 为 True 时快速模式先把帧分批交给 zstandard 的 multi_decompress_to_buffer
+    （C 线程解压，不占 GIL），结果零拷贝交给工作线程哈希 / 识别 / 写入；整批失败时这批的帧逐帧重试。
+    access_mode 见 InputReadahead.ACCESS_MODES：read 整个读进内存；mmap 内存映射，预读线程保持处理位置之后
+    readahead 字节驻留、之前的释放，适合比内存还大的容器；auto 按文件大小选择。
+    max_threads 为 WorkerAutotune.AUTO（0）时按吞吐量自动调整线程数，结果记在 self.tuner。
+    pack_output 为 True 时不写散文件，全部追加到 <输出目录>/pack/<容器名>.NNN.pack 并写索引
+    （见 AssetPack）；此时重复帧的“链接”是索引里指向同一段数据的别名。
+    convert_textures 为 True 时提取出的 .dds / .ktx / .tga 另外在进程池里转成同名 .png（见 TextureConvert），
+    结果按内容缓存在 texture_cache（为空时用默认的用户级缓存目录）。
+    """
+
+    def __init__(self, input_file: str, output_root: str, fast_mode: bool = True,
+                 max_threads: int = 8, enable_md5: bool = True, enable_type_detect: bool = True,
+                 log=None, progress=None, file=None, profiler=None, manifest_path=None,
+                 link_duplicates: bool = False, link_mode: str = "auto", dict_dir: str = "",
+                 pack_output: bool = False, batch_decompress: bool = True,
+                 access_mode: str = ACCESS_AUTO, readahead: int = READAHEAD_WINDOW,
+                 convert_textures: bool = False, texture_cache: str = "", metadata_path=None):
+        self.input_file = input_file
+        self.output_root = output_root
+        self.fast_mode = fast_mode
+        self.max_threads = max_threads
+        self.enable_md5 = enable_md5
+        self.enable_type_detect = enable_type_detect
+        self.on_log = log or (lambda name, level, message: None)
+        self.on_progress = progress or (lambda current, total: None)
+        self.on_file = file or (lambda info: None)
+        self.profiler = profiler
+        if manifest_path is None:
+            manifest_path = default_manifest_path(output_root, input_file)
+        self.manifest_path = manifest_path
+        if metadata_path is None:
+            metadata_path = default_metadata_path(output_root)
+        self.metadata_path = metadata_path
+        self.link_duplicates = link_duplicates
+        self.materializer = Materializer(link_mode) if link_duplicates and not pack_output else None
+        self.dict_dir = dict_dir
+        self.pack_output = pack_output
+        self.batch_decompress = batch_decompress
+        self.access_mode = access_mode
+        self.readahead = readahead
+        self.convert_textures = convert_textures
+        self.texture_cache = texture_cache
+        self.converter = None
+        self.tuner = None
+        self._stop = False
+        self.stats = StageStats()
+
+    def stop(self):
+        self._stop = True
+
+    @property
+    def stopped(self) -> bool:
+        return self._stop
+
+    def info(self, message: str, name: str = "gui"):
+        self.on_log(name, "INFO", message)
+
+    def run(self) -> int:
+        """返回本次（含续传部分）提取的不重复文件数；被停止时返回已提取的数量。"""
+        load_zstd()
+        if not os.path.exists(self.input_file):
+            raise ExtractError(f"错误：文件不存在 -> {self.input_file}")
+        if not os.path.exists(self.output_root):
+            os.makedirs(self.output_root, exist_ok=True)
+
+        file_size = os.path.getsize(self.input_file)
+
+        self.info("============================================================")
+        self.info("开始解包任务...")
+        self.info(f"文件: {self.input_file}")
+        self.info(f"大小: {file_size} 字节 ({file_size / 1024 / 1024:.2f} MB)")
+        self.info("开始解析 Zstd 容器结构...")
+        self.info("------------------------------------------------------------")
+        self.info("正在扫描 Zstd 帧位置...")
+
+        clock = SpanClock(self.profiler)
+        if choose_access(self.access_mode, file_size) == ACCESS_MMAP:
+            self.info(f"输入方式: 内存映射 + 顺序预读（窗口 {self.readahead / 1024 / 1024:.0f} MB）")
+            source = MappedInput(self.input_file, self.readahead)
+            data = source.data
+        else:
+            source = None
+            try:
+                data = read_file_cancellable(self.input_file, lambda: self._stop)
+            except ExtractCancelled:
+                self.info("解包已停止（读取阶段）。")
+                return 0
+        self.stats.add_time("read", clock.lap("read"))
+        try:
+            return self._extract(data, source, clock)
+        finally:
+            if source is not None:
+                del data
+                source.close()
+                self.info(f"预读 {source.bytes_prefetched / 1024 / 1024:.1f} MB，"
+                          f"释放 {source.bytes_released / 1024 / 1024:.1f} MB")
+
+    def _resubmit_texture(self, converter, pack, info):
+        """
+        帧记进日志时 PNG 可能还在转换队列里（中断时被取消），续传跳过这些帧后要补交转换；
+        PNG 已经在的不再转，其余多半能直接命中缓存。
+        """
+        png_path = os.path.splitext(info["path"])[0] + ".png"
+        try:
+            if pack is not None and is_pack_path(png_path):
+                if split_pack_path(png_path)[1] in pack:
+                    return
+                data = pack.read(split_pack_path(info["path"])[1])
+            else:
+                if os.path.exists(png_path):
+                    return
+                with open(info["path"], "rb") as f:
+                    data = f.read()
+        except (OSError, KeyError) as e:
+            self.on_log("gui.extract", "WARNING", f"[纹理转换] 续传时无法读取 {info['name']}: {e}")
+            return
+        converter.submit(data, info["ext"], info["hash"], png_path, info["name"])
+
+    def _extract(self, data, source, clock) -> int:
+        if self.dict_dir:
+            loaded = DICTIONARIES.load_dir(self.dict_dir)
+            if loaded:
+                self.info(f"从字典目录加载了 {loaded} 个 Zstd 字典: {self.dict_dir}")
+        if source is not None:
+            # 映射模式分块扫描，扫过就释放，不让整个文件驻留
+            harvested = DICTIONARIES.harvest(data, self.input_file, source.find_all(DICT_MAGIC, lambda: self._stop))
+        else:
+            harvested = DICTIONARIES.harvest(data, self.input_file)
+        if harvested:
+            self.info(f"从容器中收集到 {harvested} 个 Zstd 字典")
+        if source is not None:
+            frame_positions = source.find_all(ZSTD_MAGIC, lambda: self._stop)
+        else:
+            frame_positions = scan_zstd_frames(data)
+        self.stats.add_time("scan", clock.lap("scan"))
+        total_frames = len(frame_positions)
+
+        if self._stop:
+            self.info("解包已停止（扫描阶段后）。")
+            return 0
+
+        self.info(f"总共找到 {total_frames} 个 Zstd 帧")
+        self.info("开始解压...")
+        self.info("------------------------------------------------------------")
+
+        if total_frames == 0:
+            return 0
+
+        extracted_hashes = DuplicateIndex()
+        extracted_count = 0
+        manifest = ManifestWriter(self.manifest_path) if self.manifest_path else None
+        metadata = MetadataIndex(self.metadata_path) if self.metadata_path else None
+
+        # 断点续传：跳过日志里已完成且输出仍完好的帧
+        journal = ExtractJournal(
+            self.output_root, self.input_file, self.enable_md5, self.enable_type_detect,
+            *(("pack",) if self.pack_output else ()),
+        )
+        done = journal.completed()
+        # 续传时接着已有的包追加，否则重写
+        pack = None
+        if self.pack_output:
+            pack = PackWriter(default_pack_index(self.output_root, self.input_file), append=bool(done))
+        converter = None
+        if self.convert_textures:
+            converter = self.converter = TextureConverter(self.texture_cache, pack=pack)
+        for rec in done.values():
+            if manifest is not None and rec.get("row"):
+                manifest.write(rec["row"])
+            info = rec.get("info")
+            if not info:
+                continue
+            if self.enable_md5 and rec.get("hash"):
+                extracted_hashes.add(rec["hash"], rec["path"])
+            extracted_count += 1
+            if metadata is not None:
+                metadata.add(info, self.input_file)
+            if converter is not None and info.get("ext") in TEXTURE_EXTS:
+                self._resubmit_texture(converter, pack, info)
+            self.on_file(info)
+        pending = [
+            (i, frame_start) for i, frame_start in enumerate(frame_positions)
+            if frame_start not in done
+        ]
+        if done and pending:
+            self.info(f"断点续传: 已完成 {len(done)} 帧，从第 {pending[0][0] + 1} 帧继续")
+        finished_frames = total_frames - len(pending)
+        self.on_progress(finished_frames, total_frames)
+
+        # 映射模式：帧提交时 begin、处理完 end，预读 / 释放跟着最慢的在处理帧走
+        if source is not None:
+            source.start(pending[0][1] if pending else 0)
+            begin, end = source.begin, source.end
+        else:
+            begin = end = lambda offset: None
+
+        stop_flag = lambda: self._stop
+        profiler = self.profiler
+        if profiler is not None and profiler.enable_cprofile:
+            def task(*args):
+                return profiler.run_profiled(extract_single_frame, *args)
+
+            def store_task(*args):
+                return profiler.run_profiled(store_frame, *args)
+        else:
+            task = extract_single_frame
+            store_task = store_frame
+
+        # 首个文件还没写完的重复帧（多线程下由后面的帧先占位时）等全部帧处理完再建链接
+        deferred_links = []
+
+        def record_duplicate(frame_idx, frame_start, info, link_path=""):
+            row = make_row(
+                self.input_file, frame_idx, frame_start, STATUS_DUPLICATE,
+                info["compressed_size"], info["size"], info["hash"],
+                info.get("ext", ""), info.get("category", ""), link_path,
+                duplicate_of=info["duplicate_of"],
+            )
+            journal.record(frame_start, row=row)
+            if manifest is not None:
+                manifest.write(row)
+
+        def link_duplicate(frame_idx, frame_start, info):
+            """在重复帧自己的位置放一个指向首个文件的链接；返回 True 表示已处理完"""
+            first_path = info["duplicate_of"]
+            if pack is not None:
+                link_path = pack.alias(first_path, info["category"], info["name"])
+                if link_path is None:
+                    return False
+                self.info(f"[帧 {frame_idx + 1}] 重复帧 -> {info['name']} (索引别名)", "gui.extract")
+                record_duplicate(frame_idx, frame_start, info, link_path)
+                return True
+            if not os.path.exists(first_path):
+                return False
+            link_path = info["path"]
+            try:
+                if os.path.lexists(link_path):
+                    os.remove(link_path)
+                os.makedirs(os.path.dirname(link_path), exist_ok=True)
+                method = self.materializer.place(first_path, link_path)
+            except OSError as e:
+                self.on_log("gui.extract", "WARNING", f"[帧 {frame_idx + 1}] 重复帧建立链接失败: {e}")
+                record_duplicate(frame_idx, frame_start, info)
+                return True
+            self.info(f"[帧 {frame_idx + 1}] 重复帧 -> {os.path.basename(link_path)} ({method})", "gui.extract")
+            record_duplicate(frame_idx, frame_start, info, link_path)
+            return True
+
+        def handle_result(frame_idx, frame_start, ok, msg, info):
+            nonlocal extracted_count, finished_frames
+            self.info(msg, "gui.extract")
+            if ok and info is not None:
+                extracted_count += 1
+                row = make_row(
+                    self.input_file, frame_idx, frame_start, STATUS_EXTRACTED,
+                    info["compressed_size"], info["size"], info["hash"],
+                    info["ext"], info["category"], info["path"],
+                )
+                journal.record(
+                    frame_start, info["path"], size=info["size"],
+                    hash=info.get("hash", ""), info=info, row=row,
+                )
+                if metadata is not None:
+                    metadata.add(info, self.input_file)
+                self.on_file(info)
+            elif info is not None:
+                # 重复帧 / 解压失败也记下来，续传时不再重试；被中断的帧不记
+                row = None
+                if not self.link_duplicates:
+                    record_duplicate(frame_idx, frame_start, info)
+                elif not link_duplicate(frame_idx, frame_start, info):
+                    deferred_links.append((frame_idx, frame_start, info))
+            elif not self._stop:
+                row = make_row(self.input_file, frame_idx, frame_start, STATUS_FAILED)
+                journal.record(frame_start, row=row)
+            else:
+                row = None
+            if manifest is not None and row is not None:
+                manifest.write(row)
+            finished_frames += 1
+            self.on_progress(finished_frames, total_frames)
+
+        try:
+            if self.fast_mode:
+                workers = self.max_threads
+                submit_task = task
+                submit_store = store_task
+                if self.max_threads == AUTO:
+                    self.tuner = WorkerAutotuner(
+                        measure=lambda result: result[2]["size"] if result[2] else 0,
+                        log=lambda message: self.info(message, "gui.extract"),
+                    )
+                    workers = self.tuner.max_workers
+                    submit_task = lambda *args: self.tuner.run(task, *args)
+                    submit_store = lambda *args: self.tuner.run(store_task, *args)
+                    self.info(f"[快速模式] 自动调整线程数, 从 {self.tuner.workers} 开始, 上限 {workers}")
+                else:
+                    self.info(f"[快速模式] 使用多线程解压, 线程数={self.max_threads}")
+                # 不用 with：停止时要取消排队中的任务，而不是等它们全部跑完
+                executor = ThreadPoolExecutor(max_workers=workers)
+                try:
+                    def submit_frame(i, frame_start):
+                        begin(frame_start)
+                        future = executor.submit(
+                            submit_task,
+                            data,
+                            frame_start,
+                            self.output_root,
+                            i,
+                            extracted_hashes,
+                            stop_flag,
+                            self.enable_md5,
+                            self.enable_type_detect,
+                            self.stats,
+                            profiler,
+                            pack,
+                            converter,
+                        )
+                        future.add_done_callback(lambda _, offset=frame_start: end(offset))
+                        return [(i, frame_start, future)]
+
+                    def submit_batch(batch):
+                        """主线程整批解压（C 线程），每帧的结果交给工作线程；失败时整批逐帧重试"""
+                        started = time.perf_counter()
+                        for _, frame_start, _, _ in batch.items:
+                            begin(frame_start)
+                        try:
+                            segments = decompress_batch(
+                                data, batch, self.tuner.workers if self.tuner is not None else workers
+                            )
+                        except zstd.ZstdError as e:
+                            self.on_log("gui.extract", "WARNING",
+                                        f"[批量解压] {len(batch.items)} 帧的批次解压失败，改为逐帧处理: {e}")
+                            submitted = []
+                            for i, frame_start, _, _ in batch.items:
+                                submitted.extend(submit_frame(i, frame_start))
+                            return submitted
+                        finally:
+                            # 解压结果在自己的缓冲区里，不再需要容器数据
+                            for _, frame_start, _, _ in batch.items:
+                                end(frame_start)
+                        self.stats.add_time("decompress", time.perf_counter() - started)
+                        submitted = []
+                        for (i, frame_start, frame_stop, _), segment in zip(batch.items, segments):
+                            consumed = frame_stop - frame_start
+                            self.stats.count("bytes_in", consumed)
+                            submitted.append((i, frame_start, executor.submit(
+                                submit_store,
+                                memoryview(segment),
+                                consumed,
+                                frame_start,
+                                self.output_root,
+                                i,
+                                extracted_hashes,
+                                stop_flag,
+                                self.enable_md5,
+                                self.enable_type_detect,
+                                self.stats,
+                                profiler,
+                                pack,
+                                converter,
+                            )))
+                        return submitted
+
+                    def drain(submitted):
+                        for i, frame_start, future in submitted:
+                            if self._stop:
+                                break
+                            handle_result(i, frame_start, *future.result())
+
+                    # 按偏移分段（每段不超过一个预读窗口）规划批次，批次和逐帧的帧按偏移顺序提交：
+                    # 映射模式下对容器的访问保持顺序，规划时读的块头也都在预读窗口附近。
+                    # 逐帧的直接排队，只有批次的解压结果（占内存）限制在 BATCH_IN_FLIGHT 批以内
+                    in_flight = deque()
+                    batches_in_flight = 0
+                    batch_count = batched_frames = single_frames = 0
+                    part_start = 0
+                    while part_start < len(pending) and not self._stop:
+                        part_stop = part_start + 1
+                        limit = pending[part_start][1] + self.readahead
+                        while part_stop < len(pending) and pending[part_stop][1] < limit:
+                            part_stop += 1
+                        part = pending[part_start:part_stop]
+                        part_start = part_stop
+                        if self.batch_decompress:
+                            batches, singles = plan_batches(data, part)
+                        else:
+                            batches, singles = [], part
+                        batch_count += len(batches)
+                        batched_frames += len(part) - len(singles)
+                        single_frames += len(singles)
+                        units = [(batch.items[0][1], batch) for batch in batches]
+                        units.extend((frame_start, (i, frame_start)) for i, frame_start in singles)
+                        units.sort(key=lambda unit: unit[0])
+                        for _, unit in units:
+                            if self._stop:
+                                break
+                            if isinstance(unit, tuple):
+                                in_flight.append((False, submit_frame(*unit)))
+                                continue
+                            in_flight.append((True, submit_batch(unit)))
+                            batches_in_flight += 1
+                            while batches_in_flight > BATCH_IN_FLIGHT:
+                                is_batch, submitted = in_flight.popleft()
+                                batches_in_flight -= is_batch
+                                drain(submitted)
+                    while in_flight and not self._stop:
+                        drain(in_flight.popleft()[1])
+                    if self.batch_decompress:
+                        self.info(f"[批量解压] {batched_frames} 帧分为 {batch_count} 批，"
+                                  f"其余 {single_frames} 帧逐帧解压")
+                finally:
+                    # 进行中的帧会在下一个分块检查点退出并清理 .part 文件
+                    executor.shutdown(wait=True, cancel_futures=True)
+            else:
+                self.info("[正常模式] 串行解压")
+                for i, frame_start in pending:
+                    if self._stop:
+                        break
+                    begin(frame_start)
+                    result = task(
+                        data, frame_start, self.output_root, i,
+                        extracted_hashes, stop_flag,
+                        self.enable_md5, self.enable_type_detect,
+                        self.stats, profiler, pack, converter,
+                    )
+                    end(frame_start)
+                    handle_result(i, frame_start, *result)
+            # 停止时不处理：这些帧没有记入日志，续传时会重新处理
+            for frame_idx, frame_start, info in deferred_links:
+                if self._stop:
+                    break
+                if not link_duplicate(frame_idx, frame_start, info):
+                    record_duplicate(frame_idx, frame_start, info)
+        except BaseException:
+            journal.close()
+            raise
+        finally:
+            # 转换结果可能还要写进包里，先等转换结束再关包
+            if converter is not None:
+                converter.close(cancel=self._stop)
+            if pack is not None:
+                pack.close()
+            if manifest is not None:
+                manifest.close()
+            if metadata is not None:
+                metadata.close()
+        if self._stop:
+            journal.close()
+        else:
+            journal.finish()
+
+        if self._stop:
+            self.info("解包已停止。")
+        else:
+            self.info("------------------------------------------------------------")
+            self.info(f"解压完成! 共提取 {extracted_count} 个不重复文件")
+        if self.materializer is not None and any(self.materializer.counts.values()):
+            self.info(f"重复帧链接: {self.materializer.summary()}")
+        if self.tuner is not None:
+            self.info(self.tuner.summary())
+        if converter is not None:
+            for source, status, message in converter.problems:
+                level = "WARNING" if status == TEXTURE_FAILED else "INFO"
+                self.on_log("gui.extract", level, f"[纹理转换] {source}: {message}")
+            self.info(f"[纹理转换] {converter.summary()}（缓存: {converter.cache_dir}）")
+        if pack is not None:
+            self.info(f"输出包: {pack.index_path} ({pack.bytes_written / 1024 / 1024:.2f} MB)")
+        if manifest is not None:
+            self.info(f"提取清单: {self.manifest_path}")
+        if metadata is not None:
+            self.info(f"属性索引: {self.metadata_path}")
+        return extracted_count
@@ -1,19 +1,60 @@
 # -*- coding: utf-8 -*-
 import os
 import sys
-import hashlib
 import shutil
-from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor
+import multiprocessing
+from collections import deque
 from datetime import datetime
-import subprocess
 import threading
 import logging
+import time
+import tempfile
+import traceback
+import faulthandler
 
-import zstandard as zstd
 from PyQt5 import QtCore, QtGui, QtWidgets
 
+from NpkUnlock_Core import (
+    ExtractError,
+    ExtractJob,
+    STAGE_LABELS,
+    STAGE_NAMES,
+    STAT_COUNTERS,
+)
+from AssetMetadata import METADATA_DB_NAME, MetadataIndex, describe, match_filter, parse_filter, sort_key
+from AssetPack import export_pack_paths, is_pack_path, split_pack_path
+from ExtractManifest import MANIFEST_DIR_NAME, STATUS_EXTRACTED, read_manifest, row_to_file_info
+from StageProfiler import StageProfiler, default_trace_path
+from TextureConvert import default_cache_dir as default_texture_cache
+from WorkerAutotune import AUTO as AUTO_THREADS
+
 CHILD_ARG = "--run-main-child"
+LAUNCHER_ARG = "--launcher"           # 旧的父子双进程启动方式
+STARTUP_PROBE_ENV = "NEONPK_STARTUP_PROBE"  # 启动耗时测试：窗口显示后打印标记并退出
+
+# 每个进程一个崩溃日志（neonpk_crash.<pid>.log），多开时互不覆盖；
+# 启动时只接手已退出进程留下的日志
+CRASH_LOG_PREFIX = "neonpk_crash."
+CRASH_LOG_PATH = os.path.join(tempfile.gettempdir(), f"{CRASH_LOG_PREFIX}{os.getpid()}.log")
+WATCHDOG_TIMEOUT = 30  # 主线程连续多少秒无响应就把所有线程的堆栈写入崩溃日志
+CRASH_TAIL_LINES = 200
+
+ACCESS_MODE_LABELS = {
+    "auto": "自动（不小于 2 GB 时内存映射）",
+    "read": "整个读入内存",
+    "mmap": "内存映射 + 顺序预读（比内存还大的容器）",
+}
+
+# 文件列表的列；大小 / 属性列按数值排序
+FILE_COLUMNS = ("文件名", "扩展名", "类别", "大小", "属性", "路径")
+PATH_COLUMN = FILE_COLUMNS.index("路径")
+
+# NpkUnlocker / PPKUnlocker 写出的清单用另一套分类名，加载时映射到文件列表的筛选分类
+MANIFEST_CATEGORY_ALIASES = {
+    "音频文件": "普通文件",
+    "图片纹理": "图片文件",
+    "数据包文件": "数据文件",
+}
 
 # ===================== 日志系统 =====================
 
@@ -28,6 +69,25 @@ stream_handler = logging.StreamHandler(sys.stdout)
 stream_handler.setFormatter(formatter_gui)
 logger_gui.addHandler(stream_handler)
 
+
+class RecentLogHandler(logging.Handler):
+    """保留最近的日志行，崩溃窗口直接展示，不再需要父进程转发 stdout"""
+
+    def __init__(self, capacity: int = CRASH_TAIL_LINES):
+        super().__init__()
+        self.lines = deque(maxlen=capacity)
+
+    def emit(self, record):
+        try:
+            self.lines.append(self.format(record))
+        except Exception:
+            pass
+
+
+recent_log_handler = RecentLogHandler()
+recent_log_handler.setFormatter(formatter_gui)
+logger_gui.addHandler(recent_log_handler)
+
 file_handler = None
 
 
@@ -64,138 +124,6 @@ def format_gui_log_line(logger_name: str, level: str, message: str) -> str:
     return f"{timestamp} - {level} - {logger_name} - {message}"
 
 
-# ===================== 文件类型检测 =====================
-
-FILE_CATEGORY_MAP = {
-    ".wem": "普通文件",   # 内部分类仍然叫“普通文件”，UI 显示映射为“音频文件”
-    ".bnk": "普通文件",
-    ".png": "图片文件",
-    ".dds": "图片文件",
-    ".ktx": "图片文件",
-    ".tga": "图片文件",
-    ".mesh": "模型文件",
-    ".npk": "数据文件",
-    ".zst": "压缩文件",
-    "": "未知文件",
-}
-
-TGA_TAIL_MAGIC = b"TRUEVISION-XFILE.\x00"
-
-
-def detect_file_extension(data: bytes) -> str:
-    if not data:
-        return ""
-    mesh_magic = b"\x34\x80\xc8\xbb"
-    if len(data) >= 4 and data[:4] == mesh_magic:
-        return ".mesh"
-    png_magic = b"\x89PNG"
-    if len(data) >= 4 and data[:4] == png_magic:
-        return ".png"
-    ktx_magic = b"\xABKTX 11\xBB"
-    if len(data) >= 8 and data[:8] == ktx_magic:
-        return ".ktx"
-    if len(data) >= 3 and data[:3] == b"DDS":
-        return ".dds"
-    if len(data) >= 12 and data[:4] == b"RIFF" and data[8:12] == b"WAVE":
-        return ".wem"
-    if len(data) >= 4 and data[:4] == b"BKHD":
-        return ".bnk"
-    if len(data) >= 4 and data[:4] == b"AKPK":
-        return ".npk"
-    if len(data) >= 4 and data[:4] == b"\x28\xb5\x2f\xfd":
-        return ".zst"
-    if len(data) >= len(TGA_TAIL_MAGIC) and data[-len(TGA_TAIL_MAGIC):] == TGA_TAIL_MAGIC:
-        return ".tga"
-    return ""
-
-
-def scan_zstd_frames(data: bytes):
-    magic = b"\x28\xb5\x2f\xfd"
-    positions = []
-    pos = 0
-    while True:
-        pos = data.find(magic, pos)
-        if pos == -1:
-            break
-        positions.append(pos)
-        pos += len(magic)
-    return positions
-
-
-def extract_single_frame(
-    data: bytes,
-    frame_start: int,
-    output_root: str,
-    frame_idx: int,
-    extracted_hashes: set,
-    stop_flag,
-    enable_md5: bool = True,
-    enable_type_detect: bool = True,
-):
-    if stop_flag():
-        return False, "任务已中断（未开始解压该帧）", None
-
-    prefix = f"[帧 {frame_idx + 1:04d} @ 0x{frame_start:08X}] "
-    try:
-        dctx = zstd.ZstdDecompressor()
-        if stop_flag():
-            return False, f"{prefix}任务已中断（跳过解压）", None
-
-        decompressed = dctx.decompress(data[frame_start:])
-
-        if stop_flag():
-            return False, f"{prefix}任务已中断（解压完成但未写入文件）", None
-
-        if enable_md5:
-            file_hash = hashlib.md5(decompressed).hexdigest()
-            if file_hash in extracted_hashes:
-                msg = f"{prefix}跳过重复帧 (哈希: {file_hash[:8]})"
-                return False, msg, None
-        else:
-            file_hash = hashlib.md5(decompressed).hexdigest()
-
-        if enable_type_detect:
-            ext = detect_file_extension(decompressed)
-        else:
-            ext = ""
-
-        category = FILE_CATEGORY_MAP.get(ext, "未知文件")
-        category_folder = os.path.join(output_root, category)
-        Path(category_folder).mkdir(parents=True, exist_ok=True)
-        output_filename = f"extracted_frame_{frame_idx + 1}{ext}"
-        output_path = os.path.join(category_folder, output_filename)
-
-        if stop_flag():
-            msg = f"{prefix}任务已中断（未写入文件）"
-        else:
-            with open(output_path, "wb") as f:
-                f.write(decompressed)
-            if enable_md5:
-                extracted_hashes.add(file_hash)
-            size = len(decompressed)
-            size_kb = size / 1024
-            msg = (
-                f"{prefix}成功解压: {output_filename} -> {category} "
-                f"(大小: {size_kb:.2f} KB, 哈希: {file_hash[:8]})"
-            )
-            info = {
-                "name": output_filename,
-                "ext": ext,
-                "category": category,
-                "size": size,
-                "path": output_path,
-            }
-            return True, msg, info
-
-        return False, msg, None
-    except zstd.ZstdError as e:
-        msg = f"{prefix}解压失败: {str(e)}"
-        return False, msg, None
-    except Exception as e:
-        msg = f"{prefix}处理异常: {str(e)}"
-        return False, msg, None
-
-
 # ===================== FlowLayout =====================
 
 class FlowLayout(QtWidgets.QLayout):
@@ -273,6 +201,17 @@ class FlowLayout(QtWidgets.QLayout):
         return y + lineHeight - rect.y()
 
 
+class SortableItem(QtWidgets.QTableWidgetItem):
+    """UserRole 里放了数值的单元格按数值排序，其余按文本"""
+
+    def __lt__(self, other):
+        mine = self.data(QtCore.Qt.UserRole)
+        theirs = other.data(QtCore.Qt.UserRole)
+        if mine is not None and theirs is not None:
+            return mine < theirs
+        return super().__lt__(other)
+
+
 # ===================== Worker =====================
 
 class ExtractWorker(QtCore.QObject):
@@ -283,127 +222,63 @@ class ExtractWorker(QtCore.QObject):
     error_signal = QtCore.pyqtSignal(str)
 
     def __init__(self, input_file: str, output_root: str, fast_mode: bool, max_threads: int,
-                 enable_md5: bool = True, enable_type_detect: bool = True):
+                 enable_md5: bool = True, enable_type_detect: bool = True,
+                 profile_options: dict = None, link_duplicates: bool = False, dict_dir: str = "",
+                 pack_output: bool = False, batch_decompress: bool = True, access_mode: str = "auto",
+                 convert_textures: bool = False, texture_cache: str = ""):
         super().__init__()
-        self.input_file = input_file
-        self.output_root = output_root
-        self.fast_mode = fast_mode
-        self.max_threads = max_threads
-        self.enable_md5 = enable_md5
-        self.enable_type_detect = enable_type_detect
-        self._stop = False
+        self.profiler = None
+        if profile_options and profile_options.get("enabled"):
+            self.profiler = StageProfiler(
+                profile_options.get("cprofile", False), profile_options.get("tracemalloc", False)
+            )
+        self.job = ExtractJob(
+            input_file, output_root, fast_mode, max_threads,
+            enable_md5=enable_md5, enable_type_detect=enable_type_detect,
+            log=lambda name, level, message: self.log_signal.emit(
+                format_gui_log_line(name, level, message)
+            ),
+            progress=self.progress_signal.emit,
+            file=self.file_signal.emit,
+            profiler=self.profiler,
+            link_duplicates=link_duplicates,
+            dict_dir=dict_dir,
+            pack_output=pack_output,
+            batch_decompress=batch_decompress,
+            access_mode=access_mode,
+            convert_textures=convert_textures,
+            texture_cache=texture_cache,
+        )
+        self.stats = self.job.stats
 
     @QtCore.pyqtSlot()
     def run(self):
         try:
-            if not os.path.exists(self.input_file):
-                msg = f"错误：文件不存在 -> {self.input_file}"
-                logger_gui.error(msg)
-                self.error_signal.emit(format_gui_log_line("gui", "ERROR", msg))
-                return
-            if not os.path.exists(self.output_root):
-                os.makedirs(self.output_root, exist_ok=True)
-
-            file_size = os.path.getsize(self.input_file)
-
-            self.log_signal.emit(format_gui_log_line("gui", "INFO", "============================================================"))
-            self.log_signal.emit(format_gui_log_line("gui", "INFO", "开始解包任务..."))
-            self.log_signal.emit(format_gui_log_line("gui", "INFO", f"文件: {self.input_file}"))
-            self.log_signal.emit(format_gui_log_line(
-                "gui", "INFO",
-                f"大小: {file_size} 字节 ({file_size / 1024 / 1024:.2f} MB)"
-            ))
-            self.log_signal.emit(format_gui_log_line("gui", "INFO", "开始解析 Zstd 容器结构..."))
-            self.log_signal.emit(format_gui_log_line("gui", "INFO", "------------------------------------------------------------"))
-            self.log_signal.emit(format_gui_log_line("gui", "INFO", "正在扫描 Zstd 帧位置..."))
-
-            with open(self.input_file, "rb") as f:
-                data = f.read()
-            frame_positions = scan_zstd_frames(data)
-            total_frames = len(frame_positions)
-
-            if self._stop:
-                self.log_signal.emit(format_gui_log_line("gui", "INFO", "解包已停止（扫描阶段后）。"))
-                self.finished_signal.emit(0)
-                return
-
-            self.log_signal.emit(format_gui_log_line("gui", "INFO", f"总共找到 {total_frames} 个 Zstd 帧"))
-            self.log_signal.emit(format_gui_log_line("gui", "INFO", "开始解压..."))
-            self.log_signal.emit(format_gui_log_line("gui", "INFO", "------------------------------------------------------------"))
-
-            if total_frames == 0:
-                self.finished_signal.emit(0)
-                return
-
-            extracted_hashes = set()
-            extracted_count = 0
-            self.progress_signal.emit(0, total_frames)
-
-            stop_flag = lambda: self._stop
-
-            if self.fast_mode:
-                self.log_signal.emit(format_gui_log_line(
-                    "gui", "INFO", f"[快速模式] 使用多线程解压, 线程数={self.max_threads}"
-                ))
-                with ThreadPoolExecutor(max_workers=self.max_threads) as executor:
-                    futures = []
-                    for i, frame_start in enumerate(frame_positions):
-                        if self._stop:
-                            break
-                        futures.append(
-                            executor.submit(
-                                extract_single_frame,
-                                data,
-                                frame_start,
-                                self.output_root,
-                                i,
-                                extracted_hashes,
-                                stop_flag,
-                                self.enable_md5,
-                                self.enable_type_detect,
-                            )
-                        )
-                    for idx, future in enumerate(futures):
-                        if self._stop:
-                            break
-                        ok, msg, info = future.result()
-                        self.log_signal.emit(format_gui_log_line("gui.extract", "INFO", msg))
-                        if ok and info is not None:
-                            extracted_count += 1
-                            self.file_signal.emit(info)
-                        self.progress_signal.emit(idx + 1, total_frames)
-            else:
-                self.log_signal.emit(format_gui_log_line("gui", "INFO", "[正常模式] 串行解压"))
-                for i, frame_start in enumerate(frame_positions):
-                    if self._stop:
-                        break
-                    ok, msg, info = extract_single_frame(
-                        data, frame_start, self.output_root, i,
-                        extracted_hashes, stop_flag,
-                        self.enable_md5, self.enable_type_detect
-                    )
-                    self.log_signal.emit(format_gui_log_line("gui.extract", "INFO", msg))
-                    if ok and info is not None:
-                        extracted_count += 1
-                        self.file_signal.emit(info)
-                    self.progress_signal.emit(i + 1, total_frames)
-
-            if self._stop:
-                self.log_signal.emit(format_gui_log_line("gui", "INFO", "解包已停止。"))
-            else:
-                self.log_signal.emit(format_gui_log_line("gui", "INFO", "------------------------------------------------------------"))
-                self.log_signal.emit(format_gui_log_line(
-                    "gui", "INFO", f"解压完成! 共提取 {extracted_count} 个不重复文件"
-                ))
-            self.finished_signal.emit(extracted_count)
-
+            count = self.job.run()
+            if self.profiler is not None:
+                self.save_profile()
+            self.finished_signal.emit(count)
+        except ExtractError as e:
+            msg = str(e)
+            logger_gui.error(msg)
+            self.error_signal.emit(format_gui_log_line("gui", "ERROR", msg))
         except Exception as e:
             msg = f"解压过程中发生异常: {str(e)}"
             logger_gui.error(msg)
             self.error_signal.emit(format_gui_log_line("gui", "ERROR", msg))
 
+    def save_profile(self):
+        trace_path = default_trace_path(self.job.output_root)
+        try:
+            written = self.profiler.save(trace_path)
+        except Exception as e:
+            self.log_signal.emit(format_gui_log_line("gui", "ERROR", f"性能分析结果保存失败: {e}"))
+            return
+        for path in written:
+            self.log_signal.emit(format_gui_log_line("gui", "INFO", f"性能分析结果: {path}"))
+
     def stop(self):
-        self._stop = True
+        self.job.stop()
 
 
 # ===================== 设置中心 =====================
@@ -534,7 +409,9 @@ class SettingsDialog(QtWidgets.QDialog):
 
         card_threads, threads_layout = self.create_card("线程与模式")
         self.spin_default_threads = QtWidgets.QSpinBox()
-        self.spin_default_threads.setRange(1, 64)
+        # 0 显示为“自动”：按吞吐量自动调整（见 WorkerAutotune）
+        self.spin_default_threads.setRange(AUTO_THREADS, 64)
+        self.spin_default_threads.setSpecialValueText("自动")
         self.spin_default_threads.setValue(8)
         self.chk_default_fast = QtWidgets.QCheckBox("默认启用快速模式 (多线程)")
         threads_layout.addRow("默认线程数:", self.spin_default_threads)
@@ -621,16 +498,59 @@ class SettingsDialog(QtWidgets.QDialog):
         card_adv, adv_layout = self.create_card("高级选项")
         self.chk_enable_md5 = QtWidgets.QCheckBox("启用 MD5 去重")
         self.chk_enable_type_detect = QtWidgets.QCheckBox("启用文件类型自动识别")
+        self.chk_link_duplicates = QtWidgets.QCheckBox("重复帧保留为链接（硬链接 / reflink，几乎不占空间）")
+        self.chk_batch_decompress = QtWidgets.QCheckBox("快速模式下批量解压（zstd C 线程，不占 GIL）")
+        self.chk_batch_decompress.setChecked(True)
+        self.chk_pack_output = QtWidgets.QCheckBox("输出为单个包文件 + 索引（不写大量散文件，可右键导出）")
+        self.chk_convert_textures = QtWidgets.QCheckBox("纹理（DDS / KTX / TGA）另存一份 PNG（多进程转换，按内容缓存）")
         self.chk_enable_crash_log = QtWidgets.QCheckBox("启用崩溃日志（占位）")
         self.chk_enable_md5.setChecked(True)
         self.chk_enable_type_detect.setChecked(True)
+        self.combo_access_mode = QtWidgets.QComboBox()
+        for mode, label in ACCESS_MODE_LABELS.items():
+            self.combo_access_mode.addItem(label, mode)
+        self.edit_dict_dir = QtWidgets.QLineEdit()
+        self.edit_dict_dir.setPlaceholderText("可选：帧头带字典 ID 的帧用这里的字典解压")
+        self.btn_browse_dict_dir = QtWidgets.QPushButton("浏览...")
+        hl = QtWidgets.QHBoxLayout()
+        hl.addWidget(self.edit_dict_dir)
+        hl.addWidget(self.btn_browse_dict_dir)
+        self.edit_texture_cache = QtWidgets.QLineEdit()
+        self.edit_texture_cache.setPlaceholderText(f"默认: {default_texture_cache()}")
+        self.btn_browse_texture_cache = QtWidgets.QPushButton("浏览...")
+        hl_cache = QtWidgets.QHBoxLayout()
+        hl_cache.addWidget(self.edit_texture_cache)
+        hl_cache.addWidget(self.btn_browse_texture_cache)
 
         adv_layout.addRow("", self.chk_enable_md5)
         adv_layout.addRow("", self.chk_enable_type_detect)
+        adv_layout.addRow("", self.chk_link_duplicates)
+        adv_layout.addRow("", self.chk_pack_output)
+        adv_layout.addRow("", self.chk_batch_decompress)
+        adv_layout.addRow("", self.chk_convert_textures)
         adv_layout.addRow("", self.chk_enable_crash_log)
+        adv_layout.addRow("Zstd 字典目录:", hl)
+        adv_layout.addRow("输入读取方式:", self.combo_access_mode)
+        adv_layout.addRow("纹理 PNG 缓存:", hl_cache)
+
+        card_profile, profile_layout = self.create_card("性能分析")
+        self.chk_enable_profile = QtWidgets.QCheckBox("记录每帧各阶段耗时（导出 Chrome Trace 到 输出目录/profile）")
+        self.chk_profile_cprofile = QtWidgets.QCheckBox("同时保存 cProfile 统计")
+        self.chk_profile_tracemalloc = QtWidgets.QCheckBox("同时保存 tracemalloc 内存快照")
+        self.chk_enable_profile.toggled.connect(self.chk_profile_cprofile.setEnabled)
+        self.chk_enable_profile.toggled.connect(self.chk_profile_tracemalloc.setEnabled)
+        self.chk_profile_cprofile.setEnabled(False)
+        self.chk_profile_tracemalloc.setEnabled(False)
+        profile_layout.addRow("", self.chk_enable_profile)
+        profile_layout.addRow("", self.chk_profile_cprofile)
+        profile_layout.addRow("", self.chk_profile_tracemalloc)
 
         layout.addWidget(card_adv)
+        layout.addWidget(card_profile)
         layout.addStretch()
+
+        self.btn_browse_dict_dir.clicked.connect(self.choose_dict_dir)
+        self.btn_browse_texture_cache.clicked.connect(self.choose_texture_cache)
         return page
 
     def choose_default_output_dir(self):
@@ -638,6 +558,16 @@ class SettingsDialog(QtWidgets.QDialog):
         if path:
             self.edit_default_output.setText(path)
 
+    def choose_dict_dir(self):
+        path = QtWidgets.QFileDialog.getExistingDirectory(self, "选择 Zstd 字典目录", "")
+        if path:
+            self.edit_dict_dir.setText(path)
+
+    def choose_texture_cache(self):
+        path = QtWidgets.QFileDialog.getExistingDirectory(self, "选择纹理 PNG 缓存目录", "")
+        if path:
+            self.edit_texture_cache.setText(path)
+
     def choose_log_dir(self):
         path = QtWidgets.QFileDialog.getExistingDirectory(self, "选择日志目录", "")
         if path:
@@ -662,7 +592,17 @@ class SettingsDialog(QtWidgets.QDialog):
         s["remember_theme_font"] = self.chk_remember_theme_font.isChecked()
         s["enable_md5"] = self.chk_enable_md5.isChecked()
         s["enable_type_detect"] = self.chk_enable_type_detect.isChecked()
+        s["link_duplicates"] = self.chk_link_duplicates.isChecked()
+        s["dict_dir"] = self.edit_dict_dir.text().strip()
+        s["pack_output"] = self.chk_pack_output.isChecked()
+        s["batch_decompress"] = self.chk_batch_decompress.isChecked()
+        s["access_mode"] = self.combo_access_mode.currentData()
+        s["convert_textures"] = self.chk_convert_textures.isChecked()
+        s["texture_cache"] = self.edit_texture_cache.text().strip()
         s["enable_crash_log"] = self.chk_enable_crash_log.isChecked()
+        s["enable_profile"] = self.chk_enable_profile.isChecked()
+        s["profile_cprofile"] = self.chk_profile_cprofile.isChecked()
+        s["profile_tracemalloc"] = self.chk_profile_tracemalloc.isChecked()
         return s
 
     def load_from_settings(self, s: dict):
@@ -695,7 +635,19 @@ class SettingsDialog(QtWidgets.QDialog):
 
         self.chk_enable_md5.setChecked(s.get("enable_md5", True))
         self.chk_enable_type_detect.setChecked(s.get("enable_type_detect", True))
+        self.chk_link_duplicates.setChecked(s.get("link_duplicates", False))
+        self.edit_dict_dir.setText(s.get("dict_dir", ""))
+        self.chk_pack_output.setChecked(s.get("pack_output", False))
+        self.chk_batch_decompress.setChecked(s.get("batch_decompress", True))
+        idx_access = self.combo_access_mode.findData(s.get("access_mode", "auto"))
+        if idx_access >= 0:
+            self.combo_access_mode.setCurrentIndex(idx_access)
+        self.chk_convert_textures.setChecked(s.get("convert_textures", False))
+        self.edit_texture_cache.setText(s.get("texture_cache", ""))
         self.chk_enable_crash_log.setChecked(s.get("enable_crash_log", False))
+        self.chk_enable_profile.setChecked(s.get("enable_profile", False))
+        self.chk_profile_cprofile.setChecked(s.get("profile_cprofile", False))
+        self.chk_profile_tracemalloc.setChecked(s.get("profile_tracemalloc", False))
 
     def on_apply(self):
         s = self.collect_settings()
@@ -719,6 +671,12 @@ class MainWindow(QtWidgets.QMainWindow):
         self.all_files = []
         self.worker_thread = None
         self.worker = None
+        self.progress_state = (0, 0)
+        self.last_stats = None
+
+        self.stats_timer = QtCore.QTimer(self)
+        self.stats_timer.setInterval(500)
+        self.stats_timer.timeout.connect(self.refresh_status_panel)
 
         self.settings = QtCore.QSettings("XuanQian", "NeoNpkExtractor")
         self.app_settings = self.load_settings()
@@ -739,6 +697,10 @@ class MainWindow(QtWidgets.QMainWindow):
 
         self.apply_default_params()
 
+        # 非必需的初始化放到窗口显示之后
+        QtCore.QTimer.singleShot(0, self.post_show_init)
+
+    def post_show_init(self):
         if self.app_settings.get("log_to_file", False):
             ok, msg = set_file_logging(True, self.app_settings.get("log_dir", ""))
             if not ok:
@@ -766,7 +728,17 @@ class MainWindow(QtWidgets.QMainWindow):
         s["remember_theme_font"] = v("remember_theme_font", "true") == "true"
         s["enable_md5"] = v("enable_md5", "true") == "true"
         s["enable_type_detect"] = v("enable_type_detect", "true") == "true"
+        s["link_duplicates"] = v("link_duplicates", "false") == "true"
+        s["dict_dir"] = v("dict_dir", "")
+        s["pack_output"] = v("pack_output", "false") == "true"
+        s["batch_decompress"] = v("batch_decompress", "true") == "true"
+        s["access_mode"] = v("access_mode", "auto")
+        s["convert_textures"] = v("convert_textures", "false") == "true"
+        s["texture_cache"] = v("texture_cache", "")
         s["enable_crash_log"] = v("enable_crash_log", "false") == "true"
+        s["enable_profile"] = v("enable_profile", "false") == "true"
+        s["profile_cprofile"] = v("profile_cprofile", "false") == "true"
+        s["profile_tracemalloc"] = v("profile_tracemalloc", "false") == "true"
         s["last_input"] = v("last_input", "")
         s["last_output"] = v("last_output", "")
         return s
@@ -791,7 +763,17 @@ class MainWindow(QtWidgets.QMainWindow):
         w("remember_theme_font", "true" if s.get("remember_theme_font", True) else "false")
         w("enable_md5", "true" if s.get("enable_md5", True) else "false")
         w("enable_type_detect", "true" if s.get("enable_type_detect", True) else "false")
+        w("link_duplicates", "true" if s.get("link_duplicates", False) else "false")
+        w("dict_dir", s.get("dict_dir", ""))
+        w("pack_output", "true" if s.get("pack_output", False) else "false")
+        w("batch_decompress", "true" if s.get("batch_decompress", True) else "false")
+        w("access_mode", s.get("access_mode", "auto"))
+        w("convert_textures", "true" if s.get("convert_textures", False) else "false")
+        w("texture_cache", s.get("texture_cache", ""))
         w("enable_crash_log", "true" if s.get("enable_crash_log", False) else "false")
+        w("enable_profile", "true" if s.get("enable_profile", False) else "false")
+        w("profile_cprofile", "true" if s.get("profile_cprofile", False) else "false")
+        w("profile_tracemalloc", "true" if s.get("profile_tracemalloc", False) else "false")
         w("last_input", s.get("last_input", ""))
         w("last_output", s.get("last_output", ""))
 
@@ -1100,6 +1082,9 @@ class MainWindow(QtWidgets.QMainWindow):
         self.act_open_file = QtWidgets.QAction("打开文件...", self)
         self.act_open_file.triggered.connect(self.browse_input_file)
 
+        self.act_load_manifest = QtWidgets.QAction("从清单加载...", self)
+        self.act_load_manifest.triggered.connect(self.browse_manifest)
+
         self.act_clear_list = QtWidgets.QAction("清空文件列表", self)
         self.act_clear_list.triggered.connect(self.clear_file_list)
 
@@ -1116,6 +1101,7 @@ class MainWindow(QtWidgets.QMainWindow):
         menubar = self.menuBar()
         menu_file = menubar.addMenu("文件")
         menu_file.addAction(self.act_open_file)
+        menu_file.addAction(self.act_load_manifest)
         menu_file.addAction(self.act_clear_list)
         menu_file.addSeparator()
         menu_file.addAction(self.act_exit)
@@ -1153,6 +1139,16 @@ class MainWindow(QtWidgets.QMainWindow):
         self.edit_search = QtWidgets.QLineEdit()
         self.edit_search.setPlaceholderText("按文件名搜索...")
         self.edit_search.textChanged.connect(self.apply_filters)
+        self.edit_attr_filter = QtWidgets.QLineEdit()
+        self.edit_attr_filter.setPlaceholderText("按属性过滤，如: 边长>=2048 时长<5 格式=BC7")
+        self.edit_attr_filter.setToolTip(
+            "空格分隔的条件，全部满足才显示：\n"
+            "宽 / 高 / 边长 / 格式 / mip（图片）\n"
+            "时长 / 声道 / 采样率 / 格式（音频）\n"
+            "顶点 / 面 / 子网格（模型）\n"
+            "运算符: = != > < >= <="
+        )
+        self.edit_attr_filter.textChanged.connect(self.apply_filters)
 
         tag_layout = FlowLayout(spacing=6)
 
@@ -1195,6 +1191,7 @@ class MainWindow(QtWidgets.QMainWindow):
             tag_layout.addWidget(btn)
 
         filter_layout.addWidget(self.edit_search)
+        filter_layout.addWidget(self.edit_attr_filter)
         filter_layout.addLayout(tag_layout)
 
         group_input = QtWidgets.QGroupBox("输入 / 输出")
@@ -1220,7 +1217,8 @@ class MainWindow(QtWidgets.QMainWindow):
         opt_layout = QtWidgets.QGridLayout(group_options)
         self.chk_fast_mode = QtWidgets.QCheckBox("快速模式 (多线程)")
         self.spin_threads = QtWidgets.QSpinBox()
-        self.spin_threads.setRange(1, 64)
+        self.spin_threads.setRange(AUTO_THREADS, 64)
+        self.spin_threads.setSpecialValueText("自动")
         opt_layout.addWidget(self.chk_fast_mode, 0, 0, 1, 2)
         opt_layout.addWidget(QtWidgets.QLabel("线程数:"), 1, 0)
         opt_layout.addWidget(self.spin_threads, 1, 1)
@@ -1245,7 +1243,30 @@ class MainWindow(QtWidgets.QMainWindow):
         left_layout.addWidget(group_filter)
         left_layout.addWidget(group_input)
         left_layout.addWidget(group_options)
+        group_status = QtWidgets.QGroupBox("运行状态")
+        status_layout = QtWidgets.QGridLayout(group_status)
+        status_layout.setHorizontalSpacing(12)
+        self.status_labels = {}
+        status_fields = [
+            ("input_rate", "输入:"),
+            ("output_rate", "输出:"),
+            ("frame_rate", "帧速:"),
+            ("eta", "剩余:"),
+            ("dup_rate", "去重命中:"),
+            ("fail_rate", "失败率:"),
+        ]
+        for i, (key, title) in enumerate(status_fields):
+            lbl = QtWidgets.QLabel("-")
+            self.status_labels[key] = lbl
+            status_layout.addWidget(QtWidgets.QLabel(title), i // 2, (i % 2) * 2)
+            status_layout.addWidget(lbl, i // 2, (i % 2) * 2 + 1)
+        self.label_stage_times = QtWidgets.QLabel("-")
+        self.label_stage_times.setWordWrap(True)
+        status_layout.addWidget(QtWidgets.QLabel("阶段耗时:"), 3, 0, 1, 4)
+        status_layout.addWidget(self.label_stage_times, 4, 0, 1, 4)
+
         left_layout.addWidget(group_run)
+        left_layout.addWidget(group_status)
         left_layout.addStretch()
 
         right_panel = QtWidgets.QWidget()
@@ -1257,11 +1278,11 @@ class MainWindow(QtWidgets.QMainWindow):
         group_files = QtWidgets.QGroupBox("已提取文件")
         files_layout = QtWidgets.QVBoxLayout(group_files)
         self.table_files = QtWidgets.QTableWidget()
-        self.table_files.setColumnCount(5)
-        self.table_files.setHorizontalHeaderLabels(
-            ["文件名", "扩展名", "类别", "大小", "路径"]
-        )
+        self.table_files.setColumnCount(len(FILE_COLUMNS))
+        self.table_files.setHorizontalHeaderLabels(list(FILE_COLUMNS))
         self.table_files.horizontalHeader().setStretchLastSection(True)
+        # 不排序时保持提取顺序；点表头后按该列排序
+        self.table_files.horizontalHeader().setSortIndicator(-1, QtCore.Qt.AscendingOrder)
         self.table_files.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
         self.table_files.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
         self.table_files.setAlternatingRowColors(False)
@@ -1323,8 +1344,61 @@ class MainWindow(QtWidgets.QMainWindow):
         self.all_files.append(info)
         self.apply_filters()
 
+    def browse_manifest(self):
+        start_dir = ""
+        output_root = self.edit_output.text().strip()
+        if output_root and os.path.isdir(os.path.join(output_root, MANIFEST_DIR_NAME)):
+            start_dir = os.path.join(output_root, MANIFEST_DIR_NAME)
+        path, _ = QtWidgets.QFileDialog.getOpenFileName(
+            self,
+            "选择提取清单",
+            start_dir,
+            "提取清单 (*.jsonl *.csv);;所有文件 (*)",
+        )
+        if path:
+            self.load_manifest(path)
+
+    def load_manifest(self, path: str):
+        """读取以前某次解包的清单，直接恢复文件列表，无需重新解包"""
+        try:
+            infos = []
+            for row in read_manifest(path):
+                if row.get("status") != STATUS_EXTRACTED:
+                    continue
+                info = row_to_file_info(row)
+                info["category"] = MANIFEST_CATEGORY_ALIASES.get(info["category"], info["category"])
+                infos.append(info)
+        except (OSError, ValueError) as e:
+            QtWidgets.QMessageBox.critical(self, "错误", f"清单读取失败:\n{path}\n{e}")
+            return
+        # 属性在同目录的索引里（NpkUnlock 解包时写入）；没有索引的旧输出只是没有属性
+        index_path = os.path.join(os.path.dirname(os.path.abspath(path)), METADATA_DB_NAME)
+        if os.path.exists(index_path):
+            try:
+                with MetadataIndex(index_path) as index:
+                    metas = index.lookup(info["path"] for info in infos)
+            except Exception as e:
+                self.append_log(format_gui_log_line("gui", "WARNING", f"属性索引读取失败: {index_path} ({e})"))
+            else:
+                for info in infos:
+                    if info["path"] in metas:
+                        info["meta"] = metas[info["path"]]
+        self.all_files = infos
+        self.apply_filters()
+        msg = f"已从清单加载 {len(infos)} 个文件: {path}"
+        self.append_log(format_gui_log_line("gui", "INFO", msg))
+
     def apply_filters(self):
         search_text = self.edit_search.text().strip().lower()
+        try:
+            attr_terms = parse_filter(self.edit_attr_filter.text())
+            self.edit_attr_filter.setStyleSheet("")
+            self.edit_attr_filter.setStatusTip("")
+        except ValueError as e:
+            # 条件还没输完整时不过滤，只把输入框标红
+            attr_terms = []
+            self.edit_attr_filter.setStyleSheet("QLineEdit { border: 1px solid #C0392B; }")
+            self.edit_attr_filter.setStatusTip(str(e))
 
         enabled_categories = set()
         if self.btn_filter_audio.isChecked():
@@ -1340,6 +1414,8 @@ class MainWindow(QtWidgets.QMainWindow):
         if self.btn_filter_unknown.isChecked():
             enabled_categories.add("未知文件")
 
+        # 填充期间关掉排序，否则每插入一个单元格都会重排
+        self.table_files.setSortingEnabled(False)
         self.table_files.setRowCount(0)
         dark = self.app_settings.get("theme", "dark") == "dark"
         fg_color = "#DDDDDD" if dark else "#000000"
@@ -1351,12 +1427,17 @@ class MainWindow(QtWidgets.QMainWindow):
                 continue
             if search_text and search_text not in name.lower():
                 continue
+            meta = info.get("meta") or {}
+            if attr_terms and not match_filter(meta, attr_terms):
+                continue
             row = self.table_files.rowCount()
             self.table_files.insertRow(row)
 
-            def _item(text):
-                it = QtWidgets.QTableWidgetItem(str(text))
+            def _item(text, sort_value=None):
+                it = SortableItem(str(text))
                 it.setForeground(QtGui.QBrush(QtGui.QColor(fg_color)))
+                if sort_value is not None:
+                    it.setData(QtCore.Qt.UserRole, sort_value)
                 return it
 
             size_val = info.get("size", 0)
@@ -1367,16 +1448,18 @@ class MainWindow(QtWidgets.QMainWindow):
             self.table_files.setItem(row, 0, _item(name))
             self.table_files.setItem(row, 1, _item(info.get("ext", "")))
             self.table_files.setItem(row, 2, _item(category_display))
-            self.table_files.setItem(row, 3, _item(size_text))
-            self.table_files.setItem(row, 4, _item(info.get("path", "")))
+            self.table_files.setItem(row, 3, _item(size_text, size_val))
+            self.table_files.setItem(row, 4, _item(describe(meta), sort_key(meta)))
+            self.table_files.setItem(row, PATH_COLUMN, _item(info.get("path", "")))
 
+        self.table_files.setSortingEnabled(True)
         self.table_files.resizeColumnsToContents()
 
     def get_selected_file_paths(self):
         rows = sorted(set(idx.row() for idx in self.table_files.selectedIndexes()))
         paths = []
         for r in rows:
-            item = self.table_files.item(r, 4)
+            item = self.table_files.item(r, PATH_COLUMN)
             if item:
                 p = item.text()
                 if p:
@@ -1392,7 +1475,9 @@ class MainWindow(QtWidgets.QMainWindow):
         act_open_file = QtWidgets.QAction("打开文件", self)
         act_open_dir = QtWidgets.QAction("打开所在目录", self)
         act_extract_to = QtWidgets.QAction("提取文件到...", self)
+        act_export_pack = QtWidgets.QAction("导出为散文件（保留分类文件夹）...", self)
         act_copy_path = QtWidgets.QAction("复制路径", self)
+        pack_paths = [p for p in paths if is_pack_path(p)]
 
         if len(paths) > 1:
             act_open_file.setEnabled(False)
@@ -1400,18 +1485,32 @@ class MainWindow(QtWidgets.QMainWindow):
         act_open_file.triggered.connect(lambda: self.context_open_file(paths[0]) if paths else None)
         act_open_dir.triggered.connect(lambda: self.context_open_dir(paths))
         act_extract_to.triggered.connect(lambda: self.context_extract_files(paths))
+        act_export_pack.triggered.connect(lambda: self.context_export_pack(pack_paths))
         act_copy_path.triggered.connect(lambda: self.context_copy_paths(paths))
 
         menu.addAction(act_open_file)
         menu.addAction(act_open_dir)
         menu.addSeparator()
         menu.addAction(act_extract_to)
+        if pack_paths:
+            menu.addAction(act_export_pack)
         menu.addSeparator()
         menu.addAction(act_copy_path)
 
         menu.exec_(self.table_files.viewport().mapToGlobal(pos))
 
     def context_open_file(self, path: str):
+        if is_pack_path(path):
+            # 包内文件先导出到临时目录再打开
+            try:
+                written = export_pack_paths([path], tempfile.mkdtemp(prefix="neonpk_pack_"), keep_folders=False)
+            except (OSError, ValueError) as e:
+                written = []
+                logger_gui.error(f"从包中导出失败: {path}, 错误: {e}")
+            if not written:
+                QtWidgets.QMessageBox.warning(self, "提示", f"包内文件不存在:\n{path}")
+                return
+            path = written[0]
         if not os.path.exists(path):
             QtWidgets.QMessageBox.warning(self, "提示", f"文件不存在:\n{path}")
             return
@@ -1425,6 +1524,8 @@ class MainWindow(QtWidgets.QMainWindow):
     def context_open_dir(self, paths):
         opened = set()
         for p in paths:
+            if is_pack_path(p):
+                p = split_pack_path(p)[0]
             if not os.path.exists(p):
                 continue
             folder = os.path.dirname(p)
@@ -1443,8 +1544,14 @@ class MainWindow(QtWidgets.QMainWindow):
         target_dir = QtWidgets.QFileDialog.getExistingDirectory(self, "选择提取目标目录", "")
         if not target_dir:
             return
+        pack_paths = [p for p in paths if is_pack_path(p)]
+        if pack_paths:
+            try:
+                export_pack_paths(pack_paths, target_dir, keep_folders=False)
+            except Exception as e:
+                logger_gui.error(f"从包中导出失败: -> {target_dir}, 错误: {e}")
         for p in paths:
-            if not os.path.exists(p):
+            if is_pack_path(p) or not os.path.exists(p):
                 continue
             try:
                 shutil.copy2(p, target_dir)
@@ -1452,6 +1559,18 @@ class MainWindow(QtWidgets.QMainWindow):
                 logger_gui.error(f"复制文件失败: {p} -> {target_dir}, 错误: {e}")
         QtWidgets.QMessageBox.information(self, "完成", f"已提取 {len(paths)} 个文件到:\n{target_dir}")
 
+    def context_export_pack(self, paths):
+        target_dir = QtWidgets.QFileDialog.getExistingDirectory(self, "选择导出目录", "")
+        if not target_dir:
+            return
+        try:
+            written = export_pack_paths(paths, target_dir)
+        except Exception as e:
+            logger_gui.error(f"从包中导出失败: -> {target_dir}, 错误: {e}")
+            QtWidgets.QMessageBox.warning(self, "错误", f"导出失败:\n{e}")
+            return
+        QtWidgets.QMessageBox.information(self, "完成", f"已导出 {len(written)} 个文件到:\n{target_dir}")
+
     def context_copy_paths(self, paths):
         cb = QtWidgets.QApplication.clipboard()
         cb.setText("\n".join(paths))
@@ -1460,10 +1579,12 @@ class MainWindow(QtWidgets.QMainWindow):
         row = self.table_files.currentRow()
         if row < 0:
             return
-        path_item = self.table_files.item(row, 4)
+        path_item = self.table_files.item(row, PATH_COLUMN)
         if not path_item:
             return
         path = path_item.text()
+        if is_pack_path(path):
+            path = split_pack_path(path)[0]
         if not os.path.exists(path):
             QtWidgets.QMessageBox.warning(self, "提示", f"文件不存在:\n{path}")
             return
@@ -1524,16 +1645,31 @@ class MainWindow(QtWidgets.QMainWindow):
             self.app_settings["last_output"] = output_root
 
         self.progress_bar.setValue(0)
+        self.progress_state = (0, 0)
+        self.last_stats = None
         self.btn_start.setEnabled(False)
         self.btn_stop.setEnabled(True)
 
         enable_md5 = self.app_settings.get("enable_md5", True)
         enable_type_detect = self.app_settings.get("enable_type_detect", True)
+        profile_options = {
+            "enabled": self.app_settings.get("enable_profile", False),
+            "cprofile": self.app_settings.get("profile_cprofile", False),
+            "tracemalloc": self.app_settings.get("profile_tracemalloc", False),
+        }
 
         self.worker_thread = QtCore.QThread()
         self.worker = ExtractWorker(
             input_file, output_root, fast_mode, max_threads,
-            enable_md5=enable_md5, enable_type_detect=enable_type_detect
+            enable_md5=enable_md5, enable_type_detect=enable_type_detect,
+            profile_options=profile_options,
+            link_duplicates=self.app_settings.get("link_duplicates", False),
+            dict_dir=self.app_settings.get("dict_dir", ""),
+            pack_output=self.app_settings.get("pack_output", False),
+            batch_decompress=self.app_settings.get("batch_decompress", True),
+            access_mode=self.app_settings.get("access_mode", "auto"),
+            convert_textures=self.app_settings.get("convert_textures", False),
+            texture_cache=self.app_settings.get("texture_cache", ""),
         )
         self.worker.moveToThread(self.worker_thread)
 
@@ -1547,6 +1683,7 @@ class MainWindow(QtWidgets.QMainWindow):
         self.worker.error_signal.connect(self.worker_thread.quit)
         self.worker_thread.finished.connect(self.on_thread_finished)
         self.worker_thread.start()
+        self.stats_timer.start()
 
     def stop_extract(self):
         if self.worker is not None:
@@ -1558,6 +1695,8 @@ class MainWindow(QtWidgets.QMainWindow):
     def on_thread_finished(self):
         if self.worker_thread is not None:
             self.worker_thread.wait()
+        self.stats_timer.stop()
+        self.refresh_status_panel()
         self.worker = None
         self.worker_thread = None
         self.btn_start.setEnabled(True)
@@ -1575,6 +1714,51 @@ class MainWindow(QtWidgets.QMainWindow):
             return
         value = int(current * 100 / total)
         self.progress_bar.setValue(value)
+        self.progress_state = (current, total)
+
+    @QtCore.pyqtSlot()
+    def refresh_status_panel(self):
+        if self.worker is None:
+            return
+        snap = self.worker.stats.snapshot()
+        prev = self.last_stats
+        self.last_stats = snap
+
+        # 速率按两次刷新之间的增量计算，首次刷新时用整体平均
+        if prev is not None and snap["elapsed"] > prev["elapsed"]:
+            dt = snap["elapsed"] - prev["elapsed"]
+            delta = {k: snap[k] - prev[k] for k in STAT_COUNTERS}
+        else:
+            dt = snap["elapsed"]
+            delta = {k: snap[k] for k in STAT_COUNTERS}
+        dt = max(dt, 1e-6)
+        mb = 1024 * 1024
+        self.status_labels["input_rate"].setText(f"{delta['bytes_in'] / mb / dt:.1f} MB/s")
+        self.status_labels["output_rate"].setText(f"{delta['bytes_out'] / mb / dt:.1f} MB/s")
+        self.status_labels["frame_rate"].setText(f"{delta['frames'] / dt:.0f} 帧/s")
+
+        frames = snap["frames"]
+        if frames > 0:
+            self.status_labels["dup_rate"].setText(f"{snap['duplicates'] * 100 / frames:.1f}%")
+            self.status_labels["fail_rate"].setText(f"{snap['failed'] * 100 / frames:.1f}%")
+
+        current, total = self.progress_state
+        if 0 < current < total:
+            remaining = snap["elapsed"] * (total - current) / current
+            self.status_labels["eta"].setText(f"{int(remaining) // 60}:{int(remaining) % 60:02d}")
+        elif total > 0 and current >= total:
+            self.status_labels["eta"].setText("0:00")
+
+        # 阶段耗时为各线程累加值；读取/写入占大头说明受磁盘限制，否则受 CPU 限制
+        stage_total = sum(snap[k] for k in STAGE_NAMES)
+        if stage_total > 0:
+            parts = [
+                f"{STAGE_LABELS[k]} {snap[k]:.1f}s ({snap[k] * 100 / stage_total:.0f}%)"
+                for k in STAGE_NAMES
+            ]
+            io_share = (snap["read"] + snap["mkdir"] + snap["write"]) / stage_total
+            bound = "磁盘" if io_share >= 0.5 else "CPU"
+            self.label_stage_times.setText("  ".join(parts) + f"\n瓶颈: {bound}")
 
     @QtCore.pyqtSlot(int)
     def extract_finished(self, count: int):
@@ -1722,6 +1906,162 @@ class CrashWindow(QtWidgets.QDialog):
         cb.setText(self.text.toPlainText())
 
 
+# ===================== 启动耗时探针 =====================
+
+def install_startup_probe(app):
+    if not os.environ.get(STARTUP_PROBE_ENV):
+        return
+
+    def report():
+        print(f"STARTUP_READY {time.perf_counter():.6f}", flush=True)
+        app.quit()
+
+    QtCore.QTimer.singleShot(0, report)
+
+
+# ===================== 单进程入口（默认：进程内崩溃捕获） =====================
+
+class MainThreadWatchdog(threading.Thread):
+    """主线程通过 QTimer 定时 beat()；超时未 beat 就把所有线程堆栈写入崩溃日志"""
+
+    def __init__(self, crash_file, timeout: float = WATCHDOG_TIMEOUT):
+        super().__init__(name="neonpk-watchdog", daemon=True)
+        self.crash_file = crash_file
+        self.timeout = timeout
+        self.last_beat = time.monotonic()
+        self._stop_event = threading.Event()
+
+    def beat(self):
+        self.last_beat = time.monotonic()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        dumped = False
+        while not self._stop_event.wait(1.0):
+            stalled = time.monotonic() - self.last_beat
+            if stalled < self.timeout:
+                dumped = False
+                continue
+            if dumped:
+                continue
+            dumped = True
+            try:
+                self.crash_file.write(f"\n主线程已 {stalled:.0f} 秒无响应，各线程堆栈如下：\n")
+                self.crash_file.flush()
+                faulthandler.dump_traceback(self.crash_file, all_threads=True)
+            except Exception:
+                pass
+
+
+def pid_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    if os.name == "nt":
+        # Windows 上 os.kill 会直接结束进程，只能查询退出码
+        import ctypes
+        kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        handle = kernel32.OpenProcess(0x1000, False, pid)   # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return ctypes.get_last_error() == 5             # ERROR_ACCESS_DENIED：进程存在但无权查询
+        code = ctypes.c_ulong()
+        ok = kernel32.GetExitCodeProcess(handle, ctypes.byref(code))
+        kernel32.CloseHandle(handle)
+        return bool(ok) and code.value == 259               # STILL_ACTIVE
+    try:
+        os.kill(pid, 0)
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+
+def read_previous_crash(folder: str) -> str:
+    """
+    收集已退出进程留下的崩溃日志（正常退出的进程会删掉自己的日志），读完即删。
+    先改名再读，多个实例同时启动时同一份日志只会被其中一个接手；仍在运行的实例的日志不碰。
+    """
+    texts = []
+    try:
+        names = sorted(os.listdir(folder))
+    except OSError:
+        return ""
+    for name in names:
+        if not (name.startswith(CRASH_LOG_PREFIX) and name.endswith(".log")):
+            continue
+        pid = name[len(CRASH_LOG_PREFIX):-len(".log")]
+        if not pid.isdigit() or pid_alive(int(pid)):
+            continue
+        path = os.path.join(folder, name)
+        claimed = f"{path}.{os.getpid()}.read"
+        try:
+            os.rename(path, claimed)
+        except OSError:
+            continue
+        try:
+            with open(claimed, "r", encoding="utf-8", errors="replace") as f:
+                text = f.read().strip()
+            os.remove(claimed)
+        except OSError:
+            continue
+        if text:
+            texts.append(f"[进程 {pid}]\n{text}")
+    return "\n\n".join(texts)
+
+
+def run_main_inprocess():
+    # 之前的进程如果异常退出，崩溃日志不会被删除，这次启动后展示出来
+    previous_crash = read_previous_crash(os.path.dirname(CRASH_LOG_PATH))
+    crash_file = open(CRASH_LOG_PATH, "w", encoding="utf-8")
+    faulthandler.enable(crash_file, all_threads=True)
+
+    QtCore.QCoreApplication.setAttribute(QtCore.Qt.AA_EnableHighDpiScaling)
+    app = QtWidgets.QApplication(sys.argv)
+    win = MainWindow()
+    win.show()
+
+    watchdog = MainThreadWatchdog(crash_file)
+    heartbeat = QtCore.QTimer()
+    heartbeat.setInterval(1000)
+    heartbeat.timeout.connect(watchdog.beat)
+    heartbeat.start()
+    watchdog.start()
+
+    def exception_hook(exctype, value, tb):
+        logger_gui.error("未捕获异常", exc_info=(exctype, value, tb))
+        text = "".join(traceback.format_exception(exctype, value, tb))
+        try:
+            crash_file.write(text)
+            crash_file.flush()
+        except Exception:
+            pass
+        log_tail = "\n".join(recent_log_handler.lines)
+        CrashWindow(log_tail, win).exec_()
+
+    sys.excepthook = exception_hook
+
+    if previous_crash:
+        QtCore.QTimer.singleShot(
+            0, lambda: CrashWindow(previous_crash[-64 * 1024:], win).exec_()
+        )
+
+    install_startup_probe(app)
+    rc = app.exec_()
+
+    watchdog.stop()
+    heartbeat.stop()
+    faulthandler.disable()
+    crash_file.close()
+    # 正常退出：删除本进程的崩溃日志，下次启动不再弹窗
+    try:
+        os.remove(CRASH_LOG_PATH)
+    except OSError:
+        pass
+    sys.exit(rc)
+
+
 # ===================== 子进程入口 =====================
 
 def run_main_child():
@@ -1735,12 +2075,15 @@ def run_main_child():
     app = QtWidgets.QApplication(sys.argv)
     win = MainWindow()
     win.show()
+    install_startup_probe(app)
     sys.exit(app.exec_())
 
 
-# ===================== 父进程入口（监控 + 崩溃报告） =====================
+# ===================== 父进程入口（监控 + 崩溃报告，需 --launcher） =====================
 
 def run_launcher_parent():
+    import subprocess
+
     base_dir = os.path.dirname(os.path.abspath(__file__))
     python_exe = sys.executable
     cmd = [python_exe, os.path.abspath(__file__), CHILD_ARG]
@@ -1754,7 +2097,7 @@ def run_launcher_parent():
         universal_newlines=True,
     )
 
-    lines = []
+    lines = deque(maxlen=800)
 
     def reader():
         try:
@@ -1762,8 +2105,6 @@ def run_launcher_parent():
                 line = line.rstrip("\n")
                 print(line)
                 lines.append(line)
-                if len(lines) > 800:
-                    lines[:] = lines[-800:]
         except Exception:
             pass
 
@@ -1776,8 +2117,7 @@ def run_launcher_parent():
     if rc == 0:
         return
 
-    tail_count = 200
-    tail_lines = lines[-tail_count:]
+    tail_lines = list(lines)[-CRASH_TAIL_LINES:]
     log_tail = "\n".join(tail_lines)
 
     QtCore.QCoreApplication.setAttribute(QtCore.Qt.AA_EnableHighDpiScaling)
@@ -1789,7 +2129,11 @@ def run_launcher_parent():
 # ===================== 启动入口 =====================
 
 if __name__ == "__main__":
+    # 纹理转换用进程池，打包成 exe 后子进程要从这里分流出去
+    multiprocessing.freeze_support()
     if CHILD_ARG in sys.argv:
         run_main_child()
-    else:
+    elif LAUNCHER_ARG in sys.argv:
         run_launcher_parent()
+    else:
+        run_main_inprocess()
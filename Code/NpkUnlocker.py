@@ -1,12 +1,22 @@
 import os
+import sys
 import zstandard as zstd
 import hashlib
 from pathlib import Path
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
+from ExtractJournal import ExtractJournal
+from ExtractManifest import (
+    STATUS_DUPLICATE, STATUS_EXTRACTED, STATUS_FAILED,
+    DuplicateIndex, ManifestWriter, default_manifest_path, make_row,
+)
+from StageProfiler import SpanClock, StageProfiler
+from WorkerAutotune import AUTO, WorkerAutotuner, parse_threads
+from ZstdFrames import DICTIONARIES, decompress_frame
+
 # ====================== 提速开关（仅改这里控制速度，不影响输出） ======================
 FAST_MODE = True  # True=多线程提速，False=恢复原串行逻辑
-MAX_THREADS = 8   # 线程数（建议设为CPU核心数：8/16/32）
+MAX_THREADS = 8   # 线程数（建议设为CPU核心数：8/16/32）；AUTO(0)=按吞吐量自动调整（--threads auto）
 
 # ====================== 分类映射：保留所有分类（含TGA/DDS） ======================
 FILE_CATEGORY_MAP = {
@@ -73,44 +83,76 @@ def detect_file_extension(data):
     # 未知类型
     return ""
 
-# ====================== 原单帧解压逻辑（无修改） ======================
-def extract_single_frame(data, frame_start, output_root, frame_idx, extracted_hashes):
+# ====================== 原单帧解压逻辑（journal 用于断点续传，manifest 为提取清单） ======================
+def extract_single_frame(data, frame_start, output_root, frame_idx, extracted_hashes, journal=None, profiler=None,
+                         manifest=None, container=""):
+    clock = SpanClock(profiler, frame_idx)
+    
+    def record(row, path="", **fields):
+        if journal is not None:
+            journal.record(frame_start, path, row=row, **fields)
+        if manifest is not None:
+            manifest.write(row)
+    
     try:
-        # 解压Zstd帧
-        dctx = zstd.ZstdDecompressor()
-        decompressed = dctx.decompress(data[frame_start:])
+        # 解压Zstd帧（按线程复用解压上下文，只取这一帧的数据）
+        decompressed, _ = decompress_frame(data, frame_start)
+        clock.lap("decompress")
         
         # MD5去重
         file_hash = hashlib.md5(decompressed).hexdigest()
-        if file_hash in extracted_hashes:
-            print(f"跳过重复帧 {frame_idx+1} (哈希: {file_hash[:8]})")
-            return False
+        clock.lap("hash")
         
         # 检测类型+分类
         ext = detect_file_extension(decompressed)
+        clock.lap("detect")
         category = FILE_CATEGORY_MAP.get(ext, "未知文件")
         category_folder = os.path.join(output_root, category)
-        Path(category_folder).mkdir(parents=True, exist_ok=True)
-        
-        # 生成文件名并写入
         output_filename = f"extracted_frame_{frame_idx+1}{ext}"
         output_path = os.path.join(category_folder, output_filename)
-        with open(output_path, 'wb') as f:
-            f.write(decompressed)
         
-        extracted_hashes.add(file_hash)
+        # 检查+占位在同一把锁里完成，多线程下相同内容只写一份
+        first_path = extracted_hashes.claim(file_hash, output_path)
+        if first_path is not None:
+            print(f"跳过重复帧 {frame_idx+1} (哈希: {file_hash[:8]})")
+            record(make_row(container, frame_idx, frame_start, STATUS_DUPLICATE, size=len(decompressed),
+                            file_hash=file_hash, duplicate_of=first_path))
+            return False
+        
+        # 生成文件名并写入
+        try:
+            Path(category_folder).mkdir(parents=True, exist_ok=True)
+            clock.lap("mkdir")
+            with open(output_path, 'wb') as f:
+                f.write(decompressed)
+        except BaseException:
+            extracted_hashes.release(file_hash)
+            raise
+        clock.lap("write")
+        
+        record(
+            make_row(container, frame_idx, frame_start, STATUS_EXTRACTED, size=len(decompressed),
+                     file_hash=file_hash, ext=ext, category=category, path=output_path),
+            output_path, size=len(decompressed), hash=file_hash,
+        )
         print(f"成功解压: {output_filename} -> {category} (大小: {len(decompressed)/1024:.2f} KB)")
         return True
     
     except zstd.ZstdError as e:
+        clock.lap("decompress")
         print(f"帧 {frame_idx+1} 解压失败: {str(e)}")
+        record(make_row(container, frame_idx, frame_start, STATUS_FAILED))
         return False
     except Exception as e:
         print(f"帧 {frame_idx+1} 处理异常: {str(e)}")
         return False
 
 # ====================== 主解压逻辑（仅优化速度，输出100%保留） ======================
-def extract_zstd_container(pkg_file_path, output_folder):
+def extract_zstd_container(pkg_file_path, output_folder, profiler=None, manifest_path=None, dict_dir="",
+                           threads=None):
+    # threads 为 None 时按调用时的 MAX_THREADS（运行中改过的配置也生效）
+    if threads is None:
+        threads = MAX_THREADS
     # 创建输出目录
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
@@ -128,8 +170,17 @@ def extract_zstd_container(pkg_file_path, output_folder):
     ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
     
     # 一次性读入文件（减少IO）
+    clock = SpanClock(profiler)
     with open(pkg_file_path, 'rb') as f:
         data = f.read()
+    clock.lap("read")
+    
+    # Zstd 字典：字典目录 + 容器里夹带的字典（帧头带字典 ID 的帧需要）
+    if dict_dir:
+        print(f"从字典目录加载了 {DICTIONARIES.load_dir(dict_dir)} 个Zstd字典")
+    harvested = DICTIONARIES.harvest(data, pkg_file_path)
+    if harvested:
+        print(f"从容器中收集到 {harvested} 个Zstd字典")
     
     # 批量搜索帧位置（比逐字节快1000倍，输出文案不变）
     pos = 0
@@ -139,43 +190,92 @@ def extract_zstd_container(pkg_file_path, output_folder):
             break
         frame_positions.append(pos)
         pos += len(ZSTD_MAGIC)
+    clock.lap("scan")
     
     # 原格式输出帧数量
     print(f"总共找到 {len(frame_positions)} 个Zstd帧")
     print("开始提取...")
     print("-" * 50)
     
-    extracted_hashes = set()
+    extracted_hashes = DuplicateIndex()
     extracted_count = 0
     
+    # 提取清单：默认 输出目录/manifest/<容器名>.manifest.jsonl，传空字符串则不写
+    if manifest_path is None:
+        manifest_path = default_manifest_path(output_folder, pkg_file_path)
+    manifest = ManifestWriter(manifest_path) if manifest_path else None
+    
+    # 断点续传：日志里已完成且输出仍完好的帧直接跳过
+    journal = ExtractJournal(output_folder, pkg_file_path)
+    done = journal.completed()
+    for rec in done.values():
+        if manifest is not None and rec.get("row"):
+            manifest.write(rec["row"])
+        if rec.get("path"):
+            extracted_hashes.add(rec["hash"], rec["path"])
+            extracted_count += 1
+    if done:
+        remaining = [i for i, p in enumerate(frame_positions) if p not in done]
+        if remaining:
+            print(f"断点续传：已完成 {len(done)} 帧，从第 {remaining[0]+1} 帧继续")
+    
     # 分支：极速模式/原串行模式（输出完全一致）
     if FAST_MODE and len(frame_positions) > 0:
         # 多线程处理（仅提速，输出和串行完全一样）
         def thread_task(frame_idx, frame_start):
             print(f"正在处理第 {frame_idx+1}/{len(frame_positions)} 个Zstd帧 @ {frame_start:08X}: ", end='')
-            return extract_single_frame(data, frame_start, output_folder, frame_idx, extracted_hashes)
+            if profiler is not None:
+                return profiler.run_profiled(
+                    extract_single_frame, data, frame_start, output_folder, frame_idx,
+                    extracted_hashes, journal, profiler, manifest, pkg_file_path)
+            return extract_single_frame(data, frame_start, output_folder, frame_idx, extracted_hashes, journal,
+                                        manifest=manifest, container=pkg_file_path)
         
-        # 提交线程任务
-        with ThreadPoolExecutor(max_workers=MAX_THREADS) as executor:
+        # 提交线程任务；自动模式下线程池按上限建，由 tuner 控制同时运行的数量
+        tuner = None
+        submit_task = thread_task
+        if threads == AUTO:
+            tuner = WorkerAutotuner(log=print)
+            submit_task = lambda *args: tuner.run(thread_task, *args)
+        with ThreadPoolExecutor(max_workers=tuner.max_workers if tuner else threads) as executor:
             futures = []
             for i, frame_start in enumerate(frame_positions):
-                futures.append(executor.submit(thread_task, i, frame_start))
+                if frame_start in done:
+                    continue
+                futures.append(executor.submit(submit_task, i, frame_start))
             
             # 收集结果（保持原输出顺序）
             for future in futures:
                 if future.result():
                     extracted_count += 1
+        if tuner is not None:
+            print(tuner.summary())
     else:
         # 原串行逻辑（100%保留）
         for i, frame_start in enumerate(frame_positions):
+            if frame_start in done:
+                continue
             print(f"正在处理第 {i+1}/{len(frame_positions)} 个Zstd帧 @ {frame_start:08X}: ", end='')
-            result = extract_single_frame(data, frame_start, output_folder, i, extracted_hashes)
+            if profiler is not None:
+                result = profiler.run_profiled(
+                    extract_single_frame, data, frame_start, output_folder, i,
+                    extracted_hashes, journal, profiler, manifest, pkg_file_path)
+            else:
+                result = extract_single_frame(data, frame_start, output_folder, i, extracted_hashes, journal,
+                                              manifest=manifest, container=pkg_file_path)
             if result:
                 extracted_count += 1
     
+    # 全部帧处理完才删除日志；中途崩溃则保留，下次续传
+    journal.finish()
+    if manifest is not None:
+        manifest.close()
+    
     # 原格式输出最终统计
     print("-" * 50)
     print(f"提取完成! 共提取 {extracted_count} 个不重复文件")
+    if manifest is not None:
+        print(f"提取清单: {manifest_path}")
     return extracted_count
 
 # ====================== 原调用逻辑（仅改路径） ======================
@@ -185,7 +285,33 @@ if __name__ == "__main__":
     OUTPUT_ROOT = r"D:\\NpkUnlocker\\Output"       # 输出目录（分类文件夹都在这下面）
     # ========== 改完直接运行 ==========
     
-    if os.path.exists(INPUT_ZSTD_FILE):
-        extract_zstd_container(INPUT_ZSTD_FILE, OUTPUT_ROOT)
+    # 可选命令行：python NpkUnlocker.py [输入文件] [输出目录] [--profile trace.json]
+    import argparse
+    parser = argparse.ArgumentParser(description="Zstd 多帧容器解包")
+    parser.add_argument("input", nargs="?", default=INPUT_ZSTD_FILE)
+    parser.add_argument("output", nargs="?", default=OUTPUT_ROOT)
+    parser.add_argument("--manifest", default=None, metavar="PATH",
+                        help="提取清单路径（.jsonl 或 .csv），默认 输出目录/manifest/<容器名>.manifest.jsonl")
+    parser.add_argument("--no-manifest", action="store_true", help="不写提取清单")
+    parser.add_argument("--dict-dir", default="", help="Zstd 字典目录（帧头带字典 ID 的帧用它解压）")
+    parser.add_argument("--threads", type=parse_threads, default=MAX_THREADS,
+                        help=f"线程数（默认 {MAX_THREADS}）；auto 按吞吐量自动调整")
+    parser.add_argument("--profile", default="", metavar="TRACE.json",
+                        help="记录每帧各阶段耗时，导出 Chrome Trace / Perfetto JSON")
+    parser.add_argument("--profile-cprofile", action="store_true", help="同时保存 cProfile 统计")
+    parser.add_argument("--profile-tracemalloc", action="store_true", help="同时保存 tracemalloc 内存快照")
+    args = parser.parse_args()
+    
+    profiler = None
+    if args.profile:
+        profiler = StageProfiler(args.profile_cprofile, args.profile_tracemalloc)
+    
+    if os.path.exists(args.input):
+        extract_zstd_container(args.input, args.output, profiler, "" if args.no_manifest else args.manifest,
+                               args.dict_dir, args.threads)
+        if profiler is not None:
+            for path in profiler.save(args.profile):
+                print(f"性能分析结果: {path}")
     else:
-        print(f"错误：文件 {INPUT_ZSTD_FILE} 不存在！")
\ No newline at end of file
+        print(f"错误：文件 {args.input} 不存在！")
+        sys.exit(1)
\ No newline at end of file
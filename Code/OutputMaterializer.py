@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import errno
+import shutil
+import hashlib
+import threading
+
+# ====================== 零拷贝输出 ======================
+# 把已有文件“放”到另一个位置，按顺序尝试：
+#   reflink          写时复制克隆（Btrfs / XFS / APFS / ReFS），两份互不影响，几乎不占空间
+#   hardlink         硬链接，同一份数据两个名字（修改其中一个会影响另一个）
+#   copy_file_range  内核内复制，不经过用户态缓冲（部分文件系统会自动变成 reflink）
+#   copy             普通复制（shutil.copy2），兜底
+# 不支持的方式只试一次，之后同一个目标目录不再尝试。
+
+METHODS = ("reflink", "hardlink", "copy_file_range", "copy")
+MODES = {
+    "auto": METHODS,
+    "reflink": ("reflink", "copy"),
+    "hardlink": ("hardlink", "copy"),
+    "copy": ("copy",),
+}
+FICLONE = 0x40049409  # Linux ioctl：整文件克隆
+COPY_CHUNK = 64 * 1024 * 1024
+# 这些错误表示“这种方式在这里用不了”，换下一种；其它错误（源文件不存在、磁盘满）直接抛出
+UNSUPPORTED_ERRNOS = {
+    errno.EXDEV, errno.EPERM, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EINVAL,
+    errno.ENOSYS, errno.EMLINK, errno.ENOTTY, errno.EACCES, errno.EBADF,
+}
+
+
+def _reflink(src, dst):
+    if sys.platform.startswith("linux"):
+        import fcntl
+        with open(src, "rb") as fs, open(dst, "wb") as fd:
+            try:
+                fcntl.ioctl(fd.fileno(), FICLONE, fs.fileno())
+            except OSError:
+                fd.close()
+                os.remove(dst)
+                raise
+        shutil.copystat(src, dst)
+        return
+    if sys.platform == "darwin":
+        import ctypes
+        libc = ctypes.CDLL(None, use_errno=True)
+        if libc.clonefile(os.fsencode(src), os.fsencode(dst), 0) != 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        return
+    raise OSError(errno.ENOTSUP, "reflink 不支持此平台")
+
+
+def _copy_file_range(src, dst):
+    if not hasattr(os, "copy_file_range"):
+        raise OSError(errno.ENOSYS, "copy_file_range 不可用")
+    with open(src, "rb") as fs, open(dst, "wb") as fd:
+        try:
+            remaining = os.fstat(fs.fileno()).st_size
+            while remaining > 0:
+                n = os.copy_file_range(fs.fileno(), fd.fileno(), min(remaining, COPY_CHUNK))
+                if n == 0:
+                    break
+                remaining -= n
+        except OSError:
+            fd.close()
+            os.remove(dst)
+            raise
+    shutil.copystat(src, dst)
+
+
+_IMPLS = {
+    "reflink": _reflink,
+    "hardlink": os.link,
+    "copy_file_range": _copy_file_range,
+    "copy": shutil.copy2,
+}
+
+
+class Materializer:
+    """线程安全；counts 记录每种方式用了多少次，saved_bytes 为没有实际复制的字节数"""
+
+    def __init__(self, mode: str = "auto"):
+        if mode not in MODES:
+            raise ValueError(f"未知的输出方式: {mode}")
+        self.methods = MODES[mode]
+        self._lock = threading.Lock()
+        self._unsupported = set()   # (目标目录, 方式)
+        self.counts = dict.fromkeys(METHODS, 0)
+        self.saved_bytes = 0
+
+    def place(self, src, dst) -> str:
+        """把 src 放到 dst（dst 不能已存在），返回实际使用的方式"""
+        folder = os.path.dirname(os.path.abspath(dst))
+        last_error = None
+        for method in self.methods:
+            key = (folder, method)
+            if key in self._unsupported:
+                continue
+            try:
+                _IMPLS[method](src, dst)
+            except OSError as e:
+                if method == "copy" or e.errno not in UNSUPPORTED_ERRNOS:
+                    raise
+                with self._lock:
+                    self._unsupported.add(key)
+                last_error = e
+                continue
+            with self._lock:
+                self.counts[method] += 1
+                if method in ("reflink", "hardlink"):
+                    self.saved_bytes += os.path.getsize(dst)
+            return method
+        raise last_error or OSError(errno.ENOTSUP, "没有可用的输出方式")
+
+    def summary(self) -> str:
+        used = "，".join(f"{m} {n}" for m, n in self.counts.items() if n)
+        return f"{used or '无'}（节省 {self.saved_bytes / 1024 / 1024:.1f} MB）"
+
+
+# ====================== 文件名冲突 ======================
+
+def plan_names(paths, root=None):
+    """
+    为一批要放进同一目录的文件决定文件名，结果只取决于这批路径本身，与处理顺序无关：
+    文件名在这批里唯一的保持原名；重名的都加上来源相对路径的短哈希，如 bgm~1a2b3c4d.wem。
+    返回 {源路径: 目标文件名}
+    """
+    by_name = {}
+    for path in paths:
+        by_name.setdefault(os.path.basename(path), []).append(path)
+    names = {}
+    for name, group in by_name.items():
+        if len(group) == 1:
+            names[group[0]] = name
+            continue
+        stem, ext = os.path.splitext(name)
+        for path in group:
+            rel = os.path.relpath(path, root) if root else path
+            tag = hashlib.md5(rel.replace("\\", "/").encode("utf-8")).hexdigest()[:8]
+            names[path] = f"{stem}~{tag}{ext}"
+    return names
@@ -1,16 +1,32 @@
 import os
 import sys
-import zstandard as zstd
 import hashlib
+import json
+import time
+import fnmatch
 from pathlib import Path
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import shutil
 
+from ExtractJournal import ExtractJournal, remove_journal
+from ExtractManifest import (
+    STATUS_DUPLICATE, STATUS_EXTRACTED, STATUS_FAILED,
+    DuplicateIndex, ManifestWriter, default_manifest_path, make_row,
+)
+from StageProfiler import SpanClock, StageProfiler
+from WorkerAutotune import AUTO, WorkerAutotuner, parse_threads
+from ZstdFrames import DICTIONARIES, decompress_frame, parse_frame_header
+
 # ====================== 核心配置（可直接修改默认值） ======================
-# 硬件适配（i5-7200U + 8GB内存）
-MAX_THREADS = 4  # CPU线程数（2核4线程）
+MAX_THREADS = 4  # CPU线程数（2核4线程）；AUTO(0)=从 CPU 核数开始按吞吐量自动调整（--threads auto）
 MAX_BLOCK_SIZE = 20 * 1024 * 1024  # 单Zstd块最大20MB
 CHUNK_SIZE = 1024 * 1024  # 分块读取大小（减少内存占用）
+ZSTD_MAGIC = b"\x28\xB5\x2F\xFD"
+
+# PPK文件发现（递归扫描子目录）
+PPK_NAME_PATTERNS = []  # 文件名通配符，如 ["*.ppk", "????????"]；为空时沿用原规则：8位字母数字文件名
+SCAN_THREADS = 8  # 并行 scandir 的线程数
+TIMINGS_NAME = ".ppk_timings.json"  # 每个PPK的实测耗时（在输出目录下），下次按实测耗时排队
 
 # 导出路径配置（可修改默认输出目录）
 DEFAULT_OUTPUT_DIR = None  # None表示默认输出到PPK目录下的Output文件夹
@@ -81,97 +97,330 @@ def detect_file_extension(data):
     # 未知类型
     return ""
 
+# ====================== 流式扫描（滑动窗口） ======================
+def iter_zstd_blocks(f, start=0, chunk_size=CHUNK_SIZE, max_block=MAX_BLOCK_SIZE):
+    """
+    从文件对象 f 的 start 处开始，按 chunk_size 分块读取，依次产出 (魔数偏移, 块结束偏移, 块数据)。
+    块的划分与整文件读入时完全相同：从魔数到下一个魔数（最长 max_block），块结束处继续找下一个魔数。
+    缓冲区只保留当前块起点之后的数据，末尾留 3 字节重叠，跨分块边界的魔数也能找到；
+    内存占用不超过 chunk_size + 最大块大小，与 PPK 文件大小无关。
+    """
+    f.seek(start)
+    buf = bytearray()
+    buf_start = start       # buf[0] 在文件中的偏移
+    offset = start          # 下一次从这里开始找魔数
+    eof = False
+    overlap = len(ZSTD_MAGIC) - 1
+    
+    def fill():
+        nonlocal eof
+        chunk = f.read(chunk_size)
+        if not chunk:
+            eof = True
+        buf.extend(chunk)
+    
+    def discard(upto):
+        nonlocal buf_start
+        if upto > buf_start:
+            del buf[:upto - buf_start]
+            buf_start = upto
+    
+    while True:
+        # 找块起点的魔数
+        pos = buf.find(ZSTD_MAGIC, offset - buf_start)
+        if pos == -1:
+            if eof:
+                return
+            offset = max(offset, buf_start + len(buf) - overlap)
+            discard(offset)
+            fill()
+            continue
+        magic_pos = buf_start + pos
+        discard(magic_pos)
+        
+        # 找块终点：下一个魔数、最大块大小或文件末尾，数据不够时继续读
+        search_from = magic_pos + len(ZSTD_MAGIC)
+        while True:
+            limit = magic_pos + max_block
+            # 起点在 limit 之前、跨过 limit 的魔数也算
+            next_pos = buf.find(ZSTD_MAGIC, search_from - buf_start, limit + overlap - buf_start)
+            if next_pos != -1:
+                block_end = buf_start + next_pos
+                break
+            if buf_start + len(buf) >= limit + overlap:
+                block_end = limit
+                break
+            if eof:
+                block_end = min(limit, buf_start + len(buf))
+                break
+            search_from = max(search_from, buf_start + len(buf) - overlap)
+            fill()
+        
+        yield magic_pos, block_end, bytes(buf[:block_end - buf_start])
+        offset = block_end
+        discard(block_end)
+
 # ====================== 全局去重集合（线程安全） ======================
-DUPLICATE_MD5 = set()
+# 去重按压缩块的 MD5（解压前就能判定）；清单的 hash 列是解压后内容的 MD5，
+# 重复块不解压，内容 MD5 从首个块记下的对应关系里取（首个块还没写完时为空）
+DUPLICATE_MD5 = DuplicateIndex()
+BLOCK_CONTENT_MD5 = {}
 
 # ====================== 单文件处理函数（供多线程调用） ======================
-def process_ppk_file(file_path, output_root):
-    """处理单个PPK文件，提取Zstd块并解压分类"""
-    file_name = Path(file_path).name
+def process_ppk_file(file_path, output_root, profiler=None, manifest=None, output_name=None,
+                     keep_journal=False):
+    """
+    处理单个PPK文件，提取Zstd块并解压分类；output_name 为输出文件名前缀（默认PPK文件名）。
+    keep_journal=True 时处理完不删日志，只在末尾写完成标记（由 main() 整批结束后删除），
+    下次运行时输出仍完好的已完成文件直接跳过。
+    """
+    file_name = output_name or Path(file_path).name
+    started = time.perf_counter()
     processed_blocks = 0
     extracted_blocks = 0
+    journal = None
+    ppk_file = None
     
     try:
-        # 分块读取文件（减少内存占用）
-        with open(file_path, "rb") as f:
-            file_data = f.read()
-        
-        # 扫描所有Zstd魔数位置
-        ZSTD_MAGIC = b"\x28\xB5\x2F\xFD"
-        offset = 0
+        # 断点续传：按顺序恢复日志中连续完好的块，从最后一块之后继续扫描
+        journal = ExtractJournal(output_root, file_path)
+        done = journal.completed_prefix()
+        resume_offset = 0
         block_idx = 0
+        finished = False
+        for rec in done:
+            if rec.get("done"):
+                finished = True
+                processed_blocks = rec["processed"]
+                continue
+            DUPLICATE_MD5.add(rec["hash"], rec["path"])
+            if rec["path"] and rec.get("row"):
+                BLOCK_CONTENT_MD5[rec["hash"]] = rec["row"]["hash"]
+            if manifest is not None and rec.get("row"):
+                manifest.write(rec["row"])
+            resume_offset = rec["end"]
+            processed_blocks = rec["processed"]
+            if rec["path"]:
+                extracted_blocks += 1
+                block_idx = rec["block"] + 1
+        if finished:
+            journal.close()
+            return {
+                "file": file_name,
+                "processed": processed_blocks,
+                "extracted": extracted_blocks,
+                "seconds": time.perf_counter() - started,
+                "resumed": True,
+                "skipped": True,
+                "journal": journal.path,
+                "status": "success"
+            }
+        
+        # 分块流式读取（滑动窗口），读取和扫描交替进行，耗时都计入 scan
+        ppk_file = open(file_path, "rb")
+        blocks = iter_zstd_blocks(ppk_file, resume_offset)
         
-        while offset < len(file_data):
-            # 找Zstd魔数
-            magic_pos = file_data.find(ZSTD_MAGIC, offset)
-            if magic_pos == -1:
+        while True:
+            clock = SpanClock(profiler, processed_blocks)
+            # 读到下一个Zstd块（魔数 → 下一个魔数）
+            block = next(blocks, None)
+            if block is None:
                 break
-            
-            # 确定块结束位置
-            next_magic_pos = file_data.find(ZSTD_MAGIC, magic_pos + 4)
-            block_end = min(
-                next_magic_pos if next_magic_pos != -1 else len(file_data),
-                magic_pos + MAX_BLOCK_SIZE
-            )
-            
-            # 提取Zstd块
-            zstd_data = file_data[magic_pos:block_end]
+            magic_pos, block_end, zstd_data = block
             processed_blocks += 1
+            clock.lap("scan")
             
             # 过滤过小的块
             if len(zstd_data) < 1024:
-                offset = block_end
+                clock.lap("validate")
                 continue
+            clock.lap("validate")
             
-            # 全局去重（线程安全）
+            # 全局去重（线程安全：检查和占位在同一把锁里，解压前就占位，重复块不必解压）
             block_md5 = hashlib.md5(zstd_data).hexdigest()
-            if block_md5 in DUPLICATE_MD5:
-                offset = block_end
+            clock.lap("hash")
+            first_path = DUPLICATE_MD5.claim(block_md5)
+            if first_path is not None:
+                row = make_row(file_path, processed_blocks - 1, magic_pos, STATUS_DUPLICATE,
+                               len(zstd_data), file_hash=BLOCK_CONTENT_MD5.get(block_md5, ""),
+                               duplicate_of=first_path, block_hash=block_md5)
+                journal.record(magic_pos, end=block_end, hash=block_md5, processed=processed_blocks, row=row)
+                if manifest is not None:
+                    manifest.write(row)
                 continue
-            DUPLICATE_MD5.add(block_md5)
+            
+            # 帧头带字典 ID 而字典还没有时，先收集这个PPK文件里夹带的字典（每个文件只收集一次）
+            header = parse_frame_header(zstd_data)
+            if header is not None and header.dict_id and header.dict_id not in DICTIONARIES:
+                DICTIONARIES.harvest_file(file_path)
             
             # 解压Zstd块
             try:
-                dctx = zstd.ZstdDecompressor()
-                decompressed = dctx.decompress(zstd_data)
+                decompressed, _ = decompress_frame(zstd_data)
+                clock.lap("decompress")
             except Exception as e:
-                offset = block_end
+                clock.lap("decompress")
+                row = make_row(file_path, processed_blocks - 1, magic_pos, STATUS_FAILED,
+                               len(zstd_data), block_hash=block_md5)
+                journal.record(magic_pos, end=block_end, hash=block_md5, processed=processed_blocks, row=row)
+                if manifest is not None:
+                    manifest.write(row)
                 continue
             
             # 检测文件类型
             file_ext = detect_file_extension(decompressed)
             category = FILE_CATEGORY_MAP.get(file_ext, "未知文件")
+            clock.lap("detect")
             
             # 创建分类目录
             category_dir = output_root / category
             category_dir.mkdir(exist_ok=True, parents=True)
+            clock.lap("mkdir")
             
             # 生成保存文件名
             save_name = f"{file_name}_block{block_idx}{file_ext}"
             save_path = category_dir / save_name
             
             # 保存文件
-            with open(save_path, "wb") as f:
-                f.write(decompressed)
+            try:
+                with open(save_path, "wb") as f:
+                    f.write(decompressed)
+            except BaseException:
+                DUPLICATE_MD5.release(block_md5)
+                raise
+            content_md5 = hashlib.md5(decompressed).hexdigest()
+            BLOCK_CONTENT_MD5[block_md5] = content_md5
+            DUPLICATE_MD5.resolve(block_md5, str(save_path))
+            clock.lap("write")
+            row = make_row(file_path, processed_blocks - 1, magic_pos, STATUS_EXTRACTED,
+                           len(zstd_data), len(decompressed), content_md5, file_ext, category, save_path,
+                           block_hash=block_md5)
+            journal.record(
+                magic_pos, str(save_path), end=block_end, hash=block_md5,
+                processed=processed_blocks, block=block_idx, size=len(decompressed), row=row,
+            )
+            if manifest is not None:
+                manifest.write(row)
             
             extracted_blocks += 1
             block_idx += 1
-            offset = block_end
         
+        ppk_file.close()
+        if keep_journal:
+            journal.record(resume_offset, done=True, processed=processed_blocks)
+            journal.close()
+        else:
+            journal.finish()
         return {
             "file": file_name,
             "processed": processed_blocks,
             "extracted": extracted_blocks,
+            "seconds": time.perf_counter() - started,
+            "resumed": resume_offset > 0,
+            "skipped": False,
+            "journal": journal.path,
             "status": "success"
         }
     
     except Exception as e:
+        if ppk_file is not None:
+            ppk_file.close()
+        if journal is not None:
+            journal.close()
         return {
             "file": file_name,
             "error": str(e)[:100],
             "status": "failed"
         }
 
+# ====================== PPK文件发现与排队 ======================
+def is_ppk_name(name, patterns=None):
+    if patterns:
+        return any(fnmatch.fnmatch(name, p) for p in patterns)
+    return len(name) == 8 and name.isalnum()
+
+def discover_ppk_files(ppk_dir, patterns=None, recursive=True, skip_dirs=()):
+    """
+    并行 scandir 查找PPK文件，返回 [(路径, 大小)]，按路径排序。
+    每一层的子目录同时提交到线程池；skip_dirs 里的目录（如输出目录）不进入。
+    """
+    skip = {os.path.normcase(os.path.abspath(d)) for d in skip_dirs}
+    found = []
+    
+    def scan(folder):
+        files, subdirs = [], []
+        try:
+            with os.scandir(folder) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if os.path.normcase(os.path.abspath(entry.path)) not in skip:
+                                subdirs.append(entry.path)
+                        elif entry.is_file() and is_ppk_name(entry.name, patterns):
+                            files.append((Path(entry.path), entry.stat().st_size))
+                    except OSError:
+                        continue
+        except OSError as e:
+            print(f"⚠️ 无法读取目录 {folder}：{str(e)[:100]}")
+        return files, subdirs
+    
+    with ThreadPoolExecutor(max_workers=SCAN_THREADS) as executor:
+        level = [str(ppk_dir)]
+        while level:
+            next_level = []
+            for files, subdirs in executor.map(scan, level):
+                found.extend(files)
+                if recursive:
+                    next_level.extend(subdirs)
+            level = next_level
+    return sorted(found)
+
+def load_timings(output_root):
+    try:
+        with open(Path(output_root) / TIMINGS_NAME, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_timings(output_root, timings):
+    path = Path(output_root) / TIMINGS_NAME
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(timings, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+
+def schedule_ppk_files(files, ppk_dir, timings):
+    """
+    按预计耗时从大到小排列，最大的PPK最先开始，不会最后才开始、让其它线程空等。
+    上次实测过且大小没变的用实测耗时；其余按实测的平均速度（没有实测时直接按大小）估算。
+    """
+    rates = [t["seconds"] / t["size"] for t in timings.values() if t.get("size") and t.get("seconds")]
+    rate = sorted(rates)[len(rates) // 2] if rates else 1.0
+    
+    def cost(item):
+        path, size = item
+        t = timings.get(Path(path).relative_to(ppk_dir).as_posix())
+        if t and t.get("size") == size and t.get("seconds"):
+            return t["seconds"]
+        return size * rate
+    
+    return sorted(files, key=cost, reverse=True)
+
+# ====================== 命令行选项 ======================
+def pop_option(argv, name, has_value=True):
+    """从参数列表中取出 --name [值]，返回值（开关型返回 True），不存在返回 None"""
+    if name not in argv:
+        return None
+    i = argv.index(name)
+    if not has_value:
+        del argv[i]
+        return True
+    if i + 1 >= len(argv):
+        return None
+    value = argv[i + 1]
+    del argv[i:i + 2]
+    return value
+
 # ====================== 主函数（支持自定义输出路径） ======================
 def main():
     # 显示使用帮助
@@ -186,23 +435,54 @@ def main():
         print("\n用法2（自定义输出路径）：")
         print("  python 脚本.py <PPK文件所在目录> <自定义输出目录>")
         print("  示例：python ppk_extract.py D:/ppk_files E:/ppk_output")
+        print("\n可选参数：")
+        print("  --pattern <通配符>       PPK文件名通配符，可多次指定（默认 8位字母数字文件名）")
+        print("  --no-recursive           只查找PPK目录顶层，不进入子目录")
+        print("  --dict-dir <目录>        Zstd 字典目录（帧头带字典 ID 的块用它解压）")
+        print(f"  --threads <数量|auto>    线程数，默认 {MAX_THREADS}；auto 按吞吐量自动调整并报告选定值")
+        print("  --manifest <路径>        提取清单（.jsonl 或 .csv），默认 输出目录/manifest/<PPK目录名>.manifest.jsonl")
+        print("  --no-manifest            不写提取清单")
+        print("  --profile <trace.json>   记录每块各阶段耗时，导出 Chrome Trace / Perfetto JSON")
+        print("  --profile-cprofile       同时保存 cProfile 统计")
+        print("  --profile-tracemalloc    同时保存 tracemalloc 内存快照")
         print("="*60)
     
+    # 先取出可选参数，剩下的按原来的位置参数处理
+    argv = sys.argv[1:]
+    profile_path = pop_option(argv, "--profile")
+    profile_cprofile = pop_option(argv, "--profile-cprofile", has_value=False)
+    profile_tracemalloc = pop_option(argv, "--profile-tracemalloc", has_value=False)
+    manifest_path = pop_option(argv, "--manifest")
+    patterns = list(PPK_NAME_PATTERNS)
+    while True:
+        pattern = pop_option(argv, "--pattern")
+        if pattern is None:
+            break
+        patterns.append(pattern)
+    recursive = not pop_option(argv, "--no-recursive", has_value=False)
+    dict_dir = pop_option(argv, "--dict-dir")
+    threads = pop_option(argv, "--threads")
+    threads = MAX_THREADS if threads is None else parse_threads(threads)
+    no_manifest = pop_option(argv, "--no-manifest", has_value=False)
+    profiler = None
+    if profile_path:
+        profiler = StageProfiler(bool(profile_cprofile), bool(profile_tracemalloc))
+    
     # 检查命令行参数
-    if len(sys.argv) < 2 or len(sys.argv) > 3:
+    if len(argv) < 1 or len(argv) > 2:
         print_help()
         sys.exit(1)
     
     # 获取PPK目录
-    ppk_dir = Path(sys.argv[1])
+    ppk_dir = Path(argv[0])
     if not ppk_dir.exists() or not ppk_dir.is_dir():
         print(f"❌ 错误：目录 {ppk_dir} 不存在或不是有效目录")
         sys.exit(1)
     
     # 确定输出目录
-    if len(sys.argv) == 3:
+    if len(argv) == 2:
         # 命令行指定自定义输出目录
-        output_root = Path(sys.argv[2])
+        output_root = Path(argv[1])
     elif DEFAULT_OUTPUT_DIR is not None:
         # 使用脚本内配置的默认输出目录
         output_root = Path(DEFAULT_OUTPUT_DIR)
@@ -215,23 +495,60 @@ def main():
     print(f"📂 输出目录已确定：{output_root.absolute()}")
     
     # 收集所有PPK文件（任意8位字母数字文件名，无后缀）
-    ppk_files = []
-    for file in ppk_dir.iterdir():
-        if file.is_file() and len(file.name) == 8 and file.name.isalnum():
-            ppk_files.append(file)
+    if dict_dir:
+        print(f"📚 从字典目录加载了 {DICTIONARIES.load_dir(dict_dir)} 个Zstd字典：{dict_dir}")
     
-    if not ppk_files:
-        print(f"⚠️ 在目录 {ppk_dir} 中未找到任何PPK文件（8位字母数字文件名）")
+    # 递归并行扫描（跳过输出目录），按预计耗时从大到小排队
+    found = discover_ppk_files(ppk_dir, patterns, recursive, skip_dirs=(output_root,))
+    
+    if not found:
+        rule = "、".join(patterns) if patterns else "8位字母数字文件名"
+        print(f"⚠️ 在目录 {ppk_dir} 中未找到任何PPK文件（{rule}）")
         sys.exit(0)
     
+    timings = load_timings(output_root)
+    ppk_files = [file for file, _ in schedule_ppk_files(found, ppk_dir, timings)]
+    sizes = dict(found)
+    
+    # 不同子目录里的同名PPK：输出文件名前缀改用相对路径，避免互相覆盖
+    name_count = {}
+    for file in ppk_files:
+        name_count[file.name] = name_count.get(file.name, 0) + 1
+    output_names = {
+        file: file.name if name_count[file.name] == 1 else "_".join(file.relative_to(ppk_dir).parts)
+        for file in ppk_files
+    }
+    
+    # 提取清单（所有PPK文件共用一份）
+    manifest = None
+    if not no_manifest:
+        manifest = ManifestWriter(manifest_path or default_manifest_path(output_root, ppk_dir))
+    
     # 多线程处理
-    print(f"🚀 找到 {len(ppk_files)} 个PPK文件，使用 {MAX_THREADS} 线程处理...")
+    total_size = sum(sizes.values())
+    tuner = None
+    if threads == AUTO:
+        tuner = WorkerAutotuner(measure=lambda result: result[1], log=lambda message: print(f"⚙️ {message}"))
+        thread_text = f"自动调整线程数（从 {tuner.workers} 开始，上限 {tuner.max_workers}）"
+    else:
+        thread_text = f"{threads} 线程"
+    print(f"🚀 找到 {len(ppk_files)} 个PPK文件（{total_size / 1024 / 1024:.1f} MB），使用 {thread_text}处理（大文件优先）...")
     results = []
     
-    with ThreadPoolExecutor(max_workers=MAX_THREADS) as executor:
+    def run_file(file):
+        if profiler is not None:
+            return profiler.run_profiled(process_ppk_file, str(file), output_root, profiler, manifest,
+                                         output_names[file], True)
+        return process_ppk_file(str(file), output_root, None, manifest, output_names[file], True)
+    
+    def run_file_tuned(file):
+        # 按 PPK 文件大小计吞吐
+        return tuner.run(lambda: (run_file(file), sizes[file]))[0]
+    
+    with ThreadPoolExecutor(max_workers=tuner.max_workers if tuner else threads) as executor:
         # 提交任务
         future_to_file = {
-            executor.submit(process_ppk_file, str(file), output_root): file 
+            executor.submit(run_file_tuned if tuner else run_file, file): file
             for file in ppk_files
         }
         
@@ -241,13 +558,34 @@ def main():
             try:
                 result = future.result()
                 results.append(result)
-                if result["status"] == "success":
-                    print(f"✅ {result['file']} - 处理块数：{result['processed']} - 提取块数：{result['extracted']}")
+                if result["status"] == "success" and result["skipped"]:
+                    print(f"⏭️ {result['file']} - 上次运行已完成且输出完好，跳过 - 提取块数：{result['extracted']}")
+                elif result["status"] == "success":
+                    print(f"✅ {result['file']} - 处理块数：{result['processed']} - 提取块数：{result['extracted']}"
+                          f" - 耗时：{result['seconds']:.1f} 秒")
+                    # 续传的文件只处理了一部分，耗时不能代表整个文件
+                    if not result["resumed"]:
+                        timings[file.relative_to(ppk_dir).as_posix()] = {
+                            "size": sizes[file], "seconds": round(result["seconds"], 3),
+                        }
                 else:
                     print(f"❌ {result['file']} - 错误：{result['error']}")
             except Exception as e:
                 print(f"❌ {file.name} - 任务异常：{str(e)[:100]}")
     
+    if tuner is not None:
+        print(f"⚙️ {tuner.summary()}")
+    
+    # 整批处理完才删除成功文件的断点日志；失败的文件保留日志，下次续传
+    for res in results:
+        if res["status"] == "success":
+            remove_journal(res["journal"])
+    
+    try:
+        save_timings(output_root, timings)
+    except OSError as e:
+        print(f"⚠️ 耗时记录保存失败：{str(e)[:100]}")
+    
     # 统计结果
     total_processed = 0
     total_extracted = 0
@@ -268,7 +606,14 @@ def main():
     print(f"   🔍 总扫描Zstd块数：{total_processed}")
     print(f"   ✅ 去重后提取块数：{total_extracted}")
     print(f"   📂 最终输出目录：{output_root.absolute()}")
+    if manifest is not None:
+        manifest.close()
+        print(f"   📄 提取清单：{manifest.path}")
     print("="*60)
+    
+    if profiler is not None:
+        for path in profiler.save(profile_path):
+            print(f"   ⏱️ 性能分析已保存：{path}")
 
 if __name__ == "__main__":
     # 安装依赖（自动检测）
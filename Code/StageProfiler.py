@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+import os
+import io
+import json
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+
+# ====================== 分阶段性能分析 ======================
+# 记录每一帧每个阶段（read / scan / validate / decompress / hash / detect / mkdir / write）
+# 的起止时间和所在线程，导出为 Chrome Trace（chrome://tracing 或 ui.perfetto.dev 可直接打开）。
+# 可选：每个工作线程各自的 cProfile 统计，以及 tracemalloc 内存快照。
+
+PROFILE_STAGES = ("read", "scan", "validate", "decompress", "hash", "detect", "mkdir", "write")
+TRACEMALLOC_TOP = 30
+PROFILE_DIR_NAME = "profile"    # 默认在输出目录下的这个文件夹里保存性能分析结果
+
+
+class StageProfiler:
+    def __init__(self, enable_cprofile: bool = False, enable_tracemalloc: bool = False):
+        self.enable_cprofile = enable_cprofile
+        self.enable_tracemalloc = enable_tracemalloc
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._threads = []    # [(线程 id, 线程名, 事件列表)]
+        self._profiles = []
+        self._origin = time.perf_counter()
+        self._started_tracemalloc = False
+        if enable_tracemalloc and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+
+    def _events(self) -> list:
+        events = getattr(self._local, "events", None)
+        if events is None:
+            events = []
+            self._local.events = events
+            t = threading.current_thread()
+            with self._lock:
+                self._threads.append((threading.get_ident(), t.name, events))
+        return events
+
+    def add_span(self, stage: str, start: float, end: float, frame=None):
+        """start / end 为 time.perf_counter() 的值；列表 append 本身线程安全，无需加锁"""
+        self._events().append((stage, start, end, frame))
+
+    def run_profiled(self, fn, *args, **kwargs):
+        """在当前线程的 cProfile 下执行 fn（线程池中每个线程各有一份 Profile）"""
+        if not self.enable_cprofile:
+            return fn(*args, **kwargs)
+        prof = getattr(self._local, "profile", None)
+        if prof is None:
+            prof = cProfile.Profile()
+            self._local.profile = prof
+            with self._lock:
+                self._profiles.append(prof)
+        return prof.runcall(fn, *args, **kwargs)
+
+    def export_chrome_trace(self, path: str) -> int:
+        pid = os.getpid()
+        trace = []
+        with self._lock:
+            threads = list(self._threads)
+        for tid, name, events in threads:
+            trace.append({
+                "name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+                "args": {"name": name},
+            })
+            for stage, start, end, frame in list(events):
+                ev = {
+                    "name": stage, "cat": "extract", "ph": "X", "pid": pid, "tid": tid,
+                    "ts": round((start - self._origin) * 1e6, 3),
+                    "dur": round((end - start) * 1e6, 3),
+                }
+                if frame is not None:
+                    ev["args"] = {"frame": frame}
+                trace.append(ev)
+        folder = os.path.dirname(os.path.abspath(path))
+        os.makedirs(folder, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f)
+        return len(trace)
+
+    def stage_totals(self) -> dict:
+        totals = dict.fromkeys(PROFILE_STAGES, 0.0)
+        with self._lock:
+            threads = list(self._threads)
+        for _, _, events in threads:
+            for stage, start, end, _ in list(events):
+                totals[stage] = totals.get(stage, 0.0) + (end - start)
+        return totals
+
+    def save(self, trace_path: str) -> list:
+        """导出 trace，以及（启用时）同名前缀的 .pstats / .cprofile.txt / .tracemalloc.txt；返回写出的文件列表"""
+        written = [trace_path]
+        self.export_chrome_trace(trace_path)
+        base = os.path.splitext(trace_path)[0]
+
+        with self._lock:
+            profiles = list(self._profiles)
+        if profiles:
+            for prof in profiles:
+                prof.create_stats()
+            stats = pstats.Stats(*profiles)
+            stats.dump_stats(base + ".pstats")
+            text = io.StringIO()
+            stats.stream = text
+            stats.sort_stats("cumulative").print_stats(60)
+            with open(base + ".cprofile.txt", "w", encoding="utf-8") as f:
+                f.write(text.getvalue())
+            written += [base + ".pstats", base + ".cprofile.txt"]
+
+        if self.enable_tracemalloc and tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            with open(base + ".tracemalloc.txt", "w", encoding="utf-8") as f:
+                f.write(f"当前: {current / 1024 / 1024:.1f} MB, 峰值: {peak / 1024 / 1024:.1f} MB\n\n")
+                for stat in snapshot.statistics("lineno")[:TRACEMALLOC_TOP]:
+                    f.write(f"{stat}\n")
+            written.append(base + ".tracemalloc.txt")
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+        return written
+
+
+class SpanClock:
+    """连续计时：每次 lap(stage) 记录从上一次 lap 到现在这一段；profiler 为 None 时只走时钟"""
+
+    def __init__(self, profiler, frame=None):
+        self.profiler = profiler
+        self.frame = frame
+        self.t = time.perf_counter()
+
+    def lap(self, stage: str) -> float:
+        now = time.perf_counter()
+        elapsed = now - self.t
+        if self.profiler is not None:
+            self.profiler.add_span(stage, self.t, now, self.frame)
+        self.t = now
+        return elapsed
+
+
+def default_trace_path(output_root: str, tag: str = "extract") -> str:
+    stamp = time.strftime("%Y%m%d_%H%M%S")
+    return os.path.join(str(output_root), PROFILE_DIR_NAME, f"{tag}_{stamp}.trace.json")
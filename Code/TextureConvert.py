@@ -0,0 +1,700 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import zlib
+import struct
+import hashlib
+import argparse
+import threading
+import multiprocessing
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from AssetPack import is_pack_path, split_pack_path
+from OutputMaterializer import Materializer
+
+# ====================== 纹理转 PNG ======================
+# 提取出来的 .dds / .ktx / .tga 美术还得再用串行工具一个个转，这里在提取之后顺带转成 PNG：
+#   - 解码只用标准库（struct / zlib），在进程池里并行，不受 GIL 限制；
+#   - 结果按源文件内容的 MD5 存在缓存目录（默认 ~/.neonpk/texture_cache/ab/<md5>.png），
+#     不同版本里内容相同的纹理只转一次，之后直接从缓存 reflink / 复制过去；
+#   - 提取时直接用解压出来的数据，不再从磁盘读回。
+# 支持：DDS 未压缩（RGB / RGBA / 亮度 / Alpha 各种位掩码）、BC1-BC5（DXT1-5 / ATI1 / ATI2 及 DX10 头）；
+#       TGA 真彩 / 灰度 / 调色板（含 RLE）；KTX 未压缩 RGBA / RGB / 亮度、ETC1、S3TC。
+# 只转第一层 mip / 第一个面。BC6H / BC7 / ETC2 / ASTC 等记为“不支持”，原文件照常保留。
+
+SUPPORTED_EXTS = (".dds", ".ktx", ".tga")
+CACHE_DIR_NAME = "texture_cache"
+MAX_PENDING_PER_WORKER = 4    # 每个进程最多排队几个纹理（数据要复制进子进程，限制内存）
+BLOCK_CACHE_LIMIT = 65536     # 单张纹理里相同压缩块的解码结果缓存条数
+PNG_LEVEL = 6
+
+STATUS_CONVERTED = "converted"
+STATUS_CACHED = "cached"
+STATUS_UNSUPPORTED = "unsupported"
+STATUS_FAILED = "failed"
+STATUSES = (STATUS_CONVERTED, STATUS_CACHED, STATUS_UNSUPPORTED, STATUS_FAILED)
+STATUS_LABELS = {
+    STATUS_CONVERTED: "转换",
+    STATUS_CACHED: "命中缓存",
+    STATUS_UNSUPPORTED: "不支持",
+    STATUS_FAILED: "失败",
+}
+
+
+class UnsupportedTexture(ValueError):
+    """格式能识别但不支持解码（BC7、ETC2 等），或者根本不是纹理"""
+
+
+def default_cache_dir() -> str:
+    return os.path.join(os.path.expanduser("~"), ".neonpk", CACHE_DIR_NAME)
+
+
+def cache_path_for(cache_dir, file_hash: str) -> str:
+    return os.path.join(str(cache_dir), file_hash[:2], file_hash + ".png")
+
+
+# ====================== PNG 编码 ======================
+
+def _png_chunk(kind: bytes, payload: bytes) -> bytes:
+    return struct.pack(">I", len(payload)) + kind + payload + struct.pack(">I", zlib.crc32(kind + payload))
+
+
+def encode_png(width: int, height: int, rgba) -> bytes:
+    """RGBA8 像素 → PNG；全不透明时存成 RGB"""
+    rgba = bytes(rgba)
+    if rgba[3::4] == b"\xff" * (width * height):
+        rgb = bytearray(width * height * 3)
+        rgb[0::3] = rgba[0::4]
+        rgb[1::3] = rgba[1::4]
+        rgb[2::3] = rgba[2::4]
+        pixels, color_type, channels = bytes(rgb), 2, 3
+    else:
+        pixels, color_type, channels = rgba, 6, 4
+    stride = width * channels
+    raw = b"".join(b"\x00" + pixels[y * stride:(y + 1) * stride] for y in range(height))
+    return b"".join((
+        b"\x89PNG\r\n\x1a\n",
+        _png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, color_type, 0, 0, 0)),
+        _png_chunk(b"IDAT", zlib.compress(raw, PNG_LEVEL)),
+        _png_chunk(b"IEND", b""),
+    ))
+
+
+# ====================== 通用像素工具 ======================
+
+def _check_size(width, height):
+    if width <= 0 or height <= 0 or width * height > 16384 * 16384:
+        raise UnsupportedTexture(f"纹理尺寸异常: {width}x{height}")
+
+
+def _mask_shift_bits(mask):
+    if not mask:
+        return 0, 0
+    shift = (mask & -mask).bit_length() - 1
+    return shift, bin(mask).count("1")
+
+
+def _scale_to_8(value, bits):
+    if bits == 8:
+        return value
+    if bits == 0:
+        return 255
+    return (value * 255 + ((1 << bits) - 1) // 2) // ((1 << bits) - 1)
+
+
+def _channel_table(mask, bits_total, default):
+    """像素值 → 通道值（8 位）的查表，只用于 8 / 16 位像素"""
+    shift, bits = _mask_shift_bits(mask)
+    if not bits:
+        return None, default
+    return [_scale_to_8((v & mask) >> shift, bits) for v in range(1 << bits_total)], default
+
+
+def decode_masked(data, offset, width, height, bit_count, masks, has_alpha, luminance=False):
+    """按位掩码解码未压缩像素（DDS 的 DDPF_RGB / LUMINANCE / ALPHA），返回 RGBA8"""
+    _check_size(width, height)
+    bpp = bit_count // 8
+    if bit_count not in (8, 16, 24, 32):
+        raise UnsupportedTexture(f"不支持的像素位数: {bit_count}")
+    count = width * height
+    src = bytes(data[offset:offset + count * bpp])
+    if len(src) < count * bpp:
+        raise ValueError("像素数据不完整")
+    r_mask, g_mask, b_mask, a_mask = masks
+    if luminance:
+        g_mask = b_mask = r_mask
+    if not has_alpha:
+        a_mask = 0
+    out = bytearray(count * 4)
+
+    # 每个通道正好占一个字节时直接按步长切片，不逐像素处理
+    byte_masks = {0xFF << (8 * k): k for k in range(bpp)}
+    if bpp >= 3 and all(m in byte_masks or m == 0 for m in (r_mask, g_mask, b_mask, a_mask)):
+        for channel, mask in enumerate((r_mask, g_mask, b_mask, a_mask)):
+            if mask:
+                out[channel::4] = src[byte_masks[mask]::bpp]
+            else:
+                out[channel::4] = (b"\xff" if channel == 3 else b"\x00") * count
+        return out
+
+    if bpp <= 2:
+        # 查表：每个像素值一次得到 4 字节
+        tables = [_channel_table(mask, bit_count, 255 if channel == 3 else 0)
+                  for channel, mask in enumerate((r_mask, g_mask, b_mask, a_mask))]
+        lut = []
+        for v in range(1 << bit_count):
+            lut.append(bytes(table[v] if table is not None else default for table, default in tables))
+        values = src if bpp == 1 else array("H", src)
+        if bpp == 2 and sys.byteorder == "big":
+            values.byteswap()
+        return bytearray(b"".join([lut[v] for v in values]))
+
+    # 其余（10:10:10:2 之类）逐像素
+    shifts = [_mask_shift_bits(m) for m in (r_mask, g_mask, b_mask, a_mask)]
+    pos = 0
+    for i in range(count):
+        v = int.from_bytes(src[pos:pos + bpp], "little")
+        pos += bpp
+        o = i * 4
+        for channel, (mask, (shift, bits)) in enumerate(zip((r_mask, g_mask, b_mask, a_mask), shifts)):
+            out[o + channel] = _scale_to_8((v & mask) >> shift, bits) if mask else (255 if channel == 3 else 0)
+    return out
+
+
+# ====================== BCn 块解码 ======================
+
+def _rgb565(c):
+    r = (c >> 11) & 31
+    g = (c >> 5) & 63
+    b = c & 31
+    return (r << 3) | (r >> 2), (g << 2) | (g >> 4), (b << 3) | (b >> 2)
+
+
+def _bc1_palette(block, four_color_only):
+    c0, c1 = struct.unpack_from("<HH", block, 0)
+    r0, g0, b0 = _rgb565(c0)
+    r1, g1, b1 = _rgb565(c1)
+    if c0 > c1 or four_color_only:
+        return (
+            (r0, g0, b0, 255), (r1, g1, b1, 255),
+            ((2 * r0 + r1) // 3, (2 * g0 + g1) // 3, (2 * b0 + b1) // 3, 255),
+            ((r0 + 2 * r1) // 3, (g0 + 2 * g1) // 3, (b0 + 2 * b1) // 3, 255),
+        )
+    return (
+        (r0, g0, b0, 255), (r1, g1, b1, 255),
+        ((r0 + r1) // 2, (g0 + g1) // 2, (b0 + b1) // 2, 255),
+        (0, 0, 0, 0),
+    )
+
+
+def _bc4_values(block):
+    """BC4 / BC3-Alpha 块 → 16 个 8 位值"""
+    a0, a1 = block[0], block[1]
+    if a0 > a1:
+        palette = [a0, a1] + [((7 - i) * a0 + i * a1) // 7 for i in range(1, 7)]
+    else:
+        palette = [a0, a1] + [((5 - i) * a0 + i * a1) // 5 for i in range(1, 5)] + [0, 255]
+    bits = int.from_bytes(block[2:8], "little")
+    return [palette[(bits >> (3 * p)) & 7] for p in range(16)]
+
+
+def _decode_bc1_block(block, with_alpha=True):
+    palette = _bc1_palette(block, not with_alpha)
+    bits = struct.unpack_from("<I", block, 4)[0]
+    return [palette[(bits >> (2 * p)) & 3] for p in range(16)]
+
+
+def _decode_bc2_block(block):
+    colors = _decode_bc1_block(block[8:16], with_alpha=False)
+    alpha_bits = int.from_bytes(block[0:8], "little")
+    return [(r, g, b, ((alpha_bits >> (4 * p)) & 15) * 17) for p, (r, g, b, _) in enumerate(colors)]
+
+
+def _decode_bc3_block(block):
+    colors = _decode_bc1_block(block[8:16], with_alpha=False)
+    alphas = _bc4_values(block[0:8])
+    return [(r, g, b, a) for (r, g, b, _), a in zip(colors, alphas)]
+
+
+def _decode_bc4_block(block):
+    return [(v, v, v, 255) for v in _bc4_values(block)]
+
+
+def _decode_bc5_block(block):
+    reds = _bc4_values(block[0:8])
+    greens = _bc4_values(block[8:16])
+    pixels = []
+    for r, g in zip(reds, greens):
+        # 法线贴图：由 XY 重建 Z，预览时比 B=0 直观
+        x = r / 127.5 - 1.0
+        y = g / 127.5 - 1.0
+        z = max(0.0, 1.0 - x * x - y * y) ** 0.5
+        pixels.append((r, g, int(round((z + 1.0) * 127.5)), 255))
+    return pixels
+
+
+def _decode_etc1_block(block):
+    hi, lo = struct.unpack(">II", block)
+    diff = (hi >> 1) & 1
+    flip = hi & 1
+    if diff:
+        def five(v):
+            return (v << 3) | (v >> 2)
+
+        def delta(v):
+            return v - 8 if v >= 4 else v
+
+        r = hi >> 27
+        g = (hi >> 19) & 31
+        b = (hi >> 11) & 31
+        r2 = r + delta((hi >> 24) & 7)
+        g2 = g + delta((hi >> 16) & 7)
+        b2 = b + delta((hi >> 8) & 7)
+        base = ((five(r), five(g), five(b)), (five(r2 & 31), five(g2 & 31), five(b2 & 31)))
+    else:
+        base = (
+            (((hi >> 28) & 15) * 17, ((hi >> 20) & 15) * 17, ((hi >> 12) & 15) * 17),
+            (((hi >> 24) & 15) * 17, ((hi >> 16) & 15) * 17, ((hi >> 8) & 15) * 17),
+        )
+    tables = (ETC1_MODIFIERS[(hi >> 5) & 7], ETC1_MODIFIERS[(hi >> 2) & 7])
+    pixels = [None] * 16
+    for x in range(4):
+        for y in range(4):
+            j = x * 4 + y
+            index = (((lo >> (j + 16)) & 1) << 1) | ((lo >> j) & 1)
+            sub = (y >= 2) if flip else (x >= 2)
+            (br, bg, bb), modifier = base[sub], tables[sub][index]
+            pixels[y * 4 + x] = (
+                min(255, max(0, br + modifier)), min(255, max(0, bg + modifier)), min(255, max(0, bb + modifier)), 255,
+            )
+    return pixels
+
+
+ETC1_MODIFIERS = (
+    (2, 8, -2, -8), (5, 17, -5, -17), (9, 29, -9, -29), (13, 42, -13, -42),
+    (18, 60, -18, -60), (24, 80, -24, -80), (33, 106, -33, -106), (47, 183, -47, -183),
+)
+
+BLOCK_DECODERS = {
+    "BC1": (8, _decode_bc1_block),
+    "BC2": (16, _decode_bc2_block),
+    "BC3": (16, _decode_bc3_block),
+    "BC4": (8, _decode_bc4_block),
+    "BC5": (16, _decode_bc5_block),
+    "ETC1": (8, _decode_etc1_block),
+}
+
+
+def decode_blocks(data, offset, width, height, kind):
+    """4x4 块压缩格式 → RGBA8；相同的块（纯色区域很常见）只解码一次"""
+    _check_size(width, height)
+    block_size, decoder = BLOCK_DECODERS[kind]
+    bw = (width + 3) // 4
+    bh = (height + 3) // 4
+    need = bw * bh * block_size
+    src = bytes(data[offset:offset + need])
+    if len(src) < need:
+        raise ValueError("压缩块数据不完整")
+    padded_w = bw * 4
+    out = bytearray(padded_w * bh * 4 * 4)
+    row_bytes = padded_w * 4
+    cache = {}
+    pos = 0
+    for by in range(bh):
+        base = by * 4 * row_bytes
+        for bx in range(bw):
+            block = src[pos:pos + block_size]
+            pos += block_size
+            rows = cache.get(block)
+            if rows is None:
+                pixels = decoder(block)
+                rows = tuple(bytes([c for px in pixels[r * 4:r * 4 + 4] for c in px]) for r in range(4))
+                if len(cache) < BLOCK_CACHE_LIMIT:
+                    cache[block] = rows
+            o = base + bx * 16
+            for r in range(4):
+                start = o + r * row_bytes
+                out[start:start + 16] = rows[r]
+    if padded_w == width and bh * 4 == height:
+        return out
+    cropped = bytearray(width * height * 4)
+    for y in range(height):
+        cropped[y * width * 4:(y + 1) * width * 4] = out[y * row_bytes:y * row_bytes + width * 4]
+    return cropped
+
+
+# ====================== DDS ======================
+
+DDPF_ALPHAPIXELS = 0x1
+DDPF_ALPHA = 0x2
+DDPF_FOURCC = 0x4
+DDPF_RGB = 0x40
+DDPF_LUMINANCE = 0x20000
+
+DDS_FOURCC = {
+    b"DXT1": "BC1", b"DXT2": "BC2", b"DXT3": "BC2", b"DXT4": "BC3", b"DXT5": "BC3",
+    b"ATI1": "BC4", b"BC4U": "BC4", b"ATI2": "BC5", b"BC5U": "BC5",
+}
+# DXGI_FORMAT → 块格式，或 (位数, R, G, B, A 掩码)
+DXGI_FORMATS = {
+    71: "BC1", 72: "BC1", 74: "BC2", 75: "BC2", 77: "BC3", 78: "BC3", 80: "BC4", 83: "BC5",
+    28: (32, 0xFF, 0xFF00, 0xFF0000, 0xFF000000),
+    29: (32, 0xFF, 0xFF00, 0xFF0000, 0xFF000000),
+    87: (32, 0xFF0000, 0xFF00, 0xFF, 0xFF000000),
+    91: (32, 0xFF0000, 0xFF00, 0xFF, 0xFF000000),
+    88: (32, 0xFF0000, 0xFF00, 0xFF, 0),
+    93: (32, 0xFF0000, 0xFF00, 0xFF, 0),
+    85: (16, 0xF800, 0x07E0, 0x001F, 0),
+    86: (16, 0x7C00, 0x03E0, 0x001F, 0x8000),
+    115: (16, 0x0F00, 0x00F0, 0x000F, 0xF000),
+    61: (8, 0xFF, 0xFF, 0xFF, 0),
+    65: (8, 0, 0, 0, 0xFF),
+}
+
+
+def decode_dds(data):
+    if len(data) < 128 or bytes(data[:4]) != b"DDS ":
+        raise UnsupportedTexture("不是 DDS 文件")
+    height, width = struct.unpack_from("<II", data, 12)
+    pf_flags, fourcc, bit_count, r_mask, g_mask, b_mask, a_mask = struct.unpack_from("<I4s5I", data, 80)
+    offset = 128
+    if pf_flags & DDPF_FOURCC:
+        if fourcc == b"DX10":
+            dxgi = struct.unpack_from("<I", data, 128)[0]
+            offset = 148
+            fmt = DXGI_FORMATS.get(dxgi)
+            if fmt is None:
+                raise UnsupportedTexture(f"不支持的 DXGI 格式: {dxgi}")
+            if isinstance(fmt, str):
+                return width, height, decode_blocks(data, offset, width, height, fmt)
+            bits, r_mask, g_mask, b_mask, a_mask = fmt
+            return width, height, decode_masked(
+                data, offset, width, height, bits, (r_mask, g_mask, b_mask, a_mask), bool(a_mask),
+                luminance=(r_mask == g_mask == b_mask != 0),
+            )
+        kind = DDS_FOURCC.get(fourcc)
+        if kind is None:
+            raise UnsupportedTexture(f"不支持的 FourCC: {fourcc!r}")
+        return width, height, decode_blocks(data, offset, width, height, kind)
+    if pf_flags & (DDPF_RGB | DDPF_LUMINANCE | DDPF_ALPHA):
+        if pf_flags & DDPF_ALPHA and not pf_flags & (DDPF_RGB | DDPF_LUMINANCE):
+            r_mask = g_mask = b_mask = 0
+        return width, height, decode_masked(
+            data, offset, width, height, bit_count, (r_mask, g_mask, b_mask, a_mask),
+            bool(pf_flags & (DDPF_ALPHAPIXELS | DDPF_ALPHA)), luminance=bool(pf_flags & DDPF_LUMINANCE),
+        )
+    raise UnsupportedTexture(f"不支持的 DDS 像素格式（flags=0x{pf_flags:X}）")
+
+
+# ====================== TGA ======================
+
+def _tga_pixels_to_rgba(raw, depth, count, palette=None):
+    if palette is not None:
+        return bytearray(b"".join([palette[i] for i in raw[:count]]))
+    if depth == 8:
+        out = bytearray(count * 4)
+        gray = raw[:count]
+        out[0::4] = gray
+        out[1::4] = gray
+        out[2::4] = gray
+        out[3::4] = b"\xff" * count
+        return out
+    if depth in (15, 16):
+        return decode_masked(raw, 0, count, 1, 16, (0x7C00, 0x03E0, 0x001F, 0x8000 if depth == 16 else 0),
+                             depth == 16)
+    bpp = depth // 8
+    return decode_masked(raw, 0, count, 1, depth, (0xFF0000, 0xFF00, 0xFF, 0xFF000000 if bpp == 4 else 0), bpp == 4)
+
+
+def _tga_rle(data, pos, count, bpp):
+    out = bytearray()
+    need = count * bpp
+    while len(out) < need:
+        if pos >= len(data):
+            raise ValueError("RLE 数据不完整")
+        header = data[pos]
+        pos += 1
+        n = (header & 0x7F) + 1
+        if header & 0x80:
+            out += bytes(data[pos:pos + bpp]) * n
+            pos += bpp
+        else:
+            out += data[pos:pos + n * bpp]
+            pos += n * bpp
+    return bytes(out[:need])
+
+
+def decode_tga(data):
+    if len(data) < 18:
+        raise UnsupportedTexture("不是 TGA 文件")
+    (id_length, cmap_type, image_type, cmap_first, cmap_length, cmap_depth,
+     _, _, width, height, depth, descriptor) = struct.unpack_from("<BBBHHBHHHHBB", data, 0)
+    if image_type not in (1, 2, 3, 9, 10, 11):
+        raise UnsupportedTexture(f"不支持的 TGA 类型: {image_type}")
+    _check_size(width, height)
+    pos = 18 + id_length
+    palette = None
+    if cmap_type == 1:
+        entry = (cmap_depth + 7) // 8
+        raw_palette = bytes(data[pos:pos + cmap_length * entry])
+        pos += cmap_length * entry
+        if image_type in (1, 9):
+            colors = _tga_pixels_to_rgba(raw_palette, cmap_depth, cmap_length)
+            palette = [b"\x00\x00\x00\xff"] * 256
+            for i in range(cmap_length):
+                if 0 <= cmap_first + i < 256:
+                    palette[cmap_first + i] = bytes(colors[i * 4:i * 4 + 4])
+    if image_type in (1, 9) and (palette is None or depth != 8):
+        raise UnsupportedTexture("只支持 8 位索引的调色板 TGA")
+    if depth not in (8, 15, 16, 24, 32):
+        raise UnsupportedTexture(f"不支持的 TGA 像素位数: {depth}")
+    bpp = (depth + 7) // 8
+    count = width * height
+    if image_type >= 9:
+        raw = _tga_rle(data, pos, count, bpp)
+    else:
+        raw = bytes(data[pos:pos + count * bpp])
+        if len(raw) < count * bpp:
+            raise ValueError("像素数据不完整")
+    rgba = _tga_pixels_to_rgba(raw, depth, count, palette)
+
+    row = width * 4
+    if descriptor & 0x10:
+        # 从右到左存储：每行内像素倒序
+        for y in range(height):
+            line = rgba[y * row:(y + 1) * row]
+            rgba[y * row:(y + 1) * row] = b"".join(line[x * 4:x * 4 + 4] for x in range(width - 1, -1, -1))
+    if not descriptor & 0x20:
+        # 默认原点在左下角
+        rgba = bytearray(b"".join(rgba[y * row:(y + 1) * row] for y in range(height - 1, -1, -1)))
+    return width, height, rgba
+
+
+# ====================== KTX ======================
+
+KTX_IDENTIFIER = b"\xabKTX 11\xbb\r\n\x1a\n"
+GL_UNSIGNED_BYTE = 0x1401
+GL_FORMATS = {
+    0x1908: (32, 0xFF, 0xFF00, 0xFF0000, 0xFF000000),   # GL_RGBA
+    0x80E1: (32, 0xFF0000, 0xFF00, 0xFF, 0xFF000000),   # GL_BGRA
+    0x1907: (24, 0xFF, 0xFF00, 0xFF0000, 0),            # GL_RGB
+    0x1909: (8, 0xFF, 0xFF, 0xFF, 0),                   # GL_LUMINANCE
+    0x1906: (8, 0, 0, 0, 0xFF),                         # GL_ALPHA
+}
+GL_COMPRESSED = {
+    0x8D64: "ETC1",     # GL_ETC1_RGB8_OES
+    0x83F0: "BC1", 0x83F1: "BC1", 0x83F2: "BC2", 0x83F3: "BC3",
+}
+
+
+def decode_ktx(data):
+    if len(data) < 64 or bytes(data[:12]) != KTX_IDENTIFIER:
+        raise UnsupportedTexture("不是 KTX 文件")
+    endian = "<" if struct.unpack_from("<I", data, 12)[0] == 0x04030201 else ">"
+    (gl_type, _, gl_format, internal_format, _, width, height, _, _, _, _,
+     kv_bytes) = struct.unpack_from(endian + "12I", data, 16)
+    kv = bytes(data[64:64 + kv_bytes])
+    offset = 64 + kv_bytes + 4   # 跳过第一层的 imageSize
+    height = max(1, height)
+    if gl_type == 0:
+        kind = GL_COMPRESSED.get(internal_format)
+        if kind is None:
+            raise UnsupportedTexture(f"不支持的 KTX 压缩格式: 0x{internal_format:X}")
+        rgba = decode_blocks(data, offset, width, height, kind)
+    else:
+        fmt = GL_FORMATS.get(gl_format)
+        if gl_type != GL_UNSIGNED_BYTE or fmt is None:
+            raise UnsupportedTexture(f"不支持的 KTX 像素格式: type=0x{gl_type:X} format=0x{gl_format:X}")
+        bits, r_mask, g_mask, b_mask, a_mask = fmt
+        row = width * bits // 8
+        padded = (row + 3) // 4 * 4     # 每行按 4 字节对齐
+        if padded != row:
+            data = b"".join(bytes(data[offset + y * padded:offset + y * padded + row]) for y in range(height))
+            offset = 0
+        rgba = decode_masked(data, offset, width, height, bits, (r_mask, g_mask, b_mask, a_mask), bool(a_mask),
+                             luminance=(r_mask == g_mask == b_mask != 0))
+    if b"T=u" in kv:
+        row = width * 4
+        rgba = bytearray(b"".join(rgba[y * row:(y + 1) * row] for y in range(height - 1, -1, -1)))
+    return width, height, rgba
+
+
+# ====================== 入口 ======================
+
+DECODERS = {".dds": decode_dds, ".tga": decode_tga, ".ktx": decode_ktx}
+
+
+def decode_texture(data, ext: str = None):
+    """返回 (宽, 高, RGBA8 像素)；ext 为空时按文件头判断"""
+    if not ext:
+        head = bytes(data[:12])
+        ext = ".dds" if head[:4] == b"DDS " else ".ktx" if head == KTX_IDENTIFIER else ".tga"
+    decoder = DECODERS.get(ext.lower())
+    if decoder is None:
+        raise UnsupportedTexture(f"不支持的纹理类型: {ext}")
+    return decoder(data)
+
+
+def texture_to_png(data, ext: str = None) -> bytes:
+    width, height, rgba = decode_texture(data, ext)
+    return encode_png(width, height, rgba)
+
+
+def convert_to_cache(data, ext: str, cache_path: str):
+    """进程池里执行：解码并写入缓存，返回 (状态, 说明)"""
+    try:
+        png = texture_to_png(data, ext)
+    except UnsupportedTexture as e:
+        return STATUS_UNSUPPORTED, str(e)
+    except (ValueError, struct.error, IndexError, KeyError) as e:
+        return STATUS_FAILED, f"解码失败: {e}"
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = f"{cache_path}.{os.getpid()}.part"
+    with open(tmp_path, "wb") as f:
+        f.write(png)
+    os.replace(tmp_path, cache_path)
+    return STATUS_CONVERTED, ""
+
+
+# ====================== 并行转换 + 缓存 ======================
+
+class TextureConverter:
+    """
+    submit(数据, 扩展名, 内容 MD5, 目标路径) 立即返回：缓存里已有就直接放到目标位置，
+    否则交给进程池，完成后再放。目标路径可以是 AssetPack 的包内路径（此时需要传入 pack）。
+    close() 等待全部完成，返回各状态计数；失败 / 不支持的记在 problems 里。
+    """
+
+    def __init__(self, cache_dir: str = "", workers: int = None, pack=None, link_mode: str = "reflink"):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.workers = workers or os.cpu_count() or 1
+        self.pack = pack
+        self.materializer = Materializer(link_mode)
+        self.counts = dict.fromkeys(STATUSES, 0)
+        self.problems = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.workers * MAX_PENDING_PER_WORKER)
+        self._pending = {}      # 内容 MD5 → [(目标路径, 源名称)]，同一内容只转一次
+        self._pool = None
+
+    def _place(self, cache_path, dst):
+        if is_pack_path(dst):
+            _, name = split_pack_path(dst)
+            category, _, filename = name.rpartition("/")
+            with open(cache_path, "rb") as f:
+                png = f.read()
+            self.pack.add(category, filename, png, hashlib.md5(png).hexdigest(), ".png")
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(dst)), exist_ok=True)
+        if os.path.lexists(dst):
+            os.remove(dst)
+        self.materializer.place(cache_path, dst)
+
+    def _finish(self, file_hash, status, message):
+        cache_path = cache_path_for(self.cache_dir, file_hash)
+        with self._lock:
+            targets = self._pending.pop(file_hash, [])
+        for dst, source in targets:
+            if status in (STATUS_CONVERTED, STATUS_CACHED):
+                try:
+                    self._place(cache_path, dst)
+                except OSError as e:
+                    status, message = STATUS_FAILED, f"写入失败: {e}"
+            with self._lock:
+                self.counts[status] += 1
+                if message:
+                    self.problems.append((source, status, message))
+            # 同一内容的后续目标都算命中缓存
+            if status == STATUS_CONVERTED:
+                status = STATUS_CACHED
+
+    def submit(self, data, ext: str, file_hash: str, dst: str, source: str = ""):
+        if ext.lower() not in SUPPORTED_EXTS:
+            return
+        source = source or dst
+        with self._lock:
+            waiting = self._pending.get(file_hash)
+            if waiting is not None:
+                waiting.append((dst, source))
+                return
+            self._pending[file_hash] = [(dst, source)]
+        cache_path = cache_path_for(self.cache_dir, file_hash)
+        if os.path.exists(cache_path):
+            self._finish(file_hash, STATUS_CACHED, "")
+            return
+        self._slots.acquire()
+        with self._lock:
+            if self._pool is None:
+                # 提交方是多线程的，fork 出来的子进程可能带着别的线程持有的锁，统一用 spawn
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+            pool = self._pool
+        try:
+            future = pool.submit(convert_to_cache, bytes(data), ext.lower(), cache_path)
+        except BaseException:
+            self._slots.release()
+            raise
+
+        def done(f):
+            self._slots.release()
+            try:
+                status, message = f.result()
+            except Exception as e:
+                status, message = STATUS_FAILED, f"转换进程异常: {e}"
+            self._finish(file_hash, status, message)
+
+        future.add_done_callback(done)
+
+    def close(self, cancel: bool = False):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=cancel)
+        return dict(self.counts)
+
+    def summary(self) -> str:
+        parts = [f"{STATUS_LABELS[s]} {self.counts[s]}" for s in STATUSES if self.counts[s]]
+        return "，".join(parts) if parts else "没有纹理"
+
+
+# ====================== 独立运行：转换已提取的目录 ======================
+
+def iter_texture_files(inputs):
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                for name in sorted(files):
+                    if os.path.splitext(name)[1].lower() in SUPPORTED_EXTS:
+                        yield item, os.path.join(root, name)
+        elif os.path.splitext(item)[1].lower() in SUPPORTED_EXTS:
+            yield os.path.dirname(os.path.abspath(item)), item
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DDS / KTX / TGA 批量转 PNG（进程池并行，按内容缓存）")
+    parser.add_argument("inputs", nargs="+", help="纹理文件或目录（目录递归查找）")
+    parser.add_argument("-o", "--output", default="", help="PNG 输出目录（保持相对路径）；默认写在原文件旁边")
+    parser.add_argument("--cache", default="", help=f"转换结果缓存目录，默认 {default_cache_dir()}")
+    parser.add_argument("-j", "--jobs", type=int, default=0, help="进程数，默认 CPU 核数")
+    args = parser.parse_args()
+
+    converter = TextureConverter(args.cache, args.jobs or None)
+    total = 0
+    for root, path in iter_texture_files(args.inputs):
+        rel = os.path.relpath(path, root)
+        base = os.path.join(args.output, rel) if args.output else path
+        dst = os.path.splitext(base)[0] + ".png"
+        with open(path, "rb") as f:
+            data = f.read()
+        converter.submit(data, os.path.splitext(path)[1], hashlib.md5(data).hexdigest(), dst, path)
+        total += 1
+    converter.close()
+    for source, status, message in converter.problems:
+        print(f"{STATUS_LABELS[status]}: {source} - {message}")
+    print(f"共 {total} 个纹理：{converter.summary()}")
+    print(f"缓存目录: {converter.cache_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+import threading
+
+# ====================== 线程数自动调优 ======================
+# 线程数写死（PPKUnlocker 4、NpkUnlocker / GUI 8）只适合调参时那台机器。
+# 自动模式下线程池按上限建好，但每个任务先要拿到一个“名额”（ResizableSemaphore），
+# WorkerAutotuner 按短窗口统计吞吐量，爬山式增减名额：
+#   从 os.cpu_count() 开始，沿一个方向按步长试探，吞吐不再提升就试最优值另一侧；
+#   两侧都不更好时步长减半，再试最优值两侧，直到步长 1 的两侧也都试过才收敛。
+# 每个窗口同时记录进程 CPU 时间：吞吐到顶时每个线程平均 CPU 利用率很低，说明线程都在等磁盘，
+# 判定为“磁盘 / I/O 受限”，否则为“CPU 受限”。
+
+AUTO = 0                    # 线程数为 0 表示自动
+WINDOW_SECONDS = 0.5        # 每个测量窗口至少多长
+MIN_WINDOW_ITEMS = 4        # 每个测量窗口至少完成多少个任务
+IMPROVE_RATIO = 1.05        # 吞吐提升超过 5% 才算有效
+IO_BOUND_CPU = 0.6          # 每线程平均 CPU 利用率低于此值视为在等 I/O
+MAX_WORKERS_FACTOR = 2      # 线程池上限 = CPU 数 × 此值
+
+
+def parse_threads(value) -> int:
+    """命令行 / 配置里的线程数："auto" 或 0 → AUTO，其余为正整数"""
+    if str(value).strip().lower() in ("auto", "0"):
+        return AUTO
+    threads = int(value)
+    if threads < 1:
+        raise ValueError(f"线程数必须为正整数或 auto: {value}")
+    return threads
+
+
+def cpu_count() -> int:
+    return os.cpu_count() or 1
+
+
+class ResizableSemaphore:
+    """可以在运行中调整名额的信号量；缩小时已拿到名额的任务照常跑完，只是不再放新任务进来"""
+
+    def __init__(self, limit: int):
+        self._cond = threading.Condition()
+        self._limit = max(1, limit)
+        self._active = 0
+
+    @property
+    def limit(self) -> int:
+        return self._limit
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    def set_limit(self, limit: int):
+        with self._cond:
+            self._limit = max(1, limit)
+            self._cond.notify_all()
+
+    def acquire(self):
+        with self._cond:
+            while self._active >= self._limit:
+                self._cond.wait()
+            self._active += 1
+
+    def release(self):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+class WorkerAutotuner:
+    """
+    用法：线程池按 max_workers 建，任务用 run(fn, *args) 提交；
+    run() 先拿名额再执行，完成后按 measure(result) 记入吞吐（不给 measure 时按任务数）。
+    log(message) 汇报每次调整和最终结果。
+    """
+
+    def __init__(self, min_workers: int = 1, max_workers: int = None, start: int = None,
+                 window: float = WINDOW_SECONDS, measure=None, log=None):
+        self.min_workers = max(1, min_workers)
+        self.max_workers = max(self.min_workers, max_workers or cpu_count() * MAX_WORKERS_FACTOR)
+        start = start or cpu_count()
+        self.workers = min(self.max_workers, max(self.min_workers, start))
+        self.window = window
+        self.measure = measure
+        self.log = log or (lambda message: None)
+        self.gate = ResizableSemaphore(self.workers)
+        self.history = []           # [(线程数, 吞吐/秒, 每线程 CPU 利用率)]
+        self.converged = False
+        self.bottleneck = ""
+        self._lock = threading.Lock()
+        self._best = None           # (线程数, 吞吐, CPU 利用率)
+        self._direction = 1
+        self._step = max(1, self.workers // 2)
+        self._measured = set()      # 已经测过的线程数，不重复试探
+        self._start_window()
+
+    def _start_window(self):
+        self._window_start = time.perf_counter()
+        self._window_cpu = time.process_time()
+        self._window_amount = 0
+        self._window_items = 0
+
+    def run(self, fn, *args, **kwargs):
+        with self.gate:
+            result = fn(*args, **kwargs)
+        self.record(self.measure(result) if self.measure is not None else 1)
+        return result
+
+    def record(self, amount: int = 1):
+        with self._lock:
+            self._window_amount += amount
+            self._window_items += 1
+            if self.converged or self._window_items < MIN_WINDOW_ITEMS:
+                return
+            elapsed = time.perf_counter() - self._window_start
+            if elapsed < self.window:
+                return
+            # 全是 0 字节（失败 / 空帧）的窗口退回按任务数统计
+            amount = self._window_amount or self._window_items
+            throughput = amount / elapsed
+            cpu = (time.process_time() - self._window_cpu) / elapsed / self.workers
+            self.history.append((self.workers, throughput, cpu))
+            self._adjust(throughput, cpu)
+            self._start_window()
+
+    def _set_workers(self, workers: int):
+        self.workers = workers
+        self.gate.set_limit(workers)
+
+    def _clamp(self, workers: int) -> int:
+        return min(self.max_workers, max(self.min_workers, workers))
+
+    def _finish(self):
+        best_workers, _, best_cpu = self._best
+        self._set_workers(best_workers)
+        self.converged = True
+        self.bottleneck = "磁盘 / I/O 受限" if best_cpu < IO_BOUND_CPU else "CPU 受限"
+        self.log(self.summary())
+
+    def _adjust(self, throughput: float, cpu: float):
+        self._measured.add(self.workers)
+        if self._best is None or throughput > self._best[1] * IMPROVE_RATIO:
+            self._best = (self.workers, throughput, cpu)
+        best_workers = self._best[0]
+        # 先沿当前方向、再试另一侧；两侧都测过（或顶到上下限）才减半步长
+        while self._step >= 1:
+            for direction in (self._direction, -self._direction):
+                target = self._clamp(best_workers + direction * self._step)
+                if target not in self._measured:
+                    self._direction = direction
+                    self._set_workers(target)
+                    return
+            self._step //= 2
+        self._finish()
+
+    def summary(self) -> str:
+        if self._best is None:
+            return f"自动线程数: {self.workers}（任务太少，未完成测量）"
+        workers, throughput, cpu = self._best
+        state = self.bottleneck if self.converged else "任务结束前未收敛"
+        rate = f"{throughput / 1024 / 1024:.1f} MB/s" if self.measure is not None else f"{throughput:.1f} 个/s"
+        return (f"自动线程数: {workers}（吞吐 {rate}，每线程 CPU {cpu * 100:.0f}%，"
+                f"{state}，共试探 {len(self.history)} 个窗口）")
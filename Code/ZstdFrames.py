@@ -0,0 +1,448 @@
+# -*- coding: utf-8 -*-
+import os
+import mmap
+import threading
+from array import array
+from bisect import bisect_right
+
+# ====================== Zstd 帧边界解析（不解压） ======================
+# 按 RFC 8878 解析帧头，再逐个跳过块头（3 字节：最后一块标志 / 块类型 / 块大小），
+# 得到每一帧精确的结束位置。大部分伪造的魔数、被截断的帧在这里就会被识别出来，
+# 也就可以直接对压缩数据做哈希比较，而不必先解压。
+
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+DICT_MAGIC = b"\x37\xa4\x30\xec"    # Zstd 字典文件魔数，后面 4 字节为 Dictionary_ID
+BLOCK_MAX_SIZE = 128 * 1024           # 单个块的解压 / 压缩大小上限
+WINDOW_SIZE_MAX = 1 << 27             # 解压器默认允许的最大窗口（128 MB），超过的帧解不开，按伪造魔数处理
+FCS_FIELD_SIZES = (0, 2, 4, 8)        # Frame_Content_Size 字段长度（按 FCS 标志位）
+DICT_ID_FIELD_SIZES = (0, 1, 2, 4)    # Dictionary_ID 字段长度
+
+MAX_OUTPUT_SIZE = 512 * 1024 * 1024  # 单帧解压后大小上限（帧头声明的和未声明时实际解出的都受限）
+STREAM_CHUNK_SIZE = 1024 * 1024      # 帧头没有声明解压后大小时，按块流式解压
+
+BLOCK_RAW = 0
+BLOCK_RLE = 1
+BLOCK_COMPRESSED = 2
+
+
+class FrameHeader:
+    __slots__ = ("header_size", "content_size", "window_size", "dict_id", "has_checksum", "single_segment")
+
+    def __init__(self, header_size, content_size, window_size, dict_id, has_checksum, single_segment):
+        self.header_size = header_size        # 含 4 字节魔数
+        self.content_size = content_size      # 解压后大小，帧头未写时为 None
+        self.window_size = window_size
+        self.dict_id = dict_id
+        self.has_checksum = has_checksum
+        self.single_segment = single_segment
+
+
+def parse_frame_header(data, pos: int = 0):
+    """解析 pos 处的帧头；不是合法帧头（魔数不对、保留位非 0、数据不够）时返回 None"""
+    end = len(data)
+    if pos + 5 > end or data[pos:pos + 4] != ZSTD_MAGIC:
+        return None
+    fhd = data[pos + 4]
+    fcs_flag = fhd >> 6
+    single_segment = bool(fhd & 0x20)
+    if fhd & 0x08:  # 保留位必须为 0
+        return None
+    has_checksum = bool(fhd & 0x04)
+    dict_flag = fhd & 0x03
+
+    p = pos + 5
+    window_size = None
+    if not single_segment:
+        if p >= end:
+            return None
+        wd = data[p]
+        exponent = wd >> 3
+        window_base = 1 << (10 + exponent)
+        window_size = window_base + (window_base >> 3) * (wd & 0x07)
+        p += 1
+
+    dict_size = DICT_ID_FIELD_SIZES[dict_flag]
+    fcs_size = FCS_FIELD_SIZES[fcs_flag]
+    if fcs_flag == 0 and single_segment:
+        fcs_size = 1
+    if p + dict_size + fcs_size > end:
+        return None
+
+    dict_id = int.from_bytes(data[p:p + dict_size], "little") if dict_size else 0
+    p += dict_size
+
+    content_size = None
+    if fcs_size:
+        content_size = int.from_bytes(data[p:p + fcs_size], "little")
+        if fcs_size == 2:
+            content_size += 256
+        p += fcs_size
+    if single_segment:
+        window_size = content_size
+    elif window_size > WINDOW_SIZE_MAX:
+        return None
+
+    return FrameHeader(p - pos, content_size, window_size, dict_id, has_checksum, single_segment)
+
+
+def frame_end(data, pos: int = 0, header: FrameHeader = None):
+    """
+    返回 pos 处这一帧的结束偏移（不含），帧不完整或格式错误时返回 None。
+    只读取帧头和每个块的 3 字节块头，开销与帧里的块数成正比，与数据量无关。
+    """
+    if header is None:
+        header = parse_frame_header(data, pos)
+        if header is None:
+            return None
+    end = len(data)
+    p = pos + header.header_size
+    block_limit = BLOCK_MAX_SIZE
+    if header.window_size:
+        block_limit = min(BLOCK_MAX_SIZE, header.window_size)
+    while True:
+        if p + 3 > end:
+            return None
+        bh = data[p] | (data[p + 1] << 8) | (data[p + 2] << 16)
+        p += 3
+        last = bh & 1
+        block_type = (bh >> 1) & 3
+        block_size = bh >> 3
+        if block_type == BLOCK_RLE:
+            p += 1
+        elif block_type == 3 or block_size > block_limit:
+            return None
+        else:
+            p += block_size
+        if p > end:
+            return None
+        if last:
+            break
+    if header.has_checksum:
+        p += 4
+        if p > end:
+            return None
+    return p
+
+
+def frame_candidates(data, start: int = 0, stop: int = None):
+    """[start, stop) 内每个魔数位置上结构合法的帧：[(起始偏移, 结束偏移, 帧头)]，可能互相重叠"""
+    if stop is None:
+        stop = len(data)
+    candidates = []
+    pos = start
+    while True:
+        pos = data.find(ZSTD_MAGIC, pos, stop)
+        if pos == -1:
+            return candidates
+        header = parse_frame_header(data, pos)
+        if header is not None:
+            end = frame_end(data, pos, header)
+            if end is not None and end <= stop:
+                candidates.append((pos, end, header))
+        pos += len(ZSTD_MAGIC)
+
+
+def frame_decodes(data, candidate) -> bool:
+    """真正解压一遍确认候选帧有效（只用于互相重叠、光看结构分不出真假的候选）"""
+    import zstandard as zstd
+    s, e, header = candidate
+    try:
+        dobj = get_decompressor(header.dict_id).decompressobj()
+        dobj.decompress(data[s:e])
+    except zstd.ZstdError:
+        return False
+    return dobj.eof and not dobj.unused_data
+
+
+def schedule_frames(candidates):
+    """
+    带权区间调度：从可能重叠的候选里选出互不重叠的一组，先取帧数最多，再取覆盖字节数最多。
+    吞掉若干真实帧的伪帧输在帧数上，藏在真实帧内部的伪帧输在覆盖字节数上。
+    """
+    candidates = sorted(candidates, key=lambda c: c[1])
+    ends = [c[1] for c in candidates]
+    best = [(0, 0)] * (len(candidates) + 1)    # best[i]：前 i 个候选的最优 (帧数, 覆盖字节数)
+    prev = [0] * len(candidates)
+    for i, (s, e, _) in enumerate(candidates):
+        prev[i] = bisect_right(ends, s, 0, i)
+        count, covered = best[prev[i]]
+        best[i + 1] = max(best[i], (count + 1, covered + (e - s)))
+    chosen = []
+    i = len(candidates)
+    while i > 0:
+        s, e, _ = candidates[i - 1]
+        if best[i] == best[i - 1]:
+            i -= 1
+        else:
+            chosen.append(candidates[i - 1])
+            i = prev[i - 1]
+    chosen.reverse()
+    return chosen
+
+
+def find_frames(data, start: int = 0, stop: int = None):
+    """
+    [start, stop) 内的帧：[(起始偏移, 结束偏移, 帧头)]，按偏移排序且互不重叠。
+    随机字节偶尔也能通过结构校验（帧内数据里的魔数、填充区里伪造的魔数），
+    所以把互相重叠的候选归成一簇：簇内先解压验证，留下能解开的，再做区间调度。
+    不重叠的候选（绝大多数）不解压。
+    """
+    frames = []
+    cluster = []
+    cluster_end = -1
+
+    def flush():
+        if len(cluster) == 1:
+            frames.append(cluster[0])
+        elif cluster:
+            decoded = [c for c in cluster if frame_decodes(data, c)]
+            # 全都解不开（例如需要外部字典的帧）时按结构结果调度
+            frames.extend(schedule_frames(decoded or cluster))
+
+    for candidate in frame_candidates(data, start, stop):
+        if candidate[0] >= cluster_end:
+            flush()
+            cluster = []
+        cluster.append(candidate)
+        cluster_end = max(cluster_end, candidate[1])
+    flush()
+    return frames
+
+
+def frame_spans(data):
+    """所有帧的 [(起始偏移, 结束偏移)]"""
+    return [(s, e) for s, e, _ in find_frames(data)]
+
+
+# ====================== Zstd 字典 ======================
+# 帧头带 Dictionary_ID 的帧必须用同一个字典才能解压。字典来源：
+#   1. 配置的字典目录（以 37 A4 30 EC 开头的文件，文件名不限）
+#   2. 容器自身里夹带的字典（同样以 37 A4 30 EC 开头，到下一个帧 / 字典魔数为止）
+# 每个字典只编译一次（ZstdCompressionDict 内部的解压字典），所有线程共用；同一 ID 先加入的优先。
+
+class DictionaryStore:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._dicts = {}     # 字典 ID → ZstdCompressionDict
+        self._sources = {}   # 字典 ID → 来源（文件路径 / 容器路径@偏移）
+        self._loaded_dirs = set()
+        self._harvested = set()
+
+    def add(self, blob, source: str = ""):
+        """加入一个字典，返回字典 ID；不是有效字典时返回 None"""
+        if len(blob) <= 8 or bytes(blob[:4]) != DICT_MAGIC:
+            return None
+        dict_id = int.from_bytes(blob[4:8], "little")
+        if dict_id == 0:
+            return None
+        import zstandard as zstd
+        with self._lock:
+            if dict_id in self._dicts:
+                return dict_id
+            try:
+                compiled = zstd.ZstdCompressionDict(bytes(blob), dict_type=zstd.DICT_TYPE_FULLDICT)
+                # 在锁内把解压字典编译好，之后各线程的解压器只引用它
+                zstd.ZstdDecompressor(dict_data=compiled).decompressobj()
+            except zstd.ZstdError:
+                return None
+            self._dicts[dict_id] = compiled
+            self._sources[dict_id] = source
+        return dict_id
+
+    def load_dir(self, folder) -> int:
+        """加载目录（含子目录）里的所有字典文件，返回新加入的字典数；同一目录只加载一次"""
+        folder = os.path.abspath(str(folder))
+        with self._lock:
+            if folder in self._loaded_dirs:
+                return 0
+            self._loaded_dirs.add(folder)
+        before = len(self)
+        for root, _, files in os.walk(folder):
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                try:
+                    with open(path, "rb") as f:
+                        if f.read(len(DICT_MAGIC)) != DICT_MAGIC:
+                            continue
+                        blob = DICT_MAGIC + f.read()
+                except OSError:
+                    continue
+                self.add(blob, path)
+        return len(self) - before
+
+    def harvest(self, data, source: str = "", positions=None) -> int:
+        """
+        收集容器数据里夹带的字典，返回新加入的字典数。
+        positions 为已知的字典魔数位置（例如映射模式下分块扫描得到的），给出时不再整段查找。
+        """
+        before = len(self)
+        candidates = iter(positions) if positions is not None else None
+        pos = data.find(DICT_MAGIC) if candidates is None else next(candidates, -1)
+        while pos != -1:
+            end = len(data)
+            for magic in (ZSTD_MAGIC, DICT_MAGIC):
+                nxt = data.find(magic, pos + 8)
+                if nxt != -1:
+                    end = min(end, nxt)
+            self.add(data[pos:end], f"{source}@0x{pos:08X}")
+            if candidates is None:
+                pos = data.find(DICT_MAGIC, end)
+            else:
+                pos = next((p for p in candidates if p >= end), -1)
+        return len(self) - before
+
+    def harvest_file(self, path) -> int:
+        """用 mmap 收集文件里的字典，不把整个文件读进内存；同一文件只收集一次"""
+        path = os.path.abspath(str(path))
+        with self._lock:
+            if path in self._harvested:
+                return 0
+            self._harvested.add(path)
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return 0
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return self.harvest(mm, path)
+
+    def get(self, dict_id: int):
+        with self._lock:
+            return self._dicts.get(dict_id)
+
+    def source(self, dict_id: int) -> str:
+        with self._lock:
+            return self._sources.get(dict_id, "")
+
+    def __contains__(self, dict_id):
+        with self._lock:
+            return dict_id in self._dicts
+
+    def __len__(self):
+        with self._lock:
+            return len(self._dicts)
+
+
+DICTIONARIES = DictionaryStore()
+
+
+# ====================== 解压上下文池 ======================
+# ZstdDecompressor 内部的解压上下文可以反复使用，但不能多线程同时使用：
+# 每个工作线程各保留一个（按字典 ID 分开），不再每帧新建。
+
+_local = threading.local()
+
+
+def get_decompressor(dict_id: int = 0):
+    """当前线程复用的 ZstdDecompressor（zstandard 在第一次调用时才导入）；dict_id 非 0 时带上对应字典"""
+    dctxs = getattr(_local, "dctxs", None)
+    if dctxs is None:
+        dctxs = _local.dctxs = {}
+    dctx = dctxs.get(dict_id)
+    if dctx is None:
+        import zstandard as zstd
+        if dict_id:
+            dict_data = DICTIONARIES.get(dict_id)
+            if dict_data is None:
+                raise zstd.ZstdError(f"缺少 Zstd 字典（ID {dict_id}）")
+            dctx = zstd.ZstdDecompressor(dict_data=dict_data)
+        else:
+            dctx = zstd.ZstdDecompressor()
+        dctxs[dict_id] = dctx
+    return dctx
+
+
+def decompress_frame(data, pos: int = 0, max_output_size: int = MAX_OUTPUT_SIZE):
+    """
+    解压 pos 处的一帧，返回 (解压数据, 帧结束偏移)。帧的结束位置由块头确定（见 frame_end），
+    帧头写了解压后大小时一次分配好输出缓冲区直接解压；没写时流式解压，超过 max_output_size 即报错，
+    不会因为损坏的数据无限制地分配内存。只传入这一帧的数据，不再把帧后面的整段数据复制一遍。
+    """
+    import zstandard as zstd
+    header = parse_frame_header(data, pos)
+    if header is None:
+        raise zstd.ZstdError("不是有效的 Zstd 帧头")
+    end = frame_end(data, pos, header)
+    if end is None:
+        raise zstd.ZstdError("帧数据不完整")
+    if header.content_size is not None and header.content_size > max_output_size:
+        raise zstd.ZstdError(f"帧声明的解压后大小 {header.content_size} 超过上限 {max_output_size}")
+    dctx = get_decompressor(header.dict_id)
+    with memoryview(data) as view:
+        frame = view[pos:end]
+        if header.content_size is not None:
+            return dctx.decompress(frame), end
+        # 按输出大小分块读取：高压缩比的数据也不会一次解出超过 STREAM_CHUNK_SIZE
+        chunks = []
+        total = 0
+        with dctx.stream_reader(frame, read_across_frames=False) as reader:
+            while True:
+                chunk = reader.read(STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                total += len(chunk)
+                if total > max_output_size:
+                    raise zstd.ZstdError(f"解压后大小超过上限 {max_output_size}")
+                chunks.append(chunk)
+    return b"".join(chunks), end
+
+
+# ====================== 批量解压 ======================
+# zstandard 的 multi_decompress_to_buffer 在 C 线程里一次解压一整批帧，全程不持有 GIL。
+# 批次直接引用容器数据里的帧区间（BufferWithSegments，不复制）；结果是一整块输出缓冲区，
+# 每帧一个 BufferSegment，memoryview 后即可交给哈希 / 类型识别 / 写入，也不复制。
+# 只有帧头写了解压后大小、且不超过 BATCH_FRAME_MAX_OUTPUT 的帧进入批次，同一批的帧字典 ID 相同；
+# 其余的帧（以及解压失败的批次里的帧）由调用方按单帧路径处理。
+
+BATCH_MAX_FRAMES = 256                    # 每批最多多少帧
+BATCH_MAX_OUTPUT = 32 * 1024 * 1024       # 每批解压后总大小上限（决定同时驻留的输出内存）
+BATCH_FRAME_MAX_OUTPUT = 4 * 1024 * 1024  # 超过此大小的帧走单帧路径（可以中途响应停止）
+
+
+class FrameBatch:
+    __slots__ = ("dict_id", "items", "output_size")
+
+    def __init__(self, dict_id):
+        self.dict_id = dict_id
+        self.items = []         # [(key, 起始偏移, 结束偏移, 解压后大小)]
+        self.output_size = 0
+
+
+def plan_batches(data, frames, max_frames: int = BATCH_MAX_FRAMES, max_output: int = BATCH_MAX_OUTPUT,
+                 frame_max_output: int = BATCH_FRAME_MAX_OUTPUT):
+    """
+    frames 为 [(key, 起始偏移)]，返回 (批次列表, 不适合批量的 [(key, 起始偏移)])，都保持原有顺序。
+    帧头无效 / 不完整、没有写解压后大小、太大、缺字典的帧归入后者。
+    """
+    batches = []
+    singles = []
+    open_batches = {}
+    for key, pos in frames:
+        header = parse_frame_header(data, pos)
+        end = frame_end(data, pos, header) if header is not None else None
+        if (end is None or header.content_size is None or header.content_size > frame_max_output
+                or (header.dict_id and header.dict_id not in DICTIONARIES)):
+            singles.append((key, pos))
+            continue
+        size = header.content_size
+        batch = open_batches.get(header.dict_id)
+        if batch is None or len(batch.items) >= max_frames or batch.output_size + size > max_output:
+            batch = open_batches[header.dict_id] = FrameBatch(header.dict_id)
+            batches.append(batch)
+        batch.items.append((key, pos, end, size))
+        batch.output_size += size
+    return batches, singles
+
+
+def decompress_batch(data, batch: FrameBatch, threads: int = 0):
+    """
+    解压整批，返回与 batch.items 一一对应的 BufferSegment 序列（BufferWithSegmentsCollection）。
+    任何一帧出错都会让整批抛出 ZstdError。threads 为 zstandard 内部的 C 线程数（0 为调用线程自己解压）。
+    """
+    import zstandard as zstd
+    segments = array("Q")
+    for _, start, end, _ in batch.items:
+        segments.append(start)
+        segments.append(end - start)
+    frames = zstd.BufferWithSegments(data, segments.tobytes())
+    return get_decompressor(batch.dict_id).multi_decompress_to_buffer(frames, threads=threads)
+
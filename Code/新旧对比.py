@@ -1,87 +1,401 @@
 import os
+import time
 import hashlib
-import shutil
+import sqlite3
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-def get_file_md5(file_path):
-    """计算文件的MD5哈希值，增加错误处理"""
+from OutputMaterializer import MODES, Materializer, plan_names
+
+# ==== 提速参数 ====
+READ_SIZE = 1024 * 1024              # 每次读取 1 MB（原来 4096 字节）
+HASH_THREADS = min(32, (os.cpu_count() or 1) + 4)  # hashlib 计算时会释放 GIL，读盘和计算都能并行
+PROGRESS_INTERVAL = 0.5              # 进度刷新间隔（秒）
+HASH_CACHE_NAME = ".hash_cache.sqlite3"  # 每个目录根下的哈希缓存（相对路径 + 大小 + 修改时间 → 哈希）
+HASH_CACHE_VERSION = 2               # 缓存表结构版本，不一致时重建
+PARTIAL_BLOCK = 64 * 1024            # 部分哈希：只读文件头、尾各 64 KB
+PARTIAL_MIN_SIZE = PARTIAL_BLOCK * 2 # 不超过这个大小的文件部分哈希就是全量哈希，直接算全量
+OUTPUT_DIR_NAME = "NEW"              # 新增文件放在 新文件夹/NEW
+
+# 可选摘要算法：md5 与原来结果一致；blake2b / sha1 通常更快；装了 xxhash 还可以用 xxh3（最快）
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+HASH_ALGOS = {
+    "md5": hashlib.md5,
+    "sha1": hashlib.sha1,
+    "blake2b": hashlib.blake2b,
+}
+if xxhash is not None:
+    HASH_ALGOS["xxh3"] = xxhash.xxh3_128
+    HASH_ALGOS["xxh64"] = xxhash.xxh64
+
+class Progress:
+    """多线程共享的进度计数，定时在同一行打印文件数和吞吐量"""
+    def __init__(self, label):
+        self.label = label
+        self.files = 0
+        self.bytes = 0
+        self.cached = 0
+        self.total_files = 0
+        self.start = time.perf_counter()
+        self._last = 0.0
+        self._lock = threading.Lock()
+    
+    def add_total(self, n):
+        with self._lock:
+            self.total_files += n
+    
+    def update(self, nbytes, cached=False):
+        with self._lock:
+            self.files += 1
+            self.bytes += nbytes
+            if cached:
+                self.cached += 1
+            now = time.perf_counter()
+            if now - self._last < PROGRESS_INTERVAL:
+                return
+            self._last = now
+            line = self.status_line()
+        print("\r" + line, end="", flush=True)
+    
+    def status_line(self):
+        elapsed = max(time.perf_counter() - self.start, 1e-6)
+        mb = self.bytes / 1024 / 1024
+        return (f"{self.label}: {self.files}/{self.total_files} 个文件（缓存命中 {self.cached}）  "
+                f"{mb:.1f} MB  {mb / elapsed:.1f} MB/s")
+    
+    def finish(self):
+        print("\r" + self.status_line(), flush=True)
+
+def get_file_md5(file_path, algo="md5", progress=None):
+    """计算文件的哈希值（默认MD5），大块读取，增加错误处理"""
     if not os.path.isfile(file_path):
         print(f"警告：{file_path} 不是有效的文件，跳过MD5计算")
         return None
     
-    hash_md5 = hashlib.md5()
+    hash_md5 = HASH_ALGOS[algo]()
+    buf = bytearray(READ_SIZE)
+    view = memoryview(buf)
+    total = 0
     try:
-        with open(file_path, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                hash_md5.update(chunk)
+        with open(file_path, "rb", buffering=0) as f:
+            while True:
+                n = f.readinto(buf)
+                if not n:
+                    break
+                hash_md5.update(view[:n])
+                total += n
+        if progress is not None:
+            progress.update(total)
         return hash_md5.hexdigest()
     except Exception as e:
         print(f"计算 {file_path} 的MD5时出错: {str(e)}")
         return None
 
-def get_all_files(folder):
-    """获取文件夹中所有文件（包括子目录）"""
+def get_partial_hash(file_path, algo="md5", progress=None, size=None):
+    """只读文件头、尾各 PARTIAL_BLOCK 字节的哈希，用来快速排除内容不同的同大小文件"""
+    hash_obj = HASH_ALGOS[algo]()
+    try:
+        if size is None:
+            size = os.path.getsize(file_path)
+        with open(file_path, "rb", buffering=0) as f:
+            head = f.read(PARTIAL_BLOCK)
+            f.seek(max(size - PARTIAL_BLOCK, 0))
+            tail = f.read(PARTIAL_BLOCK)
+        hash_obj.update(head)
+        hash_obj.update(tail)
+        if progress is not None:
+            progress.update(len(head) + len(tail))
+        return hash_obj.hexdigest()
+    except Exception as e:
+        print(f"计算 {file_path} 的部分哈希时出错: {str(e)}")
+        return None
+
+def _scan_dir(folder, out, skip_names):
+    # 与 os.walk 相同的顺序：先当前目录的文件，再按列出顺序进入子目录
+    sub_dirs = []
+    try:
+        with os.scandir(folder) as it:
+            for entry in it:
+                try:
+                    if entry.name in skip_names:
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        sub_dirs.append(entry.path)
+                        continue
+                    st = entry.stat()
+                    out.append((entry.path, st.st_size, st.st_mtime_ns))
+                except OSError as e:
+                    print(f"警告：无法读取 {entry.path}: {str(e)}")
+    except OSError as e:
+        print(f"警告：无法读取目录 {folder}: {str(e)}")
+    for sub_dir in sub_dirs:
+        _scan_dir(sub_dir, out, ())
+
+def scan_tree(folder, skip=()):
+    """
+    os.scandir 遍历文件夹（包括子目录），直接复用目录项的 stat 结果，返回 [(路径, 大小, mtime_ns)]
+    skip：根目录下要跳过的文件 / 文件夹名（哈希缓存总是跳过）
+    """
     if not os.path.isdir(folder):
         print(f"错误：{folder} 不是有效的文件夹路径")
         return []
     
-    all_files = []
-    for root, _, files in os.walk(folder):
-        for file in files:
-            all_files.append(os.path.join(root, file))
+    entries = []
+    _scan_dir(folder, entries, (HASH_CACHE_NAME, HASH_CACHE_NAME + "-journal") + tuple(skip))
+    return entries
+
+def get_all_files(folder):
+    """获取文件夹中所有文件（包括子目录）"""
+    return [path for path, _, _ in scan_tree(folder)]
+
+class HashCache:
+    """
+    持久化哈希缓存，SQLite 文件放在目录根下。
+    路径、大小、修改时间（纳秒）都没变的文件直接用上次的哈希（全量 / 部分），不再读盘。
+    数据库只在主线程里访问。
+    """
+    KINDS = {"full": 2, "partial": 3}   # 哈希种类 → entries 元组中的位置
+    
+    def __init__(self, folder, algo):
+        self.folder = folder
+        self.algo = algo
+        self.prefix_len = len(os.path.join(folder, ""))
+        self.path = os.path.join(folder, HASH_CACHE_NAME)
+        self.conn = sqlite3.connect(self.path)
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] != HASH_CACHE_VERSION:
+            # 旧版本的缓存直接丢弃重建
+            with self.conn:
+                self.conn.execute("DROP TABLE IF EXISTS hashes")
+                self.conn.execute(f"PRAGMA user_version = {HASH_CACHE_VERSION}")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS hashes ("
+            "path TEXT NOT NULL, algo TEXT NOT NULL, size INTEGER NOT NULL, "
+            "mtime_ns INTEGER NOT NULL, digest TEXT, partial TEXT, PRIMARY KEY (path, algo))"
+        )
+        self.entries = {
+            path: (size, mtime_ns, digest, partial)
+            for path, size, mtime_ns, digest, partial in self.conn.execute(
+                "SELECT path, size, mtime_ns, digest, partial FROM hashes WHERE algo = ?", (algo,)
+            )
+        }
+        self.updates = {}
+    
+    def get(self, file_path, size, mtime_ns, kind="full"):
+        rel = file_path[self.prefix_len:]
+        hit = self.entries.get(rel)
+        if hit is not None and hit[0] == size and hit[1] == mtime_ns:
+            return hit[self.KINDS[kind]]
+        return None
+    
+    def put(self, file_path, size, mtime_ns, kind, digest):
+        rel = file_path[self.prefix_len:]
+        row = self.updates.get(rel)
+        if row is None:
+            old = self.entries.get(rel)
+            if old is not None and old[0] == size and old[1] == mtime_ns:
+                row = [size, mtime_ns, old[2], old[3]]
+            else:
+                row = [size, mtime_ns, None, None]
+            self.updates[rel] = row
+        row[self.KINDS[kind]] = digest
+    
+    def save(self, scanned):
+        """写入新算出的哈希，删除本次扫描中已经不存在的文件的记录；scanned 为 scan_tree 的结果"""
+        seen = set(path[self.prefix_len:] for path, _, _ in scanned)
+        stale = [(rel, self.algo) for rel in self.entries if rel not in seen]
+        rows = [(rel, self.algo, *row) for rel, row in self.updates.items()]
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self.conn.executemany("DELETE FROM hashes WHERE path = ? AND algo = ?", stale)
+        self.conn.close()
+        return len(rows), len(stale)
+
+def open_hash_cache(folder, algo):
+    """目录不可写或缓存损坏时不用缓存，照常全量计算"""
+    if not os.path.isdir(folder):
+        return None
+    try:
+        return HashCache(folder, algo)
+    except (sqlite3.Error, OSError) as e:
+        print(f"警告：无法使用哈希缓存 {os.path.join(folder, HASH_CACHE_NAME)}: {str(e)}")
+        return None
+
+def hash_files(files, kind, executor, algo, progress):
+    """
+    files 为 [(路径, 大小, mtime_ns, 缓存)]，kind 为 "full"（全量）或 "partial"（头尾）。
+    缓存命中的直接用，其余提交到共享线程池；新算出的结果写回缓存。返回 {路径: 哈希}
+    """
+    progress.add_total(len(files))
+    digests = {}
+    pending = []
+    for path, size, mtime_ns, cache in files:
+        digest = cache.get(path, size, mtime_ns, kind) if cache is not None else None
+        if digest is not None:
+            progress.update(0, cached=True)
+            digests[path] = digest
+        elif kind == "partial":
+            pending.append((path, size, mtime_ns, cache, executor.submit(get_partial_hash, path, algo, progress, size)))
+        else:
+            pending.append((path, size, mtime_ns, cache, executor.submit(get_file_md5, path, algo, progress)))
+    for path, size, mtime_ns, cache, future in pending:
+        digest = future.result()
+        if digest and cache is not None:
+            cache.put(path, size, mtime_ns, kind, digest)
+        digests[path] = digest
+    return digests
+
+def find_added_files(old_files, new_files, executor, algo, progress):
+    """
+    找出 NEW 中内容在 OLD 里不存在的文件，结果与逐个全量哈希相同，但读盘少得多：
+      1. 按大小分桶：OLD 里没有同样大小的文件，一定是新增，不用读
+      2. 同大小的文件比头尾部分哈希（小文件直接算全量）：部分哈希不同，一定是新增
+      3. 大小和部分哈希都相同，才读全量哈希比较
+    old_files / new_files 为 [(路径, 大小, mtime_ns, 缓存)]；返回 (新增文件路径列表, 各阶段统计)
+    """
+    old_by_size = {}
+    for f in old_files:
+        old_by_size.setdefault(f[1], []).append(f)
+    
+    # 1. 大小分桶
+    candidates = [f for f in new_files if f[1] in old_by_size]
+    old_candidates = [f for size in set(f[1] for f in candidates) for f in old_by_size[size]]
+    
+    # 2. 部分哈希（小文件的部分哈希就是全量哈希）
+    stage2 = candidates + old_candidates
+    partials = hash_files([f for f in stage2 if f[1] > PARTIAL_MIN_SIZE], "partial", executor, algo, progress)
+    small_fulls = hash_files([f for f in stage2 if f[1] <= PARTIAL_MIN_SIZE], "full", executor, algo, progress)
+    
+    def quick_key(f):
+        digest = partials.get(f[0]) if f[1] > PARTIAL_MIN_SIZE else small_fulls.get(f[0])
+        return (f[1], digest) if digest else None
+    
+    old_quick = set(quick_key(f) for f in old_candidates)
     
-    return all_files
+    # 3. 大文件且部分哈希也相同的，读全量哈希
+    full_new = [f for f in candidates if f[1] > PARTIAL_MIN_SIZE and quick_key(f) in old_quick]
+    full_keys = set(quick_key(f) for f in full_new)
+    full_old = [f for f in old_candidates if f[1] > PARTIAL_MIN_SIZE and quick_key(f) in full_keys]
+    fulls = hash_files(full_new + full_old, "full", executor, algo, progress)
+    old_full = set(fulls.get(f[0]) for f in full_old)
+    old_full.discard(None)
+    
+    added_files = []
+    stats = {"by_size": 0, "by_partial": 0, "by_full": 0}
+    for f in new_files:
+        path, size = f[0], f[1]
+        if size not in old_by_size:
+            added_files.append(path)
+            stats["by_size"] += 1
+            continue
+        key = quick_key(f)
+        if key is None:
+            continue  # 读取失败，和原来一样不算新增
+        if size <= PARTIAL_MIN_SIZE:
+            if key not in old_quick:
+                added_files.append(path)
+                stats["by_full"] += 1
+            continue
+        if key not in old_quick:
+            added_files.append(path)
+            stats["by_partial"] += 1
+            continue
+        digest = fulls.get(path)
+        if digest and digest not in old_full:
+            added_files.append(path)
+            stats["by_full"] += 1
+    stats["partial_hashed"] = len(partials)
+    stats["full_hashed"] = len(small_fulls) + len(fulls)
+    return added_files, stats
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="对比新旧文件夹，把新增文件复制到 NEW 文件夹")
+    parser.add_argument("old_folder", nargs="?", default=r"D:\\新旧对比\\OLD", help="旧文件夹")
+    parser.add_argument("new_folder", nargs="?", default=r"D:\\新旧对比\\NEW", help="新文件夹")
+    parser.add_argument("--algo", default="md5", choices=sorted(HASH_ALGOS),
+                        help="摘要算法（默认 md5；blake2b / sha1 / xxh3 更快）")
+    parser.add_argument("--threads", type=int, default=HASH_THREADS, help="哈希线程数")
+    parser.add_argument("--no-cache", action="store_true",
+                        help=f"不读写哈希缓存（默认每个目录根下保存 {HASH_CACHE_NAME}）")
+    parser.add_argument("--link-mode", default="auto", choices=sorted(MODES),
+                        help="新增文件放进 NEW 的方式：auto 依次尝试 reflink / 硬链接 / copy_file_range / 复制")
+    return parser.parse_args()
 
 def main():
-    # ==== 直接在这里修改你的路径 ====
-    old_folder = r"D:\\新旧对比\\OLD"    # 旧文件夹
-    new_folder = r"D:\\新旧对比\\NEW"    # 新文件夹
+    # ==== 直接在这里修改你的路径（或命令行：python 新旧对比.py 旧文件夹 新文件夹） ====
+    args = parse_args()
+    old_folder = args.old_folder    # 旧文件夹
+    new_folder = args.new_folder    # 新文件夹
     # ==============================
     
-    print("开始扫描旧文件夹...")
-    # 扫描旧文件夹的所有文件MD5（包括子文件夹）
-    old_files = get_all_files(old_folder)
-    old_files_md5 = set()
+    print(f"开始扫描旧文件夹和新文件夹（{args.algo}，{args.threads} 线程）...")
+    progress = Progress("哈希进度")
+    started = time.perf_counter()
     
-    for file_path in old_files:
-        md5 = get_file_md5(file_path)
-        if md5:
-            old_files_md5.add(md5)
+    # 新旧两个目录同时遍历
+    with ThreadPoolExecutor(max_workers=2) as walkers:
+        old_walk = walkers.submit(scan_tree, old_folder)
+        # 上次放入的 NEW 文件夹不参与比较，否则重跑时会和自己重名
+        new_walk = walkers.submit(scan_tree, new_folder, (OUTPUT_DIR_NAME,))
+        old_entries = old_walk.result()
+        new_entries = new_walk.result()
     
-    print(f"旧文件夹共扫描到 {len(old_files)} 个文件，计算了 {len(old_files_md5)} 个有效MD5值")
+    old_cache = new_cache = None
+    if not args.no_cache:
+        old_cache = open_hash_cache(old_folder, args.algo)
+        new_cache = open_hash_cache(new_folder, args.algo)
     
-    print("开始扫描新文件夹...")
-    # 扫描新文件夹，找出新增文件（包括子文件夹）
-    new_files = get_all_files(new_folder)
-    added_files = []
+    # 只对可能重复的文件读盘；所有哈希共用一个线程池，缓存命中的文件不再读盘
+    old_files = [(path, size, mtime_ns, old_cache) for path, size, mtime_ns in old_entries]
+    new_files = [(path, size, mtime_ns, new_cache) for path, size, mtime_ns in new_entries]
+    with ThreadPoolExecutor(max_workers=max(1, args.threads)) as executor:
+        added_files, stats = find_added_files(old_files, new_files, executor, args.algo, progress)
+    progress.finish()
     
-    for file_path in new_files:
-        md5 = get_file_md5(file_path)
-        if md5 and md5 not in old_files_md5:
-            added_files.append(file_path)
+    for cache, entries in ((old_cache, old_entries), (new_cache, new_entries)):
+        if cache is None:
+            continue
+        try:
+            written, removed = cache.save(entries)
+            print(f"哈希缓存已更新: {cache.path}（新增/更新 {written} 条，清理 {removed} 条）")
+        except sqlite3.Error as e:
+            print(f"警告：哈希缓存保存失败 {cache.path}: {str(e)}")
     
-    print(f"新文件夹共扫描到 {len(new_files)} 个文件，其中新增文件 {len(added_files)} 个")
+    total_bytes = sum(size for _, size, _ in old_entries) + sum(size for _, size, _ in new_entries)
+    print(f"旧文件夹共扫描到 {len(old_entries)} 个文件")
+    print(f"新文件夹共扫描到 {len(new_entries)} 个文件，其中新增文件 {len(added_files)} 个"
+          f"（按大小判定 {stats['by_size']}，按部分哈希 {stats['by_partial']}，按全量哈希 {stats['by_full']}）")
+    print(f"部分哈希 {stats['partial_hashed']} 个文件，全量哈希 {stats['full_hashed']} 个文件（缓存命中 {progress.cached}）")
+    print(f"实际读取 {progress.bytes / 1024 / 1024:.1f} MB，两个文件夹共 {total_bytes / 1024 / 1024:.1f} MB")
+    print(f"哈希耗时 {time.perf_counter() - started:.1f} 秒")
     
     # 所有扫描完成后才创建新增文件夹
     if added_files:  # 只有存在新增文件时才创建文件夹
-        new_wem_dir = os.path.join(new_folder, "NEW")
+        new_wem_dir = os.path.join(new_folder, OUTPUT_DIR_NAME)
         try:
             os.makedirs(new_wem_dir, exist_ok=True)
             print(f"创建目标文件夹: {new_wem_dir}")
             
-            # 复制新增文件
+            # 放入新增文件：能链接 / 克隆就不复制；重名文件按来源路径加短哈希，不再跳过
+            materializer = Materializer(args.link_mode)
+            names = plan_names(added_files, new_folder)
             for file_path in added_files:
                 try:
-                    filename = os.path.basename(file_path)
+                    filename = names[file_path]
                     dest_path = os.path.join(new_wem_dir, filename)
                     if os.path.exists(dest_path):
                         print(f"跳过已存在文件: {filename}")
                         continue
-                    shutil.copy2(file_path, dest_path)
-                    print(f"复制: {filename}")
+                    method = materializer.place(file_path, dest_path)
+                    print(f"{method}: {filename}")
                 except Exception as e:
                     print(f"复制 {file_path} 失败: {str(e)}")
             
-            print(f"完成！新增文件已复制到: {new_wem_dir}")
+            print(f"完成！新增文件已放入: {new_wem_dir}（{materializer.summary()}）")
         except Exception as e:
             print(f"创建文件夹失败: {str(e)}")
     else: